@@ -9,11 +9,11 @@ Created on Tue Apr  7 22:26:25 2020
 
 """
 #Import the households package
-import numpy as np
-import pandas
 import os
+import sys
 import matplotlib.pyplot as plt
 os.chdir('..')
+sys.path.insert(0,'.')
 import households
 from households import behavior
 
@@ -31,77 +31,88 @@ death = households.AgeTable([0,5,40,100],male,[0,0,1],female,[0,0,1])
 #                                                    behavior.inheritance.failed_inheritance_no_owner)
 
 #Longform definition of the same
-find_heirs_sons_then_brothers_sons = behavior.inheritance.find_heirs_multiple_constructor(lambda person: behavior.inheritance.find_heirs_children_oldest_to_youngest(person,male),
-                                                                                                  lambda person: behavior.inheritance.find_heirs_siblings_children_oldest_to_youngest(person, male))
+## Components give the sex parameter without a lambda, so the rule can be pickled
+find_heirs_sons_then_brothers_sons = behavior.inheritance.find_heirs_multiple_constructor(behavior.rulespec.Component('find_heirs_children_oldest_to_youngest', sex = male),
+                                                                                          behavior.rulespec.Component('find_heirs_siblings_children_oldest_to_youngest', sex = male))
 
 sons_brothers_then_none = behavior.inheritance.InheritanceRuleComplex(has_property = behavior.inheritance.has_property_houses,
-                                                                      find_heirs = find_heirs_sons_then_brothers_sons, 
-                                                                      limit_heirs = behavior.inheritance.limit_heirs_not_owners, 
-                                                                      distribute_property = behavior.inheritance.distribute_property_to_first_heir_and_move_household, 
+                                                                      find_heirs = find_heirs_sons_then_brothers_sons,
+                                                                      limit_heirs = behavior.inheritance.limit_heirs_not_owners,
+                                                                      distribute_property = behavior.inheritance.distribute_property_to_first_heir_and_move_household,
                                                                       failure = behavior.inheritance.failed_inheritance_no_owner)
 
-def neolocality_husband_owner(husband,wife):
-    households.behavior.locality.neolocality(husband,wife,male)
-
-#Run a simple, single example for 25 years
-households.rd.seed(505401)
-example = households.Community(name = 'Sweetwater',pop=20,area = 20,startage = 15,mortab = death, marrtab = marr, birthtab = birth, locality = neolocality_husband_owner, inheritance = sons_brothers_then_none, fragmentation = households.behavior.fragmentation.no_fragmentation)
-
-westworld = households.World()
+#Neolocal marriage, with the husband owning the new house
+neolocality_husband_owner = behavior.marriage.MarriageRule(eligibility_agetable = marr,
+                                                           get_eligible = behavior.marriage.get_eligible_not_sibling_same_community,
+                                                           pick_spouse = behavior.marriage.pick_spouse_random,
+                                                           locality = behavior.rulespec.Component('locality_neolocality', male),
+                                                           remarriage_agetable = marr)
 
+no_fragmentation = behavior.mobility.MobilityRule(check_household = behavior.mobility.check_household_never_fragment,
+                                                  who_leaves_house = behavior.mobility.who_leaves_house_noone,
+                                                  destination = behavior.mobility.destination_random_house_same_village)
 
+#Run a simple, single example for 25 years
+westworld = households.World(seed = 505401)
+example = households.Community(westworld, 'Sweetwater', pop = 20, area = 20, startage = 15, mortab = death, birthtab = birth,
+                               marriagerule = neolocality_husband_owner, inheritancerule = sons_brothers_then_none,
+                               mobilityrule = no_fragmentation)
+poplist = [len(example.people)]
 
+def run_until(year):
+    """Progress the world to a given year, keeping track of the population."""
+    while westworld.year < year:
+        westworld.progress()
+        poplist.append(len(example.people))
 
-while example.year < 25:
-    example.progress()
+run_until(25)
 
 #Let's look at one family
 h = [x for x in example.houses if len(x.people) >2][1]
 for x in h.people:
-    print(households.narrative.biography(x)) 
+    print(households.narrative.biography(x))
 print(households.narrative.census(h))
 print(' ')
-will, elsie1, elsie2, hector = h.people
 #What about the eldest?
-children = households.kinship.get_children(h.people[0],h.people[0].has_community.families)
+children = households.kinship.get_children(h.people[0])
 print(households.narrative.biography(children[0]))
-print(households.narrative.biography(children[0].has_spouse)) #Charlotte's husband
- ## is fromt he first generation, and as such she will soon be a widowed mother
+if children[0].has_spouse is not None:
+    print(households.narrative.biography(children[0].has_spouse))
 
 #Now let's run another 25 years
-while example.year < 50:
-    example.progress()
-    
+run_until(50)
+
 #Let's check in again on each of the children
 for x in children:
     print('One of the original children:')
     print(households.narrative.biography(x))
-    print(x.sex.possessive + ' household:')
-    print(households.narrative.census(x.myhouse))
-    for y in x.myhouse.people:
-        print(households.narrative.biography(y))
+    if x.has_house is not None:
+        print(x.sex.possessive + ' household:')
+        print(households.narrative.census(x.has_house))
+        for y in x.has_house.people:
+            print(households.narrative.biography(y))
     print(' ')
 
 #And now let's run another 25 years
-while example.year < 75:
-    example.progress()
+run_until(75)
 
 #Let's see where the children are now
 #Let's check in again on each of the children
 for x in children[1:]:
     print('One of the original children:')
     print(households.narrative.biography(x))
-    print(x.sex.possessive + ' household:')
-    print(households.narrative.census(x.myhouse))
-    for y in x.myhouse.people:
-        print(households.narrative.biography(y))
+    if x.has_house is not None:
+        print(x.sex.possessive + ' household:')
+        print(households.narrative.census(x.has_house))
+        for y in x.has_house.people:
+            print(households.narrative.biography(y))
     print(' ')
-    
-    
+
+
 plt.hist([x.age for x in example.people])
-plt.plot(range(example.year+1),example.poplist)
+plt.plot(range(westworld.year+1),poplist)
 for h in example.houses:
     print(households.narrative.census(h))
-    
+
 for x in example.people:
-    print(households.narrative.biography(x))
\ No newline at end of file
+    print(households.narrative.biography(x))
@@ -2,19 +2,49 @@
 
 Imports the dependencies requires, then
 the various primary modules and the behavior package.
+
+The heavy dependencies scipy, networkx, and matplotlib.pyplot are only 
+imported when first used, e.g. by residency.plot_classify, but remain 
+available as `households.scipy`, `households.nx`, and `households.plt`.
+
+Progress messages are logged to the 'households' logger, which by default
+only shows warnings; use `logging.basicConfig(level=logging.DEBUG)` to see
+the modules being imported.
 """
 import numpy as np
 import random as rd
-import scipy
-import networkx as nx
-import matplotlib.pyplot as plt
+import importlib
 import inspect
+import itertools
+import collections
+import os
+import logging
+
+#The heavy dependencies, imported on first use by __getattr__
+_lazy = {'scipy' : 'scipy',
+         'nx' : 'networkx',
+         'plt' : 'matplotlib.pyplot'}
+
+def __getattr__(name):
+    """Import a heavy dependency the first time it is used."""
+    if name in _lazy:
+        module = importlib.import_module(_lazy[name])
+        globals()[name] = module
+        return module
+    raise AttributeError('module \'households\' has no attribute \'%s\'' % name)
 
-print('Importing the households package')
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+logging.getLogger(__name__).debug('Importing the households package')
 from households.identity import *
 import households.kinship
 import households.residency
 import households.behavior
+import households.population
+import households.roster
+import households.archive
 from households.main import *
 import households.narrative
+import households.parallel
+import households.sweep
+import households.results
 
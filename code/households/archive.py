@@ -0,0 +1,406 @@
+"""Compact storage of dead Persons that preserves genealogy.
+
+Dead Persons are kept by their Community and World forever, because kinship
+(and therefore marriage eligibility and inheritance) depends on the parents,
+children, and spouses of the living, who are often dead. A dead Person no
+longer needs most of what a Person object holds, however: its rules and 
+house are not used again, and its relatives are only followed, never
+changed.
+
+An Archive stores the genealogical details of dead Persons as rows of NumPy
+columns, with relatives stored by their ids. World.compact moves dead Persons
+into the World's Archive, replacing each with an ArchivedPerson: a small proxy
+which reads its details from the Archive and finds its relatives through the
+World, so that the functions of kinship and the heir searches of inheritance
+work as before. References to the dead Person held by its living (or not yet
+compacted) relatives, and by the Events in their Diaries, are replaced by the
+proxy, so that the Person object can be freed.
+
+Proxies are not stored for every row, which would cost nearly as much as the
+rows themselves. The Archive creates the proxy of a row when it is asked for,
+and remembers it only while something else refers to it, so that the same
+row always gives the same proxy. The rosters of the dead of a World and its
+Communities are ArchivedRosters, which hold the dead not yet compacted and 
+read the rest from the Archive.
+
+Notes
+-----
+Events are the largest part of a recorded Person, and are kept in full by a
+Diary, so compaction frees much less memory unless events are kept in an 
+EventLog (see narrative) or not recorded at all.
+
+See Also
+--------
+kinship
+    The module defining kinship relationships, which work with ArchivedPersons.
+main
+    The module defining World.compact.
+"""
+
+import weakref
+from households import np, rd, logging, narrative, roster
+from households.identity import *
+
+logging.getLogger(__name__).debug('importing archive')
+
+#Column names and types; -1 means None for the ids
+_columns = {'id' : np.int64,
+            'sex' : np.int8,
+            'age' : np.int32,
+            'birthyear' : np.int32,
+            'marriagestatus' : np.int8,
+            'spouse' : np.int64,
+            'community' : np.int32,
+            'name' : np.int32,
+            'firstchild' : np.int64,
+            'nchildren' : np.int32}
+
+
+class Archive(object):
+    """A columnar store of the genealogy of dead Persons in a World.
+
+    Each compacted Person occupies one row, in order of compaction. The ids
+    of each Person's children are stored one after another in a single array,
+    with the position of the first and the number of children in the row.
+    Columns are grown geometrically as Persons are added.
+
+    Parameters
+    ----------
+    world : main.World
+        The World whose dead Persons are stored, used to find relatives.
+    capacity : int, optional
+        The number of rows to allocate initially.
+
+    Attributes
+    ----------
+    size : int
+        The number of Persons stored.
+    id, sex, age, birthyear, marriagestatus : numpy.ndarray
+        Columns of the details of each Person, with identities stored as
+        their codes.
+    spouse : numpy.ndarray
+        Column of the id of the spouse of each Person; -1 is None.
+    parents : numpy.ndarray
+        Two columns with the ids of the parents of each Person; -1 is None.
+    community, name : numpy.ndarray
+        Columns of the index of each Person's Community and name in
+        `communities` and `names`.
+    firstchild, nchildren : numpy.ndarray
+        Columns of the position in `children` of each Person's first child,
+        and of their number of children.
+    children : numpy.ndarray
+        The ids of the children of all Persons.
+    logged : numpy.ndarray
+        Column of whether each Person's events are in the World's EventLog.
+    communities, names : list
+        The Communities and names used by the stored Persons.
+    """
+
+    def __init__(self, world, capacity = 1024):
+        self.world = world
+        self.size = 0
+        self._childsize = 0
+        for name, dtype in _columns.items():
+            setattr(self, name, np.full(capacity, -1, dtype = dtype))
+        self.parents = np.full((capacity, 2), -1, dtype = np.int64)
+        self.children = np.full(capacity, -1, dtype = np.int64)
+        self.logged = np.zeros(capacity, dtype = bool)
+        self.communities = []
+        self.names = []
+        self._codes = {'community' : {}, 'name' : {}}
+        self._rows = np.full(capacity, -1, dtype = np.int32) #the row of each id
+        #Only the few Persons who kept a Diary or still own houses need more
+        self._diaries = {}
+        self._owned = {}
+        self._proxies = weakref.WeakValueDictionary()
+
+    def add(self, person):
+        """Store the details of a dead Person and return its proxy.
+
+        The proxy is kept by the Archive only while it is referred to 
+        elsewhere; `person` returns it, or a new one, afterwards.
+
+        Parameters
+        ----------
+        person : main.Person
+            The dead Person to store.
+
+        Returns
+        -------
+        ArchivedPerson
+            The proxy of the Person.
+        """
+        if self.size == len(self.id):
+            self._grow()
+        kids = [x.id for x in person.has_children]
+        while self._childsize + len(kids) > len(self.children):
+            self.children = np.concatenate([self.children, np.full(len(self.children), -1, dtype = np.int64)])
+        i = self.size
+        self.id[i] = person.id
+        self.sex[i] = person.sex.code
+        self.age[i] = person.age
+        self.birthyear[i] = person.birthyear
+        self.marriagestatus[i] = person.marriagestatus.code
+        self.spouse[i] = -1 if person.has_spouse is None else person.has_spouse.id
+        self.parents[i] = ([x.id for x in person.has_parents] + [-1, -1])[:2]
+        self.community[i] = self._intern('community', self.communities, person.has_community)
+        self.name[i] = self._intern('name', self.names, person.name)
+        self.firstchild[i] = self._childsize
+        self.nchildren[i] = len(kids)
+        self.children[self._childsize:self._childsize + len(kids)] = kids
+        self._childsize += len(kids)
+        while person.id >= len(self._rows):
+            self._rows = np.concatenate([self._rows, np.full(len(self._rows), -1, dtype = np.int32)])
+        self._rows[person.id] = i
+        if person._diary is True:
+            self.logged[i] = True
+        elif person._diary is not None:
+            self._diaries[i] = person._diary
+        if len(person.owned_houses) != 0:
+            self._owned[i] = person.owned_houses
+        self.size += 1
+        return self.person(i)
+
+    def person(self, row):
+        """Return the proxy of the Person stored in a row.
+
+        Parameters
+        ----------
+        row : int
+            The row of the Person.
+
+        Returns
+        -------
+        ArchivedPerson
+            The proxy, which is the same object as long as any is in use.
+        """
+        proxy = self._proxies.get(row)
+        if proxy is None:
+            proxy = ArchivedPerson(self, row)
+            self._proxies[row] = proxy
+        return proxy
+
+    def row(self, id):
+        """Return the row of the Person with a given id, or -1 if not stored.
+
+        Parameters
+        ----------
+        id : int
+            The id of the Person.
+        """
+        return int(self._rows[id]) if 0 <= id < len(self._rows) else -1
+
+    def _intern(self, name, values, value):
+        """Return the index of a value in a list of values, adding it if new."""
+        codes = self._codes[name]
+        key = value if name == 'name' else id(value)
+        code = codes.get(key)
+        if code is None:
+            code = len(values)
+            codes[key] = code
+            values.append(value)
+        return code
+
+    def _grow(self):
+        """Double the number of allocated rows."""
+        for name in list(_columns.keys()) + ['parents', 'logged']:
+            old = getattr(self, name)
+            new = np.full((2 * len(old),) + old.shape[1:], -1 if name != 'logged' else False, dtype = old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def __len__(self):
+        return self.size
+
+
+class ArchivedPerson(object):
+    """A lightweight stand-in for a dead Person stored in an Archive.
+
+    ArchivedPersons have the attributes of a Person used by kinship,
+    inheritance, and narrative, read from their row of the Archive. Relatives
+    are found by id through the World, so they are the living Persons or the
+    ArchivedPersons themselves.
+
+    Parameters
+    ----------
+    archive : Archive
+        The Archive storing this Person.
+    row : int
+        The row of this Person in the Archive.
+
+    Attributes
+    ----------
+    owned_houses : list of House or tuple
+        The houses this Person still owned at death, if inheritance failed,
+        or an empty tuple.
+    """
+
+    __slots__ = ('_archive', '_index', '__weakref__')
+
+    lifestatus = dead
+    has_house = None
+
+    def __init__(self, archive, row):
+        self._archive = archive
+        self._index = row
+
+    @property
+    def owned_houses(self):
+        return self._archive._owned.get(self._index, ())
+
+    @property
+    def _diary(self):
+        """The Diary of this Person, True if their events are in the 
+        World's EventLog, or None if they were not recorded."""
+        if self._archive.logged[self._index]:
+            return True
+        return self._archive._diaries.get(self._index)
+
+    @property
+    def diary(self):
+        diary = self._diary
+        if diary is True:
+            return narrative.Diary(self)
+        return diary
+
+    @property
+    def id(self):
+        return int(self._archive.id[self._index])
+
+    @property
+    def name(self):
+        return self._archive.names[self._archive.name[self._index]]
+
+    @property
+    def sex(self):
+        return Sex.registry[self._archive.sex[self._index]]
+
+    @property
+    def age(self):
+        return int(self._archive.age[self._index])
+
+    @property
+    def birthyear(self):
+        return int(self._archive.birthyear[self._index])
+
+    @property
+    def marriagestatus(self):
+        return MarriageStatus.registry[self._archive.marriagestatus[self._index]]
+
+    @property
+    def has_community(self):
+        return self._archive.communities[self._archive.community[self._index]]
+
+    @property
+    def has_spouse(self):
+        id = self._archive.spouse[self._index]
+        return None if id < 0 else self._archive.world.get_person(int(id))
+
+    @property
+    def has_parents(self):
+        world = self._archive.world
+        return [world.get_person(int(x)) for x in self._archive.parents[self._index] if x >= 0]
+
+    @property
+    def has_children(self):
+        archive = self._archive
+        start = archive.firstchild[self._index]
+        ids = archive.children[start:start + archive.nchildren[self._index]]
+        return [archive.world.get_person(int(x)) for x in ids]
+
+    def __repr__(self):
+        return 'ArchivedPerson(%i)' % self.id
+
+
+class ArchivedRoster(roster.Roster):
+    """A Roster of the dead, of whom those compacted are read from an Archive.
+
+    Dead Persons are added as to a Roster, and removed once compacted, after
+    which they are found in the Archive instead, as ArchivedPersons. Iteration 
+    gives the compacted dead in order of compaction, then the rest in the 
+    order they were added, which is the order of death in both cases.
+
+    Parameters
+    ----------
+    archive : Archive
+        The Archive of the compacted dead.
+    community : main.Community, optional
+        If given, only the compacted dead of this Community are members.
+    """
+
+    def __init__(self, archive, community = None):
+        super().__init__()
+        self._archive = archive
+        self._community = community
+
+    def _archived(self):
+        """Return the rows of the Archive which are members."""
+        archive = self._archive
+        if self._community is None:
+            return range(archive.size)
+        code = archive._codes['community'].get(id(self._community))
+        if code is None:
+            return ()
+        return np.flatnonzero(archive.community[:archive.size] == code).tolist()
+
+    def _holds(self, row):
+        """Return whether a row of the Archive is a member."""
+        archive = self._archive
+        return row >= 0 and (self._community is None or archive.communities[archive.community[row]] is self._community)
+
+    def get(self, id, default = None):
+        """Return the member with a given id, or `default` if there is none.
+
+        Parameters
+        ----------
+        id : int
+            The id of the member.
+        default : optional
+            What to return if no member has that id.
+        """
+        member = self._members.get(id)
+        if member is None:
+            row = self._archive.row(id)
+            if not self._holds(row):
+                return default
+            member = self._archive.person(row)
+        return member
+
+    def copy(self):
+        """Return a list of the members, in order of death."""
+        return list(self)
+
+    def shuffled(self, random = rd):
+        """Return a list of the members in a random order.
+
+        Parameters
+        ----------
+        random : optional
+            An object with a `shuffle` method used to randomize the order, by
+            default the `random` module.
+
+        Returns
+        -------
+        list
+            The members in a random order.
+        """
+        output = list(self)
+        random.shuffle(output)
+        return output
+
+    def __contains__(self, member):
+        if isinstance(member, ArchivedPerson):
+            return member._archive is self._archive and self._holds(member._index)
+        return super().__contains__(member)
+
+    def __iter__(self):
+        person = self._archive.person
+        for row in self._archived():
+            yield person(row)
+        yield from self._members.values()
+
+    def __len__(self):
+        return len(self._archived()) + len(self._members)
+
+    def __repr__(self):
+        return 'ArchivedRoster(%i members)' % len(self)
@@ -7,12 +7,15 @@ such that future modules can extend types of behavioral diversity that can be
 modeled.
 """
 
-__all__ = ['inheritance','marriage','mobility','conception','transmission']
+__all__ = ['inheritance','marriage','mobility','conception','transmission','rulespec']
 
-print('importing behavior')
+from households import logging
+
+logging.getLogger(__name__).debug('importing behavior')
 
 from . import inheritance
 from . import marriage
 from . import mobility
 from . import conception
-from . import transmission
\ No newline at end of file
+from . import transmission
+from . import rulespec
\ No newline at end of file
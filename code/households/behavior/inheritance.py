@@ -14,11 +14,15 @@ Houses should be transmitted and occupied.
 A planned expansion is to have inheritance rules closely tied to (and likely 
 containing) the AgeTable for dying, such that populations with different
 mortality rates can be associated easily with different inheritance regimes.
+
+The property of a Person is found through their owned_houses, which every 
+change of House.owner keeps up to date, so no function here needs to search
+all houses for those a Person owns.
 """
 
-from households import np, rd, scipy, nx, plt, inspect, kinship, residency, main, behavior
+from households import np, rd, logging, inspect, kinship, residency, main, behavior
 from households.identity import *
-print('importing inheritance')
+logging.getLogger(__name__).debug('importing inheritance')
 #import kinship as kn
 
 #Create a class that encompasses proper behavior for an inheritance rule
@@ -66,6 +70,7 @@ class InheritanceRule(object):
         self.__has_property = has_property
         self.__rule = rule
         self.__failure = failure
+        self.spec = None #the behavior.rulespec.RuleSpec this was built from
         
     def __call__(self,person):
         """Determine whether inheritance happens and enact it.
@@ -101,6 +106,12 @@ class InheritanceRule(object):
             else:
                 raise TypeError('returned result of rule is not bool')
     
+    def __reduce_ex__(self,protocol):
+        """Pickle a rule built from a behavior.rulespec.RuleSpec as its RuleSpec."""
+        if getattr(self,'spec',None) is not None:
+            return (behavior.rulespec.build,(self.spec,))
+        return super().__reduce_ex__(protocol)
+    
     def __verify_rule__(self,rule,argnum = [1]):
         """Check that rule is callable and has only one non-default argument.
         
@@ -178,9 +189,8 @@ def simple_inherit_sons(person,checkowner=True):
                     heir = son
                     #If the son lives in a different house, move his household
                     behavior.mobility.move_household_to_new_house(heir,person.has_house)
-                    for h in person.has_community.houses:
-                        if h.owner == person:
-                            h.owner = heir
+                    for h in person.owned_houses.copy():
+                        h.owner = heir
                     return True
                 else:
                     pass #Try the next one
@@ -226,9 +236,8 @@ def simple_inherit_brothers_sons(person,checkowner=True):
                         select.sort(reverse=True,key=lambda x:x.age)
                         heir = select[1]
                         behavior.mobility.move_family_to_new_house(heir,person.has_house)
-                        for h in person.has_community.houses:
-                            if h.owner == person:
-                                h.owner = heir
+                        for h in person.owned_houses.copy():
+                            h.owner = heir
                         return True
                     #Otherwise, not enough children
                 # Otherwise, no children
@@ -309,6 +318,7 @@ class InheritanceRuleComplex(InheritanceRule):
         self.__limit_heirs = limit_heirs
         self.__distribute_property = distribute_property
         self.__failure = failure
+        self.spec = None
         
     def __call__(self,person):
         """Enact inheritance on a person's property, if they have any.
@@ -370,10 +380,7 @@ def has_property_houses(person):
         Who to check for property
     """
     if isinstance(person,main.Person):
-        for h in person.has_community.houses:
-            if h.owner == person:
-                return True
-        return False
+        return len(person.owned_houses) != 0
     else:
         raise TypeError('person not Person')
     
@@ -557,6 +564,48 @@ def find_heirs_brothers_sons_oldest_to_youngest(person):
             # Every brother has been checked
     return heirs
 
+def find_heirs_multiple(person,*functions):
+    """Find heirs by combining multiple basic find_heirs functions.
+    
+    Each function is run in turn, and their heirs are returned in the order
+    of the functions. With its functions given, e.g. by 
+    `find_heirs_multiple_constructor` or as a behavior.rulespec.Component,
+    this works as a `find_heirs` function.
+
+    Parameters
+    ----------
+    person : Person
+        The person whose heirs are to be found.
+    *functions : callable
+        All find_heirs or equivalent functions, to be combined.
+
+    Returns
+    -------
+    list of Person or list of list of Person
+        The heirs of a person
+    """
+    if isinstance(person,main.Person) == False:
+        raise TypeError('person not Person')
+    output = []
+    for f in functions:
+        #For each function, get heirs
+        heirs = f(person)
+        if heirs == None or heirs == []:
+            pass
+        elif isinstance(heirs,main.Person):
+            #Person, so add double brackets and then add
+            output += [[heirs]]
+        elif type(heirs) == list and isinstance(heirs[0],main.Person):
+            #list of Persons, add brackets then 
+            output += [heirs]
+        elif type(heirs) == list and all([type(x) == list and all([isinstance(y,main.Person) for y in x]) for x in heirs]):
+            #list of lists of person, add those that are not empty (e.g. 
+            ## brothers without sons)
+            output += [x for x in heirs if x != []]
+        else:
+            raise ValueError('heirs returned not valid')
+    return output
+
 def find_heirs_multiple_constructor(*args):
     """Generate a new find_heirs function out of multiple find_heirs functions.
     
@@ -571,51 +620,16 @@ def find_heirs_multiple_constructor(*args):
 
     Returns
     -------
-    callable
+    behavior.rulespec.Component
         returns a new function that takes person as an argument; this is the 
-        input to the actual InheritanceRuleComplex or equivalent class.
+        input to the actual InheritanceRuleComplex or equivalent class. It 
+        can be pickled if all of the functions can.
     """
     #Check that all args are in fact callable
     for f in args:
         if callable(f) == False:
             raise TypeError(str(f) + ' is not callable')
-    def find_heirs_multiple(person):
-        """Find_heirs combining multiple basic find_heirs functions.
-        
-        A custom function generated by `find_heirs_multiple_constructor` which 
-        will now work as a `find_heirs` function.
-
-        Parameters
-        ----------
-        person : Person
-            The person whose heirs are to be found.
-
-        Returns
-        -------
-        list of Person or list of list of Person
-            The heirs of a person
-        """
-        if isinstance(person,main.Person) == False:
-            raise TypeError('person not Person')
-        output = []
-        for f in args:
-            #For each function, get heirs
-            heirs = f(person)
-            if heirs == None or heirs == []:
-                pass
-            elif isinstance(heirs,main.Person):
-                #Person, so add double brackets and then add
-                output += [[heirs]]
-            elif type(heirs) == list and isinstance(heirs[0],main.Person):
-                #list of Persons, add brackets then 
-                output += [heirs]
-            elif type(heirs) == list and type(heirs[0]) == list and isinstance(heirs[0][0],main.Person):
-                #list of lists of person, just add
-                output += heirs
-            else:
-                raise ValueError('heirs returned not valid')
-        return output
-    return find_heirs_multiple
+    return behavior.rulespec.Component('find_heirs_multiple',*args)
 
 #Limitation of heirs
 def limit_heirs_none(heirs):
@@ -717,6 +731,31 @@ def limit_heirs_by_age(heirs,age_of_majority):
         raise TypeError('heirs neither list of Persons or list of lists of Person')
     return new_heirs
 
+def limit_heirs_multiple(heirs,*functions):
+    """Limit heirs based on a sequence of other functions.
+    
+    With its functions given, e.g. by `limit_heirs_multiple_constructor` or
+    as a behavior.rulespec.Component, this works as a `limit_heirs` function.
+
+    Parameters
+    ----------
+    heirs : list of Person or list of list of Person
+        heirs, the return argument of find_heirs type functions
+    *functions : callable
+        Other limit_heirs functions to be iterated over in succession
+
+    Returns
+    -------
+    list of Person or list of list of Person
+        The remaining heirs of a person
+    """
+    for f in functions:
+        #For each function, get the new remainingheirs
+        heirs = f(heirs)
+        if heirs == [] or all([x == [] for x in heirs]):
+            return []              
+    return heirs
+
 def limit_heirs_multiple_constructor(*args):
     """Create a new limit_heirs function that iterates over other limit_heirs functions.
 
@@ -727,38 +766,15 @@ def limit_heirs_multiple_constructor(*args):
 
     Returns
     -------
-    callable
-        Returns a new limit_heirs funcitons
+    behavior.rulespec.Component
+        Returns a new limit_heirs function, which can be pickled if all of 
+        the functions can.
 
     """
     for f in args:
         if callable(f) == False:
             raise TypeError(str(f) + ' is not callable')
-    def limit_heirs_multiple(heirs):
-        """Limit heirs based on a sequence of other functions.
-        
-        A custom `limit_heirs` function that combines others and iterates
-        over them.
-
-        Parameters
-        ----------
-        heirs : list of Person or list of list of Person
-            heirs, the return argument of find_heirs type functions
-
-        Returns
-        -------
-        list of Person or list of list of Person
-            The remaining heirs of a person
-        """
-        if isinstance(person,main.Person) == False:
-            raise TypeError('person not Person')
-        for f in args:
-            #For each function, get the new remainingheirs
-            heirs = f(heirs)
-            if heirs == [] or all([x == [] for x in heirs]):
-                return []              
-        return heirs
-    return limit_heirs_multiple
+    return behavior.rulespec.Component('limit_heirs_multiple',*args)
 
 #Distribution of property and moving families/households
 def distribute_property_to_first_heir_and_move_household(person,heirs):
@@ -794,12 +810,11 @@ def distribute_property_to_first_heir_and_move_household(person,heirs):
         raise TypeError('heirs neither Person nor list of Persons')
     #Now that the heir has been identified, transfer any property to their name
     transfer_happened = False
-    for h in person.has_community.has_world.houses:
-        if h.owner == person:
-            h.owner = heir
-            #old_house = heir.has_house
-            behavior.mobility.move_household_to_new_house(heir,h)
-            transfer_happened = True
+    for h in person.owned_houses.copy():
+        h.owner = heir
+        #old_house = heir.has_house
+        behavior.mobility.move_household_to_new_house(heir,h)
+        transfer_happened = True
     return transfer_happened
 
 #What happens if inheritance fails?
@@ -819,8 +834,7 @@ def failed_inheritance_no_owner(person):
     if isinstance(person,main.Person) == False:
         raise TypeError('person not a Person')
     transfer_happened = False
-    for h in person.has_community.houses:
-        if h.owner == person:
-            h.owner = None
-            transfer_happened = True
+    for h in person.owned_houses.copy():
+        h.owner = None
+        transfer_happened = True
     return transfer_happened
\ No newline at end of file
@@ -12,11 +12,23 @@ This is enacted through the MarriageRule class each Person has, which determines
     
 Together, these concepts form a single behavior that can be transmitted and 
 learned.
+
+To avoid searching a whole community for each unmarried Person, every 
+Community keeps a MarriageMarket of its living unmarried Persons indexed by 
+sex, which the get_eligible functions search instead. Each built-in 
+get_eligible function also has a matching is_eligible function that tests a 
+single candidate, which MarriageRule uses to check that a candidate would 
+accept the Person in turn without searching again.
+
+A MarriageRule can also be run in batch mode, in which case its Persons do 
+not search for spouses one by one. Instead, MarriageRule.match_batch pairs
+the unmarried Persons of a whole community in a single randomized pass 
+once per year.
 """
 
-from households import np, rd, scipy, nx, plt,inspect, kinship, residency, main, behavior
+from households import np, rd, logging, inspect, kinship, residency, main, behavior, roster, narrative
 from households.identity import *
-print('importing marriage')
+logging.getLogger(__name__).debug('importing marriage')
 #import kinship as kn
 
 class MarriageRule(object):
@@ -52,6 +64,19 @@ class MarriageRule(object):
         neolocality) or equivalent function that determines where people live
     remarriage_agetable : main.AgeTable
         Determines whether individuals can remarry after death. 
+    is_eligible : callable, optional
+        Takes a person and a candidate and returns whether the candidate is 
+        in the person's pool of eligible individuals, i.e. the test applied by
+        get_eligible to a single candidate. If None, the matching is_eligible
+        function is used for the get_eligible functions in this module, 
+        including those given parameters as a behavior.rulespec.Component; 
+        for other get_eligible functions, get_eligible is searched instead.
+    batch : bool, optional
+        If True, Persons with this rule are matched once per year for their 
+        whole community by match_batch rather than searching individually.
+    batch_draws : int, optional
+        In batch mode, the number of random members of the opposite sex each
+        Person draws as potential candidates before picking a spouse. 
     
     Attributes
     ----------
@@ -59,15 +84,34 @@ class MarriageRule(object):
         The schedule for becoming eligible for marriage.
     remarriage_agetable : main.AgeTable
         Whether a Person is allowed to remarry and at what ages. 
+    batch : bool
+        Whether Persons with this rule are matched in batch mode.
+    batch_draws : int
+        How many potential candidates are drawn per Person in batch mode.
+    spec : behavior.rulespec.RuleSpec or None
+        The specification this rule was built from, if any, which is what is
+        pickled.
     """
-    def __init__(self, eligibility_agetable,get_eligible,pick_spouse,locality,remarriage_agetable):
+    def __init__(self, eligibility_agetable,get_eligible,pick_spouse,locality,remarriage_agetable,is_eligible = None,batch = False,batch_draws = 10):
         for f, a in zip([get_eligible,pick_spouse,locality],[[1],[1],[2]]):
             if self.__verify_rule__(f,a) == True:
                 pass
             else:
                 raise ValueError('wrong number of arguments for '+str(f.__name__))
+        if is_eligible is None:
+            is_eligible = eligibility_tests.get(get_eligible)
+            #A get_eligible function given parameters is tested with its 
+            ##is_eligible function given the same parameters
+            function = getattr(get_eligible,'function',None)
+            if is_eligible is None and isinstance(get_eligible,behavior.rulespec.Component) and function in eligibility_tests:
+                is_eligible = behavior.rulespec.Component(eligibility_tests[function].__name__,*get_eligible.args,**get_eligible.kwargs)
+        elif self.__verify_rule__(is_eligible,[2]) == False:
+            raise ValueError('wrong number of arguments for '+str(is_eligible.__name__))
         self.__get_eligible = get_eligible
+        self.__is_eligible = is_eligible
         self.__pick_spouse = pick_spouse
+        #Whether pick_spouse takes the random stream of the seeker's community
+        self.__pick_random = 'random' in inspect.signature(pick_spouse).parameters
         self.__locality = locality
         if isinstance(eligibility_agetable, main.AgeTable) == False:
             raise TypeError('eligibility_agetable not of type main.AgeTable')
@@ -75,6 +119,9 @@ class MarriageRule(object):
             raise TypeError('remarriage_agetable not of type main.AgeTable')
         self.eligibility_agetable = eligibility_agetable
         self.remarriage_agetable = remarriage_agetable
+        self.batch = batch
+        self.batch_draws = batch_draws
+        self.spec = None
         
     def __call__(self,person):
         """Find a person to marry and marry them.
@@ -99,13 +146,87 @@ class MarriageRule(object):
             #No candidates, so no marriage
             return False     
         #pick spouse and set marriage status
-        spouse = self.__pick_spouse(candidates)
+        spouse = self.__pick(person,candidates)
         husband, wife = self.__marry(person,spouse)
         #locality
         result = self.__locality(husband,wife)
         #bool for whether marriage happened; result is just whether locality was succesful.
         return True
 
+    def __pick(self,person,candidates):
+        """Pick a spouse for a person, with their community's stream if accepted."""
+        if self.__pick_random == True:
+            return self.__pick_spouse(candidates,random = person.has_community.random)
+        return self.__pick_spouse(candidates)
+
+    @staticmethod
+    def match_batch(community,random = None):
+        """Pair the unmarried Persons of a community whose rules are in batch mode.
+        
+        Instead of each Person searching the whole pool of eligible individuals
+        in turn, all Persons are visited once in a random order. Each Person 
+        still unmatched draws up to `batch_draws` random unmatched Persons of 
+        another sex, keeps those who are mutually eligible (each passing the 
+        other's eligibility test, and so any sibling prohibition), and picks
+        a spouse among them with pick_spouse. Once everyone has been visited,
+        the locality of each new couple is decided and the marriages are 
+        recorded. This takes time proportional to the number of unmarried 
+        Persons rather than its square.
+        
+        Parameters
+        ----------
+        community : main.Community
+            The community whose marriage market is to be matched.
+        random : optional
+            An object with `shuffle` and `randrange` methods, by default the 
+            current stream of the community.
+        
+        Returns
+        -------
+        list of tuple of main.Person
+            The (husband, wife) pairs married.
+        """
+        if community.market.batched == 0:
+            return [] #no one to match in batch mode
+        if random is None:
+            random = community.random
+        #Pools of the unmatched Persons of each sex
+        pools = {}
+        for sex, members in community.market.bysex.items():
+            pools[sex] = roster.Pool([x for x in members if x.marriagerule.batch == True])
+        seekers = [x for pool in pools.values() for x in pool]
+        random.shuffle(seekers)
+        couples = []
+        for person in seekers:
+            if person not in pools[person.sex]:
+                continue #already matched
+            others = [pool for sex, pool in pools.items() if sex != person.sex and len(pool) > 0]
+            total = sum([len(pool) for pool in others])
+            rule = person.marriagerule
+            candidates = []
+            for i in range(min(rule.batch_draws, total)):
+                #draw uniformly across the pools of other sexes
+                j = random.randrange(total)
+                for pool in others:
+                    if j < len(pool):
+                        c = pool[j]
+                        break
+                    j -= len(pool)
+                if c not in candidates and rule.__get_reciprocal(person,c) == True and c.marriagerule.__get_reciprocal(c,person) == True:
+                    candidates.append(c)
+            if len(candidates) == 0:
+                continue
+            spouse = rule.__pick(person,candidates)
+            pools[person.sex].remove(person)
+            pools[spouse.sex].remove(spouse)
+            couples.append((rule.__marry(person,spouse),rule))
+        #Locality for all of the new couples
+        for (husband, wife), rule in couples:
+            rule.__locality(husband,wife)
+            narrative.record(husband,narrative.MarriageEvent,wife)
+            narrative.record(wife,narrative.MarriageEvent,husband)
+        return [x for x, rule in couples]
+
     def __marry(self,person,spouse):
         """Marry the two people.
 
@@ -144,11 +265,21 @@ class MarriageRule(object):
         for p in [personone,persontwo]:
             if isinstance(p,main.Person) == False:
                 raise TypeError('person not Person')
-        if (persontwo in personone.marriagerule.__get_eligible(personone)) == True:
+        rule = personone.marriagerule
+        if rule.__is_eligible is not None:
+            #Test persontwo directly rather than searching for all of personone's candidates
+            return rule.__is_eligible(personone,persontwo)
+        if (persontwo in rule.__get_eligible(personone)) == True:
             return True
         else:
             return False
             
+    def __reduce_ex__(self,protocol):
+        """Pickle a rule built from a behavior.rulespec.RuleSpec as its RuleSpec."""
+        if getattr(self,'spec',None) is not None:
+            return (behavior.rulespec.build,(self.spec,))
+        return super().__reduce_ex__(protocol)
+    
     def __verify_rule__(self,rule,argnum = [1]):
         """Check that rule is callable and has only one non-default argument.
         
@@ -176,6 +307,87 @@ class MarriageRule(object):
             raise TypeError('rule is not callable')
             return False
     
+class MarriageMarket(object):
+    """The living unmarried Persons of a Community, indexed by sex.
+    
+    Persons enter and leave the market as their marriage status changes (see
+    main.Person.marriagestatus) and leave it when they die, so that searches
+    for spouses only consider those who are currently unmarried.
+    
+    Attributes
+    ----------
+    bysex : dict of roster.Roster
+        The unmarried Persons of each identity.Sex.
+    batched : int
+        The number of unmarried Persons whose MarriageRule is in batch mode,
+        so that MarriageRule.match_batch can be skipped when there are none.
+    """
+    
+    def __init__(self):
+        self.bysex = {}
+        self.batched = 0
+    
+    def update(self,person,old,new):
+        """Add or remove a Person after a change in marriage status.
+        
+        Parameters
+        ----------
+        person : main.Person
+            The Person whose status changed.
+        old, new : identity.MarriageStatus or None
+            The previous and current marriage status of the Person.
+        """
+        if new is unmarried:
+            if old is not unmarried:
+                if person.sex not in self.bysex:
+                    self.bysex[person.sex] = roster.Roster()
+                self.bysex[person.sex].add(person)
+                if person.marriagerule.batch == True:
+                    self.batched += 1
+        elif old is unmarried:
+            self.discard(person)
+    
+    def discard(self,person):
+        """Remove a Person from the market if present.
+        
+        Parameters
+        ----------
+        person : main.Person
+            The Person to remove.
+        """
+        members = self.bysex.get(person.sex)
+        if members is not None and person in members:
+            members.remove(person)
+            if person.marriagerule.batch == True:
+                self.batched -= 1
+    
+    def candidates(self,person):
+        """Return the unmarried Persons of any sex other than that of `person`.
+        
+        Parameters
+        ----------
+        person : main.Person
+            The Person seeking a spouse.
+        
+        Returns
+        -------
+        list of main.Person
+            The unmarried Persons of other sexes.
+        """
+        output = []
+        for sex, members in self.bysex.items():
+            if sex != person.sex:
+                output.extend(members)
+        return output
+    
+    def __contains__(self,person):
+        members = self.bysex.get(person.sex)
+        return members is not None and person in members
+    
+    def __len__(self):
+        return sum([len(x) for x in self.bysex.values()])
+
+
 #eligiblity functions
 def get_eligible_all_same_community(person):
     """Gets all eligible individuals in the community. No incest prohibition.
@@ -194,7 +406,7 @@ def get_eligible_all_same_community(person):
     if isinstance(person, main.Person) == False:
         raise TypeError('person not Person')
     #get all individuals in the community who are themselves eligible
-    candidates = [p for p in person.has_community.people if p.sex != person.sex and p.marriagestatus == unmarried]
+    candidates = person.has_community.market.candidates(person)
     return candidates
 
 def get_eligible_not_sibling_same_community(person):
@@ -217,28 +429,131 @@ def get_eligible_not_sibling_same_community(person):
         raise TypeError('person not Person')
     #get all individuals in the community who are themselves eligible
     siblings = kinship.get_siblings(person)
-    if siblings == []:
-        candidates = [p for p in person.has_community.people if p.sex != person.sex and p.marriagestatus == unmarried]
-    else:
-        candidates = [p for p in person.has_community.people if p.sex != person.sex and p.marriagestatus == unmarried and p not in siblings]
+    candidates = person.has_community.market.candidates(person)
+    if siblings != []:
+        candidates = [p for p in candidates if p not in siblings]
     return candidates
 
+def get_eligible_not_related_same_community(person,threshold = .125,depth = 4):
+    """Get all eligible individuals in the community who are not close kin.
+    
+    Candidates are prohibited if their coefficient of relationship with the
+    person (see kinship.relatedness) is at least `threshold`: by default 
+    siblings, parents, uncles, aunts and their nieces and nephews, and first
+    cousins. The whole pool is filtered with one query of the World's 
+    kinship.Genealogy.
+    
+    Parameters
+    ----------
+    person : main.Person
+        The person who we are seeking matches for.
+    threshold : float, optional
+        The least coefficient of relationship that prohibits marriage.
+    depth : int, optional
+        The greatest number of links of descent followed between the two.
+
+    Returns
+    -------
+    candidates : list of main.Person
+        eligible individuals
+    """
+    if isinstance(person, main.Person) == False:
+        raise TypeError('person not Person')
+    candidates = person.has_community.market.candidates(person)
+    if len(candidates) == 0:
+        return candidates
+    r = person.has_community.has_world.genealogy.relatedness(person.id,[c.id for c in candidates],depth)
+    return [c for c, x in zip(candidates,r) if x < threshold]
+
+
+#Tests of a single candidate, matching the eligibility functions above
+def is_eligible_all_same_community(person,candidate):
+    """Return whether a candidate is eligible under get_eligible_all_same_community.
+
+    Parameters
+    ----------
+    person : main.Person
+        The person who we are seeking matches for.
+    candidate : main.Person
+        The potential match.
+
+    Returns
+    -------
+    bool
+        True if `candidate` would be returned by get_eligible_all_same_community(person).
+    """
+    return (candidate.sex != person.sex and candidate.has_community is person.has_community 
+            and candidate in person.has_community.market)
+
+def is_eligible_not_sibling_same_community(person,candidate):
+    """Return whether a candidate is eligible under get_eligible_not_sibling_same_community.
+
+    Parameters
+    ----------
+    person : main.Person
+        The person who we are seeking matches for.
+    candidate : main.Person
+        The potential match.
+
+    Returns
+    -------
+    bool
+        True if `candidate` would be returned by get_eligible_not_sibling_same_community(person).
+    """
+    if is_eligible_all_same_community(person,candidate) == False:
+        return False
+    parents = kinship.get_parents(person)
+    if parents == []:
+        return True
+    return candidate not in kinship.get_children(parents[0])
+
+def is_eligible_not_related_same_community(person,candidate,threshold = .125,depth = 4):
+    """Return whether a candidate is eligible under get_eligible_not_related_same_community.
+
+    Parameters
+    ----------
+    person : main.Person
+        The person who we are seeking matches for.
+    candidate : main.Person
+        The potential match.
+    threshold : float, optional
+        The least coefficient of relationship that prohibits marriage.
+    depth : int, optional
+        The greatest number of links of descent followed between the two.
+
+    Returns
+    -------
+    bool
+        True if `candidate` would be returned by get_eligible_not_related_same_community(person).
+    """
+    if is_eligible_all_same_community(person,candidate) == False:
+        return False
+    return kinship.relatedness(person,candidate,depth) < threshold
+
+#The is_eligible function used by default for each get_eligible function
+eligibility_tests = {get_eligible_all_same_community : is_eligible_all_same_community,
+                     get_eligible_not_sibling_same_community : is_eligible_not_sibling_same_community,
+                     get_eligible_not_related_same_community : is_eligible_not_related_same_community}
+
 
 #pick spouse functions
-def pick_spouse_random(candidates):
+def pick_spouse_random(candidates,random = rd):
     """Choose a spouse at random from the candidates.
 
     Parameters
     ----------
     candidates : list of main.Person
         Potential candidates who match
+    random : optional
+        An object with a `choice` method; MarriageRule passes the stream of 
+        the seeker's community.
 
     Returns
     -------
     spouse
         Chosen individual to marry
     """
-    spouse = rd.choice(candidates)
+    spouse = random.choice(candidates)
     return spouse
 
 
@@ -249,6 +564,10 @@ def get_empty_house(houses):
     .. deprecated::
         This function will soon be replaced by a behavior.mobility function.
     
+    Given the Community.houses list itself, the house is drawn from the 
+    community's index of vacant houses, Community.vacancies, without looking
+    at any house; only other lists of houses are searched.
+    
     Parameters
     ----------
     houses : list of House
@@ -260,12 +579,17 @@ def get_empty_house(houses):
     None or House
         Picks an empty house if one exists, otherwise returns None.
     """
+    if len(houses) == 0:
+        return None
+    community = houses[0].has_community
+    if houses is community.houses:
+        return community.vacancies.choice(community.random)
     possible_houses = [h for h in houses if len(h.people) == 0 and h.owner == None]
     if len(possible_houses) == 0:
         ## if no houses available
         return None
     else:
-        return rd.choice(possible_houses)
+        return possible_houses[0].has_community.random.choice(possible_houses)
 
 
 def locality_patrilocality(husband,wife):
@@ -348,7 +672,7 @@ def locality_neolocality(husband,wife,primary):
     #Select the primary person
     owner = husband if husband.sex == primary else wife
     # Find an empty house
-    new_house = get_empty_house(owner.has_community.houses)
+    new_house = owner.has_community.vacancies.choice(owner.has_community.random)
     if new_house == None:
         # If no house, end
         return False
@@ -10,10 +10,10 @@ whether they need to mvove. If they do, move them.
 
 """
 
-from households import np, rd, scipy, nx, plt, inspect, kinship, residency, behavior, main
+from households import np, rd, logging, inspect, kinship, residency, behavior, main
 from households.identity import *
 
-print('importing mobility')
+logging.getLogger(__name__).debug('importing mobility')
 
 class MobilityRule(object):
     """Define how and why people leave a household or a house.
@@ -45,6 +45,7 @@ class MobilityRule(object):
         self.__check_household = check_household
         self.__who_leaves_house = who_leaves_house
         self.__destination = destination
+        self.spec = None #the behavior.rulespec.RuleSpec this was built from
     
     def __call__(self, person):
         """Determine if a person will cause their household to fragment, and carry it out if so.
@@ -75,6 +76,9 @@ class MobilityRule(object):
                 #mobility happens, so identify destination
                 house = person.has_house
                 goto = self.__destination(house, who_leaves)
+                if goto is None:
+                    #Nowhere to go, so no mobility
+                    return False
                 goto.owner = person #set the person as teh owner of the house
                 for p in who_leaves:
                     move_person_to_new_house(p,goto)
@@ -82,6 +86,12 @@ class MobilityRule(object):
         else:
             return False
     
+    def __reduce_ex__(self,protocol):
+        """Pickle a rule built from a behavior.rulespec.RuleSpec as its RuleSpec."""
+        if getattr(self,'spec',None) is not None:
+            return (behavior.rulespec.build,(self.spec,))
+        return super().__reduce_ex__(protocol)
+    
     def __verify_rule__(self,rule,argnum = [1]):
         """Check that rule is callable and has only one non-default argument.
         
@@ -198,11 +208,11 @@ def check_household_younger_brothers_disinherited(person,age_of_majority):
     """
     if isinstance(person,main.Person):
         house = person.has_house
-        if house == None:
-            return False #This person doesn't live in a house right now
+        if house == None or house.owner == None:
+            return False #This person doesn't live in a house right now, or no one owns it
         #If not the owner but a brother is and this person is eligible to 
         ##marry/own property/is above the age of majority:
-        if house.owner != person and house.owner in kinship.get_siblings(house.owner) and person.age >= age_of_majority and person.sex == male:
+        if house.owner != person and house.owner in kinship.get_siblings(person) and person.age >= age_of_majority and person.sex == male:
             return True
         else:
             return False
@@ -256,14 +266,14 @@ def who_leaves_house_young_adult_brothers(person, age):
     """
     if isinstance(person,main.Person):
         house = person.has_house
-        if house == None:
-            return [] #This person doesn't live in a house right now
+        if house == None or house.owner == None:
+            return [] #This person doesn't live in a house right now, or no one owns it
         #If not the owner but a brother is and this person is eligible to 
         ##marry/own property/is above the age of majority:
-        if house.owner != person and house.owner in kinship.get_siblings(house.owner) and person.age >= age and person.sex == male:
+        if house.owner != person and house.owner in kinship.get_siblings(person) and person.age >= age and person.sex == male:
             who_leaves = kinship.get_family(person)
             #only move coresidential
-            who_leaves = [p for p in who_leaves if p not in house.people]
+            who_leaves = [p for p in who_leaves if p in house.people]
             return who_leaves
         else:
             return []
@@ -326,17 +336,13 @@ def destination_random_house_same_village(house, who_leaves):
 
     Returns
     -------
-    house
-        The new House to move to.
+    house or None
+        The new House to move to, or None if no house is available.
 
     """
-    houses = who_leaves[0].has_community.houses
-    possible_houses = [h for h in houses if len(h.people) == 0 and h.owner == None]
-    if len(possible_houses) == 0:
-        ## if no houses available
-        return None
-    else:
-        return rd.choice(possible_houses)
+    #The community keeps an index of the empty houses without owners
+    community = who_leaves[0].has_community
+    return community.vacancies.choice(community.random)
     
 def destination_radnom_house_random_village(house, who_leaves, weighting = "population"):
     """Pick a random house in a random other village.
@@ -0,0 +1,257 @@
+"""Declarative, picklable specifications of behavior rules.
+
+MarriageRule, MobilityRule, and InheritanceRuleComplex are built from
+functions, some of which take parameters (e.g. limit_heirs_by_age) or combine
+other functions (e.g. find_heirs_multiple). Rules built from lambdas, local
+functions, or closures cannot be pickled, and so cannot be sent to the worker
+processes of a parallel.ParallelWorld or a parameter sweep, nor saved with a
+simulation.
+
+This module names the functions of the behavior modules in a registry of
+`components`, to which other functions can be added with `register`. A
+Component is a registered function with some of its parameters given, which
+pickles as its name and parameters. A RuleSpec names a rule and gives its
+class and the components and other arguments it is built from; `build` turns
+it into a rule.
+
+A rule built from a RuleSpec is pickled as its RuleSpec, and unpickled by
+`build`, which keeps the rules it has built: every copy of a rule sent to the
+same process is thus the same rule object there, as it is in the process
+that built it.
+
+Examples
+--------
+A rule where sons inherit first, then the sons of brothers, and only adult
+heirs who do not own a house yet:
+    spec = RuleSpec('sons_then_nephews', 'InheritanceRuleComplex',
+                    has_property = 'has_property_houses',
+                    find_heirs = Component('find_heirs_multiple',
+                                           Component('find_heirs_children_oldest_to_youngest', sex = male),
+                                           Component('find_heirs_siblings_children_oldest_to_youngest', sex = male)),
+                    limit_heirs = Component('limit_heirs_multiple',
+                                            Component('limit_heirs_by_age', 16),
+                                            'limit_heirs_not_owners'),
+                    distribute_property = 'distribute_property_to_first_heir_and_move_household',
+                    failure = 'failed_inheritance_no_owner')
+    rule = spec.build()
+"""
+
+from households import logging, inspect, behavior
+
+import pickle
+
+logging.getLogger(__name__).debug('importing rulespec')
+
+#The registered functions, by name
+components = {}
+
+#The prefixes of the component functions of each behavior module
+_prefixes = {'inheritance' : ['has_property_', 'find_heirs_', 'limit_heirs_', 'distribute_property_', 'failed_inheritance_'],
+             'marriage' : ['get_eligible_', 'is_eligible_', 'pick_spouse_', 'locality_'],
+             'mobility' : ['check_household_', 'who_leaves_house_', 'destination_']}
+
+#The rules that can be specified, by name
+rules = {'MarriageRule' : behavior.marriage.MarriageRule,
+         'MobilityRule' : behavior.mobility.MobilityRule,
+         'InheritanceRule' : behavior.inheritance.InheritanceRule,
+         'InheritanceRuleComplex' : behavior.inheritance.InheritanceRuleComplex}
+
+#The rules built by `build` in this process, by pickled RuleSpec
+_built = {}
+
+
+def register(function, name = None):
+    """Add a function to the registry of components.
+
+    RuleSpecs and Components refer to components by name, so functions 
+    defined in a script must be registered in every process that builds rules
+    from them, e.g. by registering them at the top level of the script or of
+    a module imported by the workers. Can be used as a decorator.
+
+    Parameters
+    ----------
+    function : callable
+        The function to register.
+    name : str, optional
+        The name of the component; by default the name of the function.
+
+    Returns
+    -------
+    callable
+        The function.
+
+    Raises
+    ------
+    ValueError
+        If another function is already registered with this name.
+    """
+    if callable(function) == False:
+        raise TypeError('function is not callable')
+    name = function.__name__ if name is None else name
+    if components.get(name, function) is not function:
+        raise ValueError('a different component named ' + name + ' is already registered')
+    components[name] = function
+    return function
+
+for module, prefixes in _prefixes.items():
+    for name, function in vars(getattr(behavior, module)).items():
+        if inspect.isfunction(function) and any(name.startswith(x) for x in prefixes) and not name.endswith('_constructor'):
+            register(function)
+
+
+class Component(object):
+    """A registered function with some of its parameters given.
+
+    When called, the Component calls its function with the arguments it is
+    called with, followed by its own positional parameters and keyword
+    parameters. Its signature is that of the function without the given
+    parameters, so it is accepted by the rules wherever the function would be
+    if those parameters had defaults. A Component is pickled as its name and
+    parameters.
+
+    Parameters
+    ----------
+    name : str
+        The name of the function in `components`.
+    *args
+        Positional parameters given after the arguments of each call, e.g. the
+        functions combined by find_heirs_multiple, which may be given as the
+        names of components.
+    **kwargs
+        Keyword parameters given to each call.
+
+    Raises
+    ------
+    KeyError
+        If no component is registered with that name.
+    """
+
+    def __init__(self, name, *args, **kwargs):
+        self.name = name
+        self.__name__ = name
+        self.function = resolve(name)
+        self.args = args
+        self.kwargs = kwargs
+        self._args = tuple(resolve(x) if type(x) == str else x for x in args)
+        #The signature without the given parameters, checked by the rules
+        parameters = [x for x in inspect.signature(self.function).parameters.values() if x.name not in kwargs]
+        if any(x.kind == x.VAR_POSITIONAL for x in parameters):
+            parameters = [x for x in parameters if x.kind != x.VAR_POSITIONAL]
+        elif len(args) != 0:
+            parameters = parameters[:-len(args)]
+        self.__signature__ = inspect.Signature(parameters)
+
+    def __call__(self, *inputs):
+        return self.function(*inputs, *self._args, **self.kwargs)
+
+    def __reduce__(self):
+        return (_component, (self.name, self.args, self.kwargs))
+
+    def __repr__(self):
+        parameters = [repr(x) for x in self.args] + ['%s = %r' % x for x in self.kwargs.items()]
+        return 'Component(%s)' % ', '.join([repr(self.name)] + parameters)
+
+
+def _component(name, args, kwargs):
+    """Rebuild a pickled Component."""
+    return Component(name, *args, **kwargs)
+
+
+def resolve(name):
+    """Return the registered function with a given name.
+
+    Parameters
+    ----------
+    name : str
+        The name of the component.
+
+    Raises
+    ------
+    KeyError
+        If no component is registered with that name.
+    """
+    if name not in components:
+        raise KeyError('no component named ' + str(name))
+    return components[name]
+
+
+class RuleSpec(object):
+    """A named, picklable specification of a behavior rule.
+
+    Parameters
+    ----------
+    name : str
+        The name of the rule, e.g. 'patrilocal' or 'sons_then_nephews'.
+    rule : str
+        The class of the rule, a key of `rules`.
+    **arguments
+        The arguments of the class. Functions are given as the names of
+        components, or as Components for those with parameters; other
+        arguments, such as AgeTables, are given as they are.
+
+    Attributes
+    ----------
+    name : str
+        The name of the rule.
+    rule : str
+        The class of the rule.
+    arguments : dict
+        The arguments of the class.
+
+    Raises
+    ------
+    KeyError
+        If the class or a component is not known.
+    """
+
+    def __init__(self, name, rule, **arguments):
+        if rule not in rules:
+            raise KeyError('no rule named ' + str(rule))
+        for v in arguments.values():
+            if type(v) == str:
+                resolve(v)
+        self.name = name
+        self.rule = rule
+        self.arguments = arguments
+
+    def build(self):
+        """Return the rule specified, building it if not already built here.
+
+        Returns
+        -------
+        MarriageRule, MobilityRule, InheritanceRule, or InheritanceRuleComplex
+            The rule, with this RuleSpec as its `spec`.
+        """
+        return build(self)
+
+    def __repr__(self):
+        return 'RuleSpec(%r, %r)' % (self.name, self.rule)
+
+
+def build(spec):
+    """Return the rule of a RuleSpec, building it once per process.
+
+    Rules are kept by the contents of their RuleSpec, so the same rule is
+    returned for every copy of a RuleSpec, e.g. each time a rule built from it
+    is unpickled.
+
+    Parameters
+    ----------
+    spec : RuleSpec
+        The specification of the rule.
+
+    Returns
+    -------
+    MarriageRule, MobilityRule, InheritanceRule, or InheritanceRuleComplex
+        The rule, with `spec` as its `spec`.
+    """
+    if isinstance(spec, RuleSpec) == False:
+        raise TypeError('spec not a RuleSpec')
+    key = pickle.dumps((spec.name, spec.rule, spec.arguments))
+    rule = _built.get(key)
+    if rule is None:
+        arguments = {k : resolve(v) if type(v) == str else v for k, v in spec.arguments.items()}
+        rule = rules[spec.rule](**arguments)
+        rule.spec = spec
+        _built[key] = rule
+    return rule
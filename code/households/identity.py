@@ -12,6 +12,12 @@ Each identity typically includes attributes for use in narrative, such as
 adjective, noun, possessive, etc. By convention these are all lowercase and 
 can be capitalized when need be by stirng functions.
 
+Every identity carries a small integer `code`, its index in the `registry` of
+its class, so that identities can be stored in NumPy arrays and populations 
+filtered with vectorized comparisons. Codes are assigned in order of creation,
+so the identities defined here always have the same codes. The registry of 
+each kind of identity can be found by name in `registries`.
+
 Further planned identities include social status, race, ethnicity, gender,
 and sexuality, to allow more nuanced simulations of diverse societies.
 
@@ -24,10 +30,54 @@ narrative
     and which often takes identities as inputs from Person objects.
 """
 
-print('Importing identity')
+from households import logging
+
+logging.getLogger(__name__).debug('Importing identity')
 
 
-class Sex:
+class Identity(object):
+    """The parent class of identities, which gives each a stable integer code.
+    
+    Each subclass keeps its own `registry` of its instances, where the index 
+    of each instance is its `code`.
+    
+    Attributes
+    ----------
+    code : int
+        The index of this identity in the registry of its class.
+    """
+    
+    def __init_subclass__(cls,**kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.registry = []
+    
+    def _register(self):
+        """Give this identity the next code of its class."""
+        self.code = len(type(self).registry)
+        type(self).registry.append(self)
+    
+    def __reduce__(self):
+        #Unpickle as the registered identity, so comparisons still hold
+        return (type(self).from_code,(self.code,))
+    
+    @classmethod
+    def from_code(cls,code):
+        """Return the identity of this class with a given code.
+        
+        Parameters
+        ----------
+        code : int
+            The code of the identity.
+        """
+        return cls.registry[code]
+    
+    @classmethod
+    def adjectives(cls):
+        """Return a dict of the adjective of each identity of this class by code."""
+        return {x.code : x.adjective for x in cls.registry}
+
+
+class Sex(Identity):
     """The class for sex objects.
     
     Parameters
@@ -47,12 +97,15 @@ class Sex:
         The noun for use in text-based output.
     possessive : str
         The possessive to use for text-based output.
+    code : int
+        The index of this sex in `Sex.registry`.
     """
     
     def __init__(self,adjective,noun,possessive):
         self.adjective = adjective
         self.noun = noun
         self.possessive = possessive
+        self._register()
     @property
     def adjective(self):
         return self.__adjective
@@ -91,17 +144,23 @@ female = Sex('female','woman','her')
 male = Sex('male','man','his')
 
 
-class LifeStatus:
+class LifeStatus(Identity):
     """The class for being alive or dead.
     
     Parameters
     ----------
     adjective : str
         The adjective of this sex for use in text-based output
+    
+    Attributes
+    ----------
+    code : int
+        The index of this status in `LifeStatus.registry`.
     """
     
     def __init__(self,adjective):
         self.adjective = adjective
+        self._register()
     
     @property
     def adjective(self):
@@ -116,19 +175,25 @@ class LifeStatus:
 
 alive = LifeStatus('living')
 dead = LifeStatus('dead')
+emigrated = LifeStatus('emigrated') #moved to another community, in this World or another shard
 
-class MarriageStatus:
+class MarriageStatus(Identity):
     """The class for being married, unmarried, or ineligible.
     
     Parameters
     ----------
     adjective : str
         The adjective of this sex for use in text-based output
- 
+    
+    Attributes
+    ----------
+    code : int
+        The index of this status in `MarriageStatus.registry`.
     """
     
     def __init__(self,adjective):
         self.adjective = adjective
+        self._register()
     @property
     def adjective(self):
         return self.__adjective
@@ -145,3 +210,7 @@ unmarried = MarriageStatus('unmarried')
 married = MarriageStatus('married')
 widowed = MarriageStatus('widowed')
 
+#The registry of each kind of identity, by the name of the Person attribute
+registries = {'sex' : Sex.registry,
+              'lifestatus' : LifeStatus.registry,
+              'marriagestatus' : MarriageStatus.registry}
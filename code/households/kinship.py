@@ -11,6 +11,14 @@ functions for accessing these variables.
 
 A future extension will be to add kinship setter functions.
 
+Queries reaching further than one step, such as ancestors, descendants, and
+cousins, are answered by the Genealogy of the World: an index of the parents
+of every Person by id, with the children of each in compressed sparse row
+(CSR) form, so that the relatives of many Persons are found at once with
+NumPy rather than by following `has_parents` and `has_children` in Python.
+The Genealogy also measures how closely two Persons are related by descent,
+for marriage prohibitions beyond siblings (see `relatedness`).
+
 See Also
 --------
 residency
@@ -19,11 +27,13 @@ residency
 
 """
 __all__ = ['get_spouse','get_parents','get_children','get_siblings',
-'get_family']
+'get_family','relatedness','Genealogy']
 
 #from households import np, rd, scipy, nx, plt
 #from households.identity import *
-print('importing kinship')
+from households import np, logging, collections
+
+logging.getLogger(__name__).debug('importing kinship')
 
 
 def get_spouse(person):
@@ -120,3 +130,370 @@ def get_family(person):
 
 
 
+def relatedness(person,other,depth = 4):
+    """Return the coefficient of relationship of two Persons.
+    
+    The coefficient is twice the kinship coefficient, the probability that
+    an allele drawn from each of them is inherited from the same ancestor: 
+    1/2 for parents and children and full siblings, 1/4 for half siblings, 
+    uncles, and nieces, 1/8 for first cousins. Only ancestry up to `depth`
+    links of descent between the two is counted.
+    
+    Parameters
+    ----------
+    person : Person
+        A living Person.
+    other : Person or archive.ArchivedPerson
+        Another Person of the same World.
+    depth : int, optional
+        The greatest number of links between the two Persons through a 
+        common ancestor: 2 reaches siblings, 3 uncles and nieces, 4 first 
+        cousins, 6 second cousins.
+    
+    Returns
+    -------
+    float
+        The coefficient of relationship, 0 if not related within `depth`.
+    """
+    return 2 * person.has_community.has_world.genealogy.kinship(person.id,other.id,depth)
+
+class Genealogy(object):
+    """An index of the parents and children of every Person in a World, by id.
+    
+    Each Person is a row, at its id, of an array of the ids of its (up to 
+    two) parents. Rows are only ever added or overwritten with the same 
+    Person's parents, so the index keeps the genealogy of the dead, whether
+    or not they have been compacted (see archive). The children of each 
+    Person are kept in CSR form: the ids of all children sorted by parent, 
+    with the position of each parent's first child in `indptr`. It is 
+    rebuilt from the parents when first needed after Persons are added.
+    
+    Queries take an array of ids and return pairs: the position in the query
+    of a Person, and the id of one of their relatives. Each pair appears 
+    once, in order of position and then of id.
+    
+    Kinship coefficients computed by `relatedness` are kept in a table of 
+    the most recently used, as the genealogy of a Person never changes and
+    the same ancestors are shared by many pairs of relatives, year after 
+    year.
+    
+    Parameters
+    ----------
+    capacity : int, optional
+        The number of rows to allocate initially.
+    memo : int, optional
+        The greatest number of kinship coefficients kept.
+    
+    Attributes
+    ----------
+    parents : numpy.ndarray
+        The ids of the parents of each Person, a (capacity, 2) array, -1 
+        where unknown.
+    birthyear : numpy.ndarray
+        The year of birth of each Person.
+    size : int
+        One more than the greatest id added.
+    
+    Examples
+    --------
+        which, found = world.genealogy.cousins([p.id for p in people], 1)
+        #The first cousins of people[0]
+        [world.get_person(x) for x in found[which == 0]]
+    """
+    
+    def __init__(self,capacity = 1024,memo = 100000):
+        self.parents = np.full((capacity,2),-1,dtype = np.int64)
+        self.birthyear = np.zeros(capacity,dtype = np.int64)
+        self.size = 0
+        self.memo = memo
+        self._kinship = collections.OrderedDict()
+        self._indptr = np.zeros(1,dtype = np.int64)
+        self._indices = np.zeros(0,dtype = np.int64)
+        self._built = True
+    
+    def add(self,person,parents = None):
+        """Add or update the row of a Person, recording their parents.
+        
+        Parameters
+        ----------
+        person : Person
+            The Person, whose parents are already set.
+        parents : list of int, optional
+            The ids of the parents, if not all of them are in `has_parents`,
+            as for migrants whose parents are in another World.
+        """
+        if parents is None:
+            parents = [x.id for x in person.has_parents]
+        self._reserve(person.id)
+        self.parents[person.id] = (list(parents) + [-1,-1])[:2]
+        self.birthyear[person.id] = person.birthyear
+        self.size = max(self.size,person.id + 1)
+        self._built = False
+    
+    def add_rows(self,ids,parents,birthyear):
+        """Add or update the rows of Persons by id.
+        
+        Parameters
+        ----------
+        ids : array_like of int
+            The ids of the Persons.
+        parents : array_like of int
+            The ids of the two parents of each Person, -1 where unknown.
+        birthyear : array_like of int
+            The year of birth of each Person.
+        """
+        ids = np.asarray(ids,dtype = np.int64).ravel()
+        if len(ids) == 0:
+            return
+        top = int(ids.max())
+        self._reserve(top)
+        self.parents[ids] = parents
+        self.birthyear[ids] = birthyear
+        self.size = max(self.size,top + 1)
+        self._built = False
+    
+    def _reserve(self,id):
+        """Grow the rows geometrically until there is one for an id."""
+        while id >= len(self.parents):
+            new = np.full((2 * len(self.parents),2),-1,dtype = np.int64)
+            new[:len(self.parents)] = self.parents
+            self.parents = new
+            new = np.zeros(len(self.parents),dtype = np.int64)
+            new[:len(self.birthyear)] = self.birthyear
+            self.birthyear = new
+    
+    def children(self):
+        """Return the children of every Person in CSR form.
+        
+        Returns
+        -------
+        indptr : numpy.ndarray
+            The position in `indices` of the first child of each id, and 
+            finally the number of children.
+        indices : numpy.ndarray
+            The ids of the children of each Person in turn, in order of id.
+        """
+        if not self._built:
+            parents = self.parents[:self.size]
+            child = np.repeat(np.arange(self.size),2)
+            parent = parents.ravel()
+            known = parent >= 0
+            child, parent = child[known], parent[known]
+            order = np.argsort(parent,kind = 'stable')
+            self._indices = child[order]
+            self._indptr = np.zeros(self.size + 1,dtype = np.int64)
+            np.cumsum(np.bincount(parent,minlength = self.size),out = self._indptr[1:])
+            self._built = True
+        return self._indptr, self._indices
+    
+    def _up(self,which,ids):
+        """Return the pairs of the parents of each (position, id) pair."""
+        parents = self.parents[ids]
+        which = np.repeat(which,2)
+        parents = parents.ravel()
+        known = parents >= 0
+        return which[known], parents[known]
+    
+    def _down(self,which,ids):
+        """Return the pairs of the children of each (position, id) pair."""
+        indptr, indices = self.children()
+        starts = indptr[ids]
+        counts = indptr[ids + 1] - starts
+        total = counts.sum()
+        #The position in indices of each child: its parent's first, plus 
+        ## its rank among the parent's children
+        offsets = np.repeat(starts - np.cumsum(counts) + counts,counts) + np.arange(total)
+        return np.repeat(which,counts), indices[offsets]
+    
+    def _unique(self,which,ids):
+        """Return the distinct pairs, in order of position then of id."""
+        size = max(self.size,1)
+        keys = np.sort(which * size + ids)
+        if len(keys) > 1:
+            keys = keys[np.concatenate(([True],keys[1:] != keys[:-1]))]
+        return keys // size, keys % size
+    
+    def _walk(self,ids,depth,step):
+        """Return the pairs reached by each number of steps up to depth."""
+        ids = np.asarray(ids,dtype = np.int64).ravel()
+        if len(ids) != 0 and (ids.min() < 0 or ids.max() >= self.size):
+            raise KeyError('an id is not in the genealogy')
+        which = np.arange(len(ids))
+        levels = []
+        for i in range(depth):
+            which, ids = step(which,ids)
+            which, ids = self._unique(which,ids)
+            levels.append((which,ids))
+        return levels
+    
+    def ancestors(self,ids,depth = 1):
+        """Return the ancestors of Persons up to a number of generations back.
+        
+        Parameters
+        ----------
+        ids : array_like of int
+            The ids of the Persons.
+        depth : int, optional
+            The number of generations: 1 for parents, 2 for grandparents too,
+            and so on.
+        
+        Returns
+        -------
+        which, found : numpy.ndarray
+            The position in `ids` of each Person, and the id of each of their
+            ancestors.
+        """
+        levels = self._walk(ids,depth,self._up)
+        return self._merge(levels)
+    
+    def descendants(self,ids,depth = 1):
+        """Return the descendants of Persons down to a number of generations.
+        
+        Parameters
+        ----------
+        ids : array_like of int
+            The ids of the Persons.
+        depth : int, optional
+            The number of generations: 1 for children, 2 for grandchildren
+            too, and so on.
+        
+        Returns
+        -------
+        which, found : numpy.ndarray
+            The position in `ids` of each Person, and the id of each of their
+            descendants.
+        """
+        levels = self._walk(ids,depth,self._down)
+        return self._merge(levels)
+    
+    def cousins(self,ids,degree = 1):
+        """Return the cousins of a given degree of Persons.
+        
+        Cousins of degree n share an ancestor n + 1 generations back, but no
+        nearer one: degree 0 are siblings, 1 first cousins, 2 second cousins.
+        Half relations are included.
+        
+        Parameters
+        ----------
+        ids : array_like of int
+            The ids of the Persons.
+        degree : int, optional
+            The degree of the cousins.
+        
+        Returns
+        -------
+        which, found : numpy.ndarray
+            The position in `ids` of each Person, and the id of each of their
+            cousins.
+        """
+        if degree < 0:
+            raise ValueError('degree must not be negative')
+        ids = np.asarray(ids,dtype = np.int64).ravel()
+        levels = self._walk(ids,degree + 1,self._up)
+        def kin(generations):
+            #The descendants of the ancestors as many generations back
+            which, found = levels[generations - 1]
+            for i in range(generations):
+                which, found = self._unique(*self._down(which,found))
+            return which, found
+        which, found = kin(degree + 1)
+        #Leave out the Persons themselves and their nearer relatives
+        size = max(self.size,1)
+        nearer = [np.arange(len(ids)) * size + ids]
+        if degree > 0:
+            closer = kin(degree)
+            nearer.append(closer[0] * size + closer[1])
+        nearer = np.sort(np.concatenate(nearer))
+        keys = which * size + found
+        position = np.minimum(nearer.searchsorted(keys),len(nearer) - 1)
+        keep = nearer[position] != keys
+        return which[keep], found[keep]
+    
+    def relatedness(self,person,ids,depth = 4):
+        """Return the coefficients of relationship of a Person with others.
+        
+        Only the others who share an ancestor with the Person within `depth`
+        generations (or are their ancestors) are found with one `ancestors` 
+        query, and only for them is the kinship coefficient computed, by the 
+        usual recursion on the parents of the later born of each pair. Each
+        coefficient is kept for later queries.
+        
+        Parameters
+        ----------
+        person : int
+            The id of the Person.
+        ids : array_like of int
+            The ids of the others, e.g. the candidate spouses of the Person.
+        depth : int, optional
+            The greatest number of links between the two Persons through a 
+            common ancestor (see kinship.relatedness).
+        
+        Returns
+        -------
+        numpy.ndarray
+            The coefficient of relationship with each of the others.
+        """
+        ids = np.asarray(ids,dtype = np.int64).ravel()
+        output = np.zeros(len(ids))
+        everyone = np.concatenate(([person],ids))
+        which, found = self.ancestors(everyone,depth)
+        which = np.concatenate((which,np.arange(len(everyone))))
+        found = np.concatenate((found,everyone))
+        #The others with an ancestor, or who are an ancestor, of the Person
+        mine = np.sort(found[which == 0])
+        position = np.minimum(mine.searchsorted(found),len(mine) - 1)
+        shared = (mine[position] == found) & (which > 0)
+        for i in set((which[shared] - 1).tolist()):
+            output[i] = 2 * self.kinship(int(person),int(ids[i]),depth)
+        return output
+    
+    def kinship(self,a,b,depth = 4):
+        """Return the kinship coefficient of two Persons.
+        
+        Parameters
+        ----------
+        a, b : int
+            The ids of the Persons, or -1 for an unknown Person.
+        depth : int, optional
+            The greatest number of links between the two through a common 
+            ancestor that are followed.
+        
+        Returns
+        -------
+        float
+            The probability that an allele drawn from each is identical by 
+            descent, 1/2 or more for a Person with themselves.
+        """
+        if a < 0 or b < 0:
+            return 0.
+        if a > b:
+            a, b = b, a
+        key = (a,b,depth)
+        table = self._kinship
+        value = table.get(key)
+        if value is not None:
+            table.move_to_end(key)
+            return value
+        if a == b:
+            #One half, plus one half of the inbreeding of the Person
+            father, mother = self.parents[a].tolist()
+            value = .5 * (1 + (self.kinship(father,mother,depth - 2) if depth >= 2 else 0.))
+        elif depth <= 0:
+            value = 0.
+        else:
+            #The later born cannot be an ancestor of the other
+            x, y = (a,b) if self.birthyear[a] > self.birthyear[b] else (b,a)
+            father, mother = self.parents[x].tolist()
+            value = .5 * (self.kinship(father,y,depth - 1) + self.kinship(mother,y,depth - 1))
+        table[key] = value
+        if len(table) > self.memo:
+            table.popitem(last = False)
+        return value
+    
+    def _merge(self,levels):
+        """Return the distinct pairs of several lists of pairs."""
+        if levels == []:
+            return np.zeros(0,dtype = np.int64), np.zeros(0,dtype = np.int64)
+        return self._unique(np.concatenate([x[0] for x in levels]),
+                            np.concatenate([x[1] for x in levels]))
+
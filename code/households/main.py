@@ -12,7 +12,10 @@ The container for a given simulation is the World, which needs to be set up to c
 one Community. The World also provides some pass-through access to the People contained in all
 Communities, as well as all Diaries (which record the events of individual lives) via a library.
 The World is where each year progresses for all people, resulting in deaths, marriages, moves, 
-and births throughout all Communities.
+and births throughout all Communities. A World runs on one of two engines: the default 'object'
+engine steps each Person in turn, while the 'array' engine stores the core state of Persons
+(as ArrayPersons) in the NumPy columns of a population.Population and draws each phase for
+everyone at once.
 
 Each Community is started with a given number of Persons and Houses, as well as core 
 characteristics for the people (i.e. what their behaviors should be.) Communities are currently
@@ -29,14 +32,18 @@ modules. Houses are environmental and can only be affected by Persons. Persons (
 Houses) have their histories recorded in Diaries (defined in narrative).
 """
 
-from households import np, rd, scipy, nx, plt, kinship, residency, behavior, narrative
+from households import np, rd, logging, itertools, collections, kinship, residency, behavior, narrative, population, roster, archive
 from households.narrative import Diary
 from households.identity import *
 """Import the dependency packages defined in households.__init__.py
 
 """
 
-print('Importing main.py')
+logging.getLogger(__name__).debug('Importing main.py')
+
+#The phases of each year, each of which has its own random stream in every
+##Community; 'setup' is used when creating Persons and Houses outside a year
+phases = ['setup', 'death', 'mobility', 'marriage', 'birth']
 
 
 class World(object):
@@ -49,48 +56,231 @@ class World(object):
     communities : list of Community
         All communities in the simulation.
     library: dict of Diary
-        The Diary objects for Persons and Houses in the simulation
+        The Diary objects for Persons and Houses in the simulation; empty if
+        the World has an EventLog, as no Diary is kept then.
     year : int
         The current year. Incremented at the end of each simulation run.
-    people : list of Persons
+    people : roster.RosterView of Persons
         All living Persons currently in the simulation
-    deadpeople : list of Persons
-        All dead Persons in the simulation.
-    houses : list of House
+    deadpeople : roster.RosterView of Persons
+        All dead Persons in the simulation, which are archive.ArchivedPersons
+        once compacted.
+    archive : archive.Archive
+        The genealogy of the dead Persons moved out of memory by `compact`.
+    genealogy : kinship.Genealogy
+        The parents and children of every Person ever added, by id, for 
+        queries of ancestors, descendants, and cousins.
+    houses : roster.RosterView of House
         All Houses in all communities in the simulation.
+    engine : {'object', 'array'}
+        How Persons are stored and stepped through each year.
+    population : population.Population or None
+        The columns storing all Persons if the engine is 'array', else None.
+    person_type : type
+        The class of Person created in this World (Person or ArrayPerson).
+    eventlog : narrative.EventLog or None
+        The record of all events if kept by the World, else None (and each
+        Diary keeps its own events).
+    recording : narrative.RecordingPolicy
+        Which Persons and Houses keep a Diary, or have their events written 
+        to the EventLog.
+    seed : int
+        The seed of the root generator, from which each Community is given 
+        independent random streams in order of creation.
+    
+    Parameters
+    ----------
+    engine : {'object', 'array'}, optional
+        The 'object' engine steps through each Person in turn each phase; the
+        'array' engine stores Persons in NumPy columns and vectorizes the 
+        draws for death, marriage eligibility, remarriage, and birth.
+    eventlog : bool or narrative.EventLog, optional
+        If True, events are recorded in a columnar narrative.EventLog rather 
+        than as Event objects in each Diary. An EventLog may also be given,
+        such as a narrative.ChunkedEventLog that spills events to disk.
+    recording : narrative.RecordingPolicy, optional
+        Which Persons and Houses keep a Diary; by default all of them.
+    seed : int, optional
+        The seed of the root generator. If None, it is drawn from the `random`
+        module, so that `random.seed` still makes runs repeatable.
     """
     
-    def __init__(self):
+    def __init__(self, engine = 'object', eventlog = False, recording = None, seed = None):
+        self.seed = rd.getrandbits(64) if seed is None else seed
         self.communities = []
         self.library = {'Person' : [], 'House' : []} #stores the narrative.Diary objects
         self.year = 0
+        self._person_ids = itertools.count() #unique ids of Persons and Houses
+        self._house_ids = itertools.count()
+        #Rosters of all communities, kept up to date by each Community
+        self.archive = archive.Archive(self)
+        self._people = roster.Roster()
+        self._dead = archive.ArchivedRoster(self.archive)
+        self._houses = roster.Roster()
+        self._uncompacted = [] #the dead not yet moved into the archive
+        self.genealogy = kinship.Genealogy()
+        if engine == 'object':
+            self.population = None
+            self.person_type = Person
+        elif engine == 'array':
+            self.population = population.Population()
+            self.person_type = ArrayPerson
+        else:
+            raise ValueError('engine neither \'object\' nor \'array\'')
+        self.engine = engine
+        if isinstance(eventlog, narrative.EventLog):
+            self.eventlog = eventlog
+        else:
+            self.eventlog = narrative.EventLog() if eventlog == True else None
+        self.recording = narrative.RecordingPolicy() if recording is None else recording
     
     @property
     def people(self):
-        """List of people of all constitutent communities."""
-        output = []
-        if self.communities != []:
-            for c in self.communities:
-                output.extend(c.people)
-        return output
+        """Read-only view of the people of all constitutent communities."""
+        return self._people.view()
     
     @property            
     def deadpeople(self):
-        """List of dead people of all constitutent communities."""
-        output = []
-        if self.communities != []:
-            for c in self.communities:
-                output.extend(c.thedead)
-        return output
+        """Read-only view of the dead people of all constitutent communities."""
+        return self._dead.view()
     
     @property            
     def houses(self):
-        """List of houses of all constitutent communities."""
-        output = []
-        if self.communities != []:
-            for c in self.communities:
-                output.extend(c.houses)
-        return output
+        """Read-only view of the houses of all constitutent communities."""
+        return self._houses.view()
+    
+    def get_person(self,id):
+        """Return the living, dead, or emigrated Person with a given id, or None.
+        
+        Persons who emigrated are found among the emigrants of their former
+        Community, unless they have since arrived in this World.
+        
+        Parameters
+        ----------
+        id : int
+            The id of the Person.
+        """
+        person = self._people.get(id)
+        if person is None:
+            person = self._dead.get(id)
+        if person is None:
+            for community in self.communities:
+                person = community.emigrants.get(id)
+                if person is not None:
+                    break
+        return person
+    
+    def get_house(self,id):
+        """Return the House with a given id, or None.
+        
+        Parameters
+        ----------
+        id : int
+            The id of the House.
+        """
+        return self._houses.get(id)
+    
+    def compact(self):
+        """Move the dead Persons of this World into its Archive.
+        
+        Each dead Person is stored in the archive.Archive and replaced by an
+        archive.ArchivedPerson as the owner of any houses they still own, in 
+        the relationships of their relatives, and in the Events in their own 
+        Diary and those of their relatives, so that the Person object can be
+        freed. The rosters of the dead read the Person from the Archive from
+        then on, and the Population of the array engine no longer holds 
+        them, so no proxy is kept for those no living Person refers to. 
+        Kinship resolves through the ArchivedPersons as it did through the 
+        Persons. Only those who died since the last call are compacted.
+        
+        Returns
+        -------
+        int
+            The number of Persons compacted.
+        """
+        count = 0
+        dead, self._uncompacted = (self._uncompacted, [])
+        for person in dead:
+            proxy = self.archive.add(person)
+            #Replace the Person in the relationships of their relatives; 
+            ##the columns of the array engine are unchanged, as they hold rows
+            for parent in person.has_parents:
+                if isinstance(parent, Person):
+                    kids = parent.has_children
+                    kids[kids.index(person)] = proxy
+            for child in person.has_children:
+                if isinstance(child, Person):
+                    parents = child.has_parents
+                    parents[parents.index(person)] = proxy
+            spouse = person.has_spouse
+            if isinstance(spouse, Person) and spouse.has_spouse is person:
+                object.__setattr__(spouse, 'has_spouse', proxy)
+            for house in person.owned_houses:
+                house._owner = proxy #already counted in owned_houses
+            #Events naming the Person are in their Diary, or in those of the
+            ##relatives they married, were born to, or gave birth to; former
+            ##spouses are only known from the Person's own Diary
+            relatives = [person, spouse] + person.has_parents + person.has_children
+            if isinstance(person._diary, Diary):
+                person._diary.associated = proxy
+                relatives += person._diary.named()
+            for relative in set(relatives):
+                if relative is not None and isinstance(relative._diary, Diary):
+                    relative._diary.replace(person,proxy)
+            #The dead rows of the Population are never stepped through again
+            if self.population is not None:
+                self.population.persons[person._row] = None
+            self._dead.remove(person)
+            person.has_community.thedead.remove(person)
+            count += 1
+        return count
+    
+    def spawn_streams(self,index):
+        """Spawn the independent random streams of a Community.
+        
+        The streams are those of the child of the root generator with the 
+        Community's index, so they depend only on the seed and the index, not 
+        on what happens in other communities or which process runs them.
+        
+        Parameters
+        ----------
+        index : int
+            The index of the Community.
+        
+        Returns
+        -------
+        streams : dict of random.Random
+            A stream for each of the `phases`, for the draws of behaviors.
+        generators : dict of numpy.random.Generator
+            A generator for each of the `phases`, for the batched draws of the
+            array engine.
+        """
+        streams = {}
+        generators = {}
+        root = np.random.SeedSequence(self.seed, spawn_key = (index,))
+        for phase, seed in zip(phases, root.spawn(len(phases))):
+            forrandom, fornumpy = seed.spawn(2)
+            streams[phase] = rd.Random(int.from_bytes(forrandom.generate_state(4).tobytes(), 'little'))
+            generators[phase] = np.random.default_rng(fornumpy)
+        return streams, generators
+    
+    def get_community(self,name):
+        """Return the community with a given name.
+        
+        Parameters
+        ----------
+        name : str
+            The name of the community.
+        
+        Raises
+        ------
+        KeyError
+            If there is no community with that name in this World.
+        """
+        for c in self.communities:
+            if c.name == name:
+                return c
+        raise KeyError('no community named ' + str(name))
     
     def add_community(self,community):
         """Add a community to this World.
@@ -103,6 +293,15 @@ class World(object):
         if isinstance(community,Community):
             self.communities.append(community)
             #community.has_world = self
+            #register anyone already in the community
+            for p in getattr(community,'people',[]):
+                self._people.add(p)
+            for p in getattr(community,'thedead',[]):
+                self._dead.add(p)
+                if isinstance(p, Person):
+                    self._uncompacted.append(p)
+            for h in getattr(community,'houses',[]):
+                self._houses.add(h)
         else:
             raise TypeError('community not type Community')
             
@@ -114,7 +313,10 @@ class World(object):
         diary : narrative.Diary
             Diary to be added to the library
         """
-        self.library[type(diary.associated).__name__].append(diary)
+        if isinstance(diary.associated, Person):
+            self.library['Person'].append(diary)
+        else:
+            self.library['House'].append(diary)
             
     def progress(self):
         """Progress the world 1 time-step (year).
@@ -123,36 +325,83 @@ class World(object):
             1) randomize the order of persons,
             2) death (and thereby inheritance),
             3) mobility,
-            4) marriage, 
+            4) marriage: eligibility and remarriage draws, then matching of 
+               everyone whose MarriageRule is in batch mode, then spouse 
+               searches by the others who were unmarried at the start of the 
+               phase, so those who become eligible are matched in batch mode
+               the same year but only search the next,
             5) birth, and 
             6) end the year.
+        
+        Each phase is run for one community after another (see 
+        Community.step), with the order of persons and every draw taken from 
+        the community's stream for that phase. Messages sent between 
+        communities, such as migrations, are delivered after each phase. A 
+        community's history thus depends only on the World's seed, on its own
+        people, and on the messages it receives.
         """
-        #Step 1: randomize population order and reset statistics
-        rolodex = self.people.copy() #create a copy of the list of people
-        rd.shuffle(rolodex) #randomize the order
+        for phase in phases[1:]:
+            self.step(phase)
+            #Messages between communities are delivered between phases
+            self.deliver()
+        self.end_year()
+    
+    def step(self,phase):
+        """Run one phase of the year for all communities.
         
-        #Step 2: iterate through each person for death, marriage, and birth
-        for p in rolodex:
-            #Check if anyone dies, which also runs inheritance and removes them
-            ## from houses and teh community
-            p.die()
-        
-        rolodex = self.people.copy() #create a copy of the list of people
-        rd.shuffle(rolodex) #randomize the order
-        #Now run everything else in turn 
-        for p in rolodex:
-            #Check for household mobility
-            p.leave_home() #runs each person's mobility rule
-        rd.shuffle(rolodex) #randomize the order
-        #Go through the marriage routine for all persons
-        for p in rolodex:
-            p.marriage()
-        rd.shuffle(rolodex) #randomize the order
-        # Go through the birth routine for all persons
-        for p in rolodex:
-            p.birth()
-            
-        #Recalculate statistics        
+        Parameters
+        ----------
+        phase : {'death', 'mobility', 'marriage', 'birth'}
+            The phase to run.
+        """
+        if self.population is not None:
+            #The array engine runs the same phase with batched draws
+            self.population.step(self,phase)
+        else:
+            #Each community runs the phase in turn, drawing from its own 
+            ## stream for that phase, so its results do not depend on the others
+            for c in self.communities:
+                c.step(phase)
+    
+    def collect(self):
+        """Take the messages sent by all communities since the last delivery.
+        
+        Returns
+        -------
+        list of tuple
+            The (index of sender, name of destination, message) of each 
+            message, in order of the index of the sender and then in the 
+            order sent.
+        """
+        messages = []
+        for c in sorted(self.communities, key = lambda x: x.index):
+            messages += [(c.index, destination, message) for destination, message in c.outbox]
+            c.outbox = []
+        return messages
+    
+    def deliver(self,messages = None):
+        """Deliver messages between communities.
+        
+        Parameters
+        ----------
+        messages : list of tuple, optional
+            The (index of sender, name of destination, message) of each 
+            message, in the order to deliver them; by default those collected
+            from the communities of this World.
+        
+        Returns
+        -------
+        int
+            The number of messages delivered.
+        """
+        if messages is None:
+            messages = self.collect()
+        for sender, destination, message in messages:
+            self.get_community(destination).receive(message)
+        return len(messages)
+    
+    def end_year(self):
+        """End the year and update the statistics of every community."""
         self.year += 1
         for c in self.communities:
             c.update_stats()
@@ -198,10 +447,23 @@ class Community(object):
       
     houses : list of Houses
         The houses of the community.
-    people : list of Persons
+    vacancies : roster.Pool of Houses
+        The houses of the community that are empty and have no owner.
+    watchers : list of set
+        The sets of changed houses kept by residency.ClassificationCaches 
+        watching this community, to which added and changed houses are added.
+    people : roster.Roster of Persons
         The people who currently live in the community.
-    thedead : list of Person
-        List of all dead persons, still required for genealogy. 
+    thedead : archive.ArchivedRoster of Persons
+        All dead persons, still required for genealogy, which are 
+        archive.ArchivedPersons once compacted.
+    market : behavior.marriage.MarriageMarket
+        The living unmarried people of the community, indexed by sex.
+    tally : collections.Counter
+        The number of events of each narrative.Event class this year, counted
+        whether or not the Persons keep Diaries.
+    tallies : list of collections.Counter
+        The tally of each past year.
     
     mortab : AgeTable
         An AgeTable storing a mortality schedule for the community.
@@ -214,19 +476,42 @@ class Community(object):
         Number of houses in the community.
     housingcapacity : int
         Total housing Capacity
+    streams : dict of random.Random
+        The random stream of each of the `phases` for this community.
+    generators : dict of numpy.random.Generator
+        The generator of each of the `phases` for the array engine.
+    random : random.Random
+        The stream of the current phase, from which all behaviors of the 
+        Persons of this community draw.
+    index : int
+        The index of this community, which determines its random streams.
+    outbox : list of tuple
+        The (name of destination, message) of each message sent to another
+        community since the last delivery.
+    emigrants : roster.Roster of Persons
+        The Persons who have left this community for another.
     """
     
-    def __init__(self,world,name,pop,area,startage,mortab,birthtab,marriagerule,inheritancerule,mobilityrule):
+    def __init__(self,world,name,pop,area,startage,mortab,birthtab,marriagerule,inheritancerule,mobilityrule,index = None):
 
         self.name = name
         self.has_world = world
+        self.index = len(world.communities) if index is None else index
+        self.outbox = []
+        self.emigrants = roster.Roster()
+        self.streams, self.generators = world.spawn_streams(self.index)
+        self.random = self.streams['setup']
         self.has_world.add_community(self)
+        self.tally = collections.Counter() #events this year, by type
+        self.tallies = []
         
         # Create the houses
         self.area = area #The number of houses to create
         self.houses = []
+        self.vacancies = roster.Pool() #the empty houses without owners
+        self.watchers = []
         for i in range(area):
-            self.houses.append(House(10,self)) #Create each house with a maximum number of people who can reside there
+            self.add_house(House(10,self)) #Create each house with a maximum number of people who can reside there
         self.housingcapacity = sum([i.maxpeople for i in self.houses])    
         
         #Define dynamics of demography
@@ -247,16 +532,154 @@ class Community(object):
         # Generate the population
         self.population = pop #The number of individuals to start in the community
         # populate the community
-        self.people = []
+        self.people = roster.Roster()
+        self.thedead = archive.ArchivedRoster(self.has_world.archive,self) #store the dead Persons
+        self.market = behavior.marriage.MarriageMarket() #the unmarried Persons, by sex
         for i in range(pop):
-            self.people.append(Person(rd.choice([male,female]),startage,self,None,marriagerule,inheritancerule,mobilityrule)) #Generate a new person with age startage
+            self.add_person(self.has_world.person_type(self.random.choice([male,female]),startage,self,None,marriagerule,inheritancerule,mobilityrule)) #Generate a new person with age startage
             #NB: currently a 50-50 sex ratio, should be customisable. Consider for expansion. 
-        self.thedead = [] #store the list of dead Persons
+    
+    def step(self,phase):
+        """Run one phase of the year for the people of this community.
+        
+        The people living in the community at the start of the phase are
+        visited in a random order drawn from the phase's stream, which also
+        becomes the community's `random` stream for their behaviors.
+        
+        Parameters
+        ----------
+        phase : {'death', 'mobility', 'marriage', 'birth'}
+            The phase to run.
+        """
+        self.random = self.streams[phase]
+        rolodex = self.people.shuffled(self.random) #a randomized copy of the list of people
+        if phase == 'death':
+            #Check if anyone dies, which also runs inheritance and removes them
+            ## from houses and the community
+            for p in rolodex:
+                p.die()
+        elif phase == 'mobility':
+            for p in rolodex:
+                if p.lifestatus == alive: #skip those who emigrated this phase
+                    p.leave_home() #runs each person's mobility rule
+        elif phase == 'marriage':
+            #Those unmarried at the start of the phase search for a spouse,
+            ## after the eligibility and remarriage draws of the others and 
+            ## the matching of everyone whose marriage rule is in batch mode
+            searching = [p for p in rolodex if p.marriagestatus == unmarried]
+            for p in rolodex:
+                if p.marriagestatus == ineligible or p.marriagestatus == widowed:
+                    p.marriage()
+            behavior.marriage.MarriageRule.match_batch(self,self.random)
+            for p in searching:
+                if p.lifestatus == alive:
+                    p.marriage()
+        elif phase == 'birth':
+            for p in rolodex:
+                p.birth()
+        else:
+            raise ValueError('phase not one of death, mobility, marriage, birth')
+        self.random = self.streams['setup']
+    
+    def add_person(self,person):
+        """Add a living Person to the community and its World.
+        
+        Parameters
+        ----------
+        person : Person
+            The Person to add.
+        """
+        self.people.add(person)
+        self.has_world._people.add(person)
+        self.has_world.genealogy.add(person)
+    
+    def remove_dead(self,person):
+        """Move a Person who has died from the living to the dead.
+        
+        Parameters
+        ----------
+        person : Person
+            The Person who died.
+        """
+        self.people.remove(person)
+        self.has_world._people.remove(person)
+        self.market.discard(person)
+        self.thedead.add(person)
+        self.has_world._dead.add(person)
+        self.has_world._uncompacted.append(person)
+    
+    def send(self,destination,message):
+        """Send a message to another community, delivered after this phase.
+        
+        Parameters
+        ----------
+        destination : str
+            The name of the community to receive the message.
+        message
+            An object with a `deliver` method taking the receiving Community,
+            which must be picklable to reach another process.
+        """
+        self.outbox.append((destination,message))
+    
+    def receive(self,message):
+        """Receive a message sent by another community.
+        
+        Parameters
+        ----------
+        message
+            The message, which is delivered to this community.
+        """
+        message.deliver(self)
+    
+    def emigrate(self,persons,destination):
+        """Send Persons to live in another community.
+        
+        The Persons give up any houses they own, leave their house and this
+        community, and are marked as emigrated; a Migration carrying them is
+        sent to the destination, where they arrive after this phase. Spouses
+        left behind become widowed.
+        
+        Parameters
+        ----------
+        persons : list of Person
+            The Persons leaving, e.g. a household.
+        destination : str
+            The name of the community they move to.
+        """
+        message = Migration(persons)
+        for p in persons:
+            if p.marriagestatus == married and p.has_spouse not in persons:
+                p.has_spouse.marriagestatus = widowed
+            for h in p.owned_houses.copy():
+                h.owner = None
+            if p.has_house is not None:
+                p.has_house.remove_person(p)
+            p.lifestatus = emigrated
+            self.people.remove(p)
+            self.has_world._people.remove(p)
+            self.market.discard(p)
+            self.emigrants.add(p)
+        self.send(destination,message)
+    
+    def add_house(self,house):
+        """Add a House to the community and its World.
+        
+        Parameters
+        ----------
+        house : House
+            The House to add.
+        """
+        self.houses.append(house)
+        self.has_world._houses.add(house)
+        for x in self.watchers:
+            x.add(house)
         
     def update_stats(self):
         """Update the statistics for the community at the end of each year.
         """
         self.population = len(self.people)
+        self.tallies.append(self.tally)
+        self.tally = collections.Counter()
         self.area = len(self.houses)
         self.housingcapacity = sum([i.maxpeople for i in self.houses])
         
@@ -286,6 +709,8 @@ class Person(object):
     
     Attributes
     ----------
+    id : int
+        A unique number for this individual within the World.
     name : str
         The name of this individual. Used for narrative.
     sex : identity.Sex
@@ -306,6 +731,8 @@ class Person(object):
         The spouse of this individual.
     has_children : list of Person
         The children of this individual
+    owned_houses : list of House
+        The houses this individual owns, kept up to date by House.owner.
     birthyear : int
         The year this individual was born.   
     marriagerule : behavior.marriage.MarriageRule
@@ -314,17 +741,26 @@ class Person(object):
         The InheritanceRule implemented by this agent each year.
     mobilityrule : behavior.mobility.MobilityRule
         The MobilityRule implemented by this agent each year.  
-    diary : narrative.Diary
-        The diary of this individual that records life events.
+    diary : narrative.Diary or None
+        The diary of this individual that records life events, if the World's
+        RecordingPolicy keeps one. If the World has an EventLog, no Diary is
+        kept, and a new one viewing the log is returned each time.
     """
     
+    #Attributes are slotted to save memory in large populations
+    __slots__ = ('id', 'sex', 'name', 'age', 'has_community', 'has_house', 
+                 'marriagerule', 'inheritancerule', 'mobilityrule', 'lifestatus',
+                 '_marriagestatus', 'has_spouse', 'has_parents', 'has_children',
+                 'owned_houses', 'birthyear', '_diary')
+    
     #Note: remarriage needs to be added as an option
     def __init__(self, sex, age, has_community, has_house, marriagerule, inheritancerule, mobilityrule):
+        self.id = next(has_community.has_world._person_ids)
         self.sex = sex
         if sex == male:
-            self.name = rd.choice(narrative.male_names)
+            self.name = has_community.random.choice(narrative.male_names)
         else:
-            self.name = rd.choice(narrative.female_names)
+            self.name = has_community.random.choice(narrative.female_names)
         self.age = age
         self.has_community = has_community #link to the community
         self.has_house = has_house #link to their house
@@ -337,11 +773,25 @@ class Person(object):
         self.has_spouse = None #The individual to whom this individual is married
         self.has_parents = []
         self.has_children = []
+        self.owned_houses = []
         
         self.birthyear = self.has_community.has_world.year - age
-        self.diary = Diary(self)
-        self.has_community.has_world.add_diary(self.diary)
-        self.diary.add_event(narrative.BornEvent)
+        if self.has_community.has_world.recording.records(self) == False:
+            self._diary = None
+        elif self.has_community.has_world.eventlog is None:
+            self._diary = Diary(self)
+            self.has_community.has_world.add_diary(self._diary)
+        else:
+            #Events are written to the EventLog, so no Diary is kept
+            self._diary = True
+        narrative.record(self,narrative.BornEvent)
+    
+    @property
+    def diary(self):
+        """The Diary of this Person, or None if they are not recorded."""
+        if self._diary is True:
+            return Diary(self)
+        return self._diary
 
         
     def die(self):
@@ -353,17 +803,25 @@ class Person(object):
         """
         #figure out if this person dies
         r = self.has_community.mortab.get_rate(self.sex,self.age)
-        if r <= rd.random(): #stay alive
+        if r <= self.has_community.random.random(): #stay alive
             self.age += 1
         else: #if this person died this year, toggle them to be removed from the community
-            self.lifestatus = dead
-            self.diary.add_event(narrative.DeathEvent)
-            if self.marriagestatus == married:
-                self.has_spouse.marriagestatus = widowed
-            self.inheritancerule(self)
-            if self.has_house is not None:
-                self.has_house.remove_person(self)
-            self.has_community.thedead.append(self.has_community.people.remove(self))
+            self.enact_death()
+
+    def enact_death(self):
+        """Make this Person die.
+        
+        Records the death, widows the spouse, runs inheritance, and removes 
+        the Person from their house and the living population.
+        """
+        self.lifestatus = dead
+        narrative.record(self,narrative.DeathEvent)
+        if self.marriagestatus == married:
+            self.has_spouse.marriagestatus = widowed
+        self.inheritancerule(self)
+        if self.has_house is not None:
+            self.has_house.remove_person(self)
+        self.has_community.remove_dead(self)
 
     def marriage(self):
         """Check whether this person gets married this timestep.
@@ -374,18 +832,20 @@ class Person(object):
         if self.marriagestatus == married: #if married, don't run this script
             pass
         elif self.marriagestatus == unmarried: #if this person is eligible to be married
+            if self.marriagerule.batch == True:
+                return #matched for the whole community by MarriageRule.match_batch
             #run the marriage rules
             self.marriagerule(self)
             if self.marriagestatus == married: #if successful, record it
-                self.diary.add_event(narrative.MarriageEvent,self.has_spouse)
-                self.has_spouse.diary.add_event(narrative.MarriageEvent,self)
+                narrative.record(self,narrative.MarriageEvent,self.has_spouse)
+                narrative.record(self.has_spouse,narrative.MarriageEvent,self)
         elif self.marriagestatus == ineligible: #if none (== too young for marriage), check eligibility
             e = self.marriagerule.eligibility_agetable.get_rate(self.sex,self.age)
-            if rd.random() < e: #If eligibility possible, change staus
+            if self.has_community.random.random() < e: #If eligibility possible, change staus
                 self.marriagestatus = unmarried
         elif self.marriagestatus == widowed:
             r = self.marriagerule.remarriage_agetable.get_rate(self.sex,self.age)
-            if rd.random() < r:
+            if self.has_community.random.random() < r:
                 self.marriagestatus = unmarried
         else:
             raise ValueError('marriagestatus not of identity.MarriageStatus')
@@ -399,15 +859,44 @@ class Person(object):
         """
         if self.sex == female and [self.has_spouse.lifestatus if self.marriagestatus == married else dead][0] == alive: #If married, husband is alive, and self is a woman
             b = self.has_community.birthtab.get_rate(self.sex,self.age)
-            if rd.random() < b: # if giving birth
-                # Create a new child with age 0
-                child = Person(rd.choice([male,female]),0,self.has_community,self.has_house,self.marriagerule,self.inheritancerule, self.mobilityrule) #currently maternal transmission of inheritance rules
-                child.has_parents = [self,self.has_spouse]
-                self.has_children.append(child)
-                self.has_spouse.has_children.append(child)
-                self.has_community.people.append(child) #add to the community
-                self.has_house.add_person(child)
-                self.diary.add_event(narrative.BirthEvent,child)
+            if self.has_community.random.random() < b: # if giving birth
+                self.enact_birth()
+    
+    def enact_birth(self):
+        """Make this Person give birth to a child in the same house.
+        
+        Returns
+        -------
+        Person
+            The newborn child.
+        """
+        # Create a new child with age 0
+        child = type(self)(self.has_community.random.choice([male,female]),0,self.has_community,self.has_house,self.marriagerule,self.inheritancerule, self.mobilityrule) #currently maternal transmission of inheritance rules
+        child.has_parents = [self,self.has_spouse]
+        self.has_children.append(child)
+        self.has_spouse.has_children.append(child)
+        self.has_community.add_person(child) #add to the community
+        self.has_house.add_person(child)
+        narrative.record(self,narrative.BirthEvent,child)
+        return child
+    
+    @property
+    def marriagestatus(self):
+        """The marriage status of the individual.
+        
+        Setting the status also keeps the community's MarriageMarket up to date,
+        and marks the Person's house as changed.
+        """
+        return self._marriagestatus
+    
+    @marriagestatus.setter
+    def marriagestatus(self, x):
+        old = getattr(self, '_marriagestatus', None)
+        self._marriagestatus = x
+        house = getattr(self, 'has_house', None)
+        if house is not None and x is not old:
+            house.mark_changed() #the household's couples may have changed
+        self.has_community.market.update(self, old, x)
     
     def leave_home(self):
         """Determine whether this person leaves home through household mobility/fission/migration.
@@ -418,6 +907,34 @@ class Person(object):
         result = self.mobilityrule(self)
         return result
 
+
+class ArrayPerson(Person):
+    """A Person whose core state is stored in the columns of a Population.
+    
+    ArrayPersons are created instead of Persons in a World with the 'array'
+    engine. They behave exactly as Persons, but their sex, statuses, spouse,
+    parents, house, community, and rules are copied into the World's 
+    population.Population whenever they change, and their age is kept only
+    there. This allows each yearly phase to be drawn for all Persons at once.
+    
+    Parameters and attributes are the same as for Person.
+    """
+    
+    __slots__ = ('_population', '_row')
+    
+    age = population.Column('age')
+    
+    def __init__(self, sex, age, has_community, has_house, marriagerule, inheritancerule, mobilityrule):
+        self._population = has_community.has_world.population
+        self._row = self._population.add_person(self)
+        super().__init__(sex, age, has_community, has_house, marriagerule, inheritancerule, mobilityrule)
+    
+    def __setattr__(self, name, value):
+        """Set an attribute, copying it into the Population if mirrored."""
+        object.__setattr__(self, name, value)
+        if name in population.mirrored:
+            self._population.store(self._row, name, value)
+
     
                 
 
@@ -437,6 +954,8 @@ class House(object):
 
     Attributes
     ----------
+    id : int
+        A unique number for this house within the World.
     maxpeople : int
         Maximum number of residents before the house is crowded. Currently no 
         repercussion for a crowded house.
@@ -450,19 +969,41 @@ class House(object):
         The person who owns this house. Assumes single or primary ownership.
     address : str
         The name of the house, to make individuality clearer in narrative.
+    version : int
+        A counter increased whenever someone moves in or out, or a resident 
+        marries or is widowed, so that a classification of the household can
+        be reused while it is unchanged (see residency.ClassificationCache).
     """
     
+    __slots__ = ('id', 'maxpeople', 'rooms', 'has_community', 'people', 
+                 '_owner', 'address', '_diary', 'version')
+    
     #EVENTUALLY, houses may be expanded, change through time, have value,
     ## require maintenance, etc. 
     def __init__(self,maxpeople,has_community):
+        self.id = next(has_community.has_world._house_ids)
         self.maxpeople = maxpeople
         self.rooms = 1
         self.has_community = has_community
         self.people = []
-        self.owner = None #pointer to the person who owns the house
-        self.address = str(rd.randrange(1,101,2)) + ' ' + rd.choice(narrative.address_names) 
-        self.diary = Diary(self)
-        self.has_community.has_world.add_diary(self.diary)
+        self.version = 0
+        self.owner = None #pointer to the person who owns the house; also marks the house vacant
+        self.address = str(has_community.random.randrange(1,101,2)) + ' ' + has_community.random.choice(narrative.address_names) 
+        if self.has_community.has_world.recording.records_house(self) == False:
+            self._diary = None
+        elif self.has_community.has_world.eventlog is None:
+            self._diary = Diary(self)
+            self.has_community.has_world.add_diary(self._diary)
+        else:
+            #Events are written to the EventLog, so no Diary is kept
+            self._diary = True
+    
+    @property
+    def diary(self):
+        """The Diary of this House, or None if it is not recorded."""
+        if self._diary is True:
+            return Diary(self)
+        return self._diary
     
     def add_person(self,tobeadded):
         """Add a person to the house.
@@ -473,8 +1014,10 @@ class House(object):
             The person to be added to the residents of the house.
         """
         self.people.append(tobeadded)
-        tobeadded.diary.add_event(narrative.EnterhouseEvent)
+        self.mark_changed()
+        narrative.record(tobeadded,narrative.EnterhouseEvent)
         tobeadded.has_house = self
+        self.__update_vacancy()
     
     def remove_person(self,toberemoved):
         """Remove a person from the house.
@@ -485,10 +1028,151 @@ class House(object):
             The person to be removed from the residents of the house
         """
         self.people.remove(toberemoved)
-        toberemoved.diary.add_event(narrative.LeaveHouseEvent)
+        self.mark_changed()
+        narrative.record(toberemoved,narrative.LeaveHouseEvent)
         toberemoved.has_house = None
+        self.__update_vacancy()
+    
+    def mark_changed(self):
+        """Record that the household has changed and may need reclassifying.
+        
+        Increases the version of the house and adds it to the sets of changed
+        houses watching its community.
+        """
+        self.version += 1
+        for x in self.has_community.watchers:
+            x.add(self)
+    
+    @property
+    def owner(self):
+        """The person who owns this house, or None.
+        
+        Setting the owner also keeps the owned_houses of the previous and new
+        owners and the community's index of vacant houses up to date.
+        """
+        return self._owner
+    
+    @owner.setter
+    def owner(self,x):
+        old = getattr(self,'_owner',None)
+        if x is not old:
+            if old is not None:
+                old.owned_houses.remove(self)
+            if x is not None:
+                x.owned_houses.append(self)
+        self._owner = x
+        self.__update_vacancy()
+    
+    def __update_vacancy(self):
+        """Add this house to its community's vacancies if empty and unowned, else remove it."""
+        if len(self.people) == 0 and self._owner is None:
+            self.has_community.vacancies.add(self)
+        else:
+            self.has_community.vacancies.discard(self)
         
 
+class Migration(object):
+    """A message carrying Persons from one community to another.
+    
+    The Persons are recorded by their attributes and rules, so that the 
+    message can be sent to a community in another process. On delivery they 
+    become new Persons of the destination, recorded as born there at their 
+    current age (as founders are), who keep their names, their marriages and
+    parentage among themselves, and move into a vacant house if there is one.
+    A married Person whose spouse stays behind arrives widowed, since the 
+    marriage cannot be followed across communities.
+    
+    The rest of their parentage is kept in the kinship.Genealogy of the World
+    they arrive in, rather than by `has_parents`, so that rules following
+    relatives (such as inheritance) stay within a community. The ids of 
+    their parents are added to the genealogy, and, as their ancestors may be
+    in another World shard, the message carries the genealogy of their 
+    ancestors up to `depth` generations back. Their relatedness to their 
+    ancestors and the descendants of their ancestors is then the same as 
+    before they moved; children who stay behind are only related to them 
+    through the Person who left.
+    
+    Parameters
+    ----------
+    persons : list of Person
+        The Persons moving, with the one to own any new house first.
+    
+    Attributes
+    ----------
+    people : list of tuple
+        The id, sex code, age, name, birthyear, marriage status code, index 
+        of spouse (or -1), ids of parents, and rules of each Person moving.
+    ancestry : tuple of numpy.ndarray
+        The ids, ids of the parents, and years of birth of the ancestors of
+        the Persons moving.
+    depth : int
+        The number of generations of ancestors carried, the default depth of
+        kinship.relatedness.
+    """
+    
+    depth = 4
+    
+    def __init__(self,persons):
+        order = {id(x) : i for i, x in enumerate(persons)}
+        self.people = []
+        ancestors = np.zeros(0,dtype = np.int64)
+        for p in persons:
+            spouse = order.get(id(p.has_spouse),-1)
+            #From the genealogy, as those who migrated before may have parents
+            ##who are not in has_parents
+            genealogy = p.has_community.has_world.genealogy
+            parents = [x for x in genealogy.parents[p.id].tolist() if x >= 0]
+            self.people.append((p.id,p.sex.code,p.age,p.name,p.birthyear,p.marriagestatus.code,
+                                spouse,parents,p.marriagerule,p.inheritancerule,p.mobilityrule))
+        if len(persons) != 0:
+            ancestors = np.unique(genealogy.ancestors([p.id for p in persons],self.depth)[1])
+            self.ancestry = (ancestors,genealogy.parents[ancestors],genealogy.birthyear[ancestors])
+        else:
+            self.ancestry = (ancestors,np.zeros((0,2),dtype = np.int64),ancestors)
+    
+    def deliver(self,community):
+        """Create the Persons in the receiving community.
+        
+        Parameters
+        ----------
+        community : Community
+            The destination.
+        
+        Returns
+        -------
+        list of Person
+            The Persons who arrived.
+        """
+        world = community.has_world
+        world.genealogy.add_rows(*self.ancestry)
+        arrived = []
+        for number, sex, age, name, birthyear, status, spouse, parents, marriagerule, inheritancerule, mobilityrule in self.people:
+            p = world.person_type(Sex.registry[sex],age,community,None,marriagerule,inheritancerule,mobilityrule)
+            p.name = name
+            p.birthyear = birthyear
+            community.add_person(p)
+            arrived.append(p)
+        moving = {x[0] : p for x, p in zip(self.people,arrived)}
+        for p, (number, sex, age, name, birthyear, status, spouse, parents, *rules) in zip(arrived,self.people):
+            status = MarriageStatus.registry[status]
+            if spouse >= 0:
+                p.has_spouse = arrived[spouse]
+            elif status == married:
+                status = widowed
+            p.marriagestatus = status
+            p.has_parents = [moving[x] for x in parents if x in moving]
+            for x in p.has_parents:
+                x.has_children.append(p)
+            #The genealogy has the parents who stayed behind too
+            world.genealogy.add(p,[moving[x].id if x in moving else x for x in parents])
+        house = community.vacancies.choice(community.random)
+        if house is not None and len(arrived) != 0:
+            house.owner = arrived[0]
+            for p in arrived:
+                house.add_person(p)
+        return arrived
+
+
 class AgeTable(object):
     """Store age-specific annual rates of death, marriage, birth, etc.
     
@@ -505,6 +1189,13 @@ class AgeTable(object):
         The variables defining which rates correspond to which sex.
     rates1, rates2 : list
         Annual chance of occurence for each interval. n.b. that len(rates) - len(ages) - 1  
+    
+    Notes
+    -----
+    Ages must be whole numbers. The intervals are compiled when the AgeTable
+    is created into a dense table with one rate per year of age, so that 
+    get_rate is a single lookup and get_rates can look up the rates of a 
+    whole population at once.
     """
     
     def __init__(self,ages,sex1,rates1,sex2,rates2):
@@ -513,6 +1204,32 @@ class AgeTable(object):
         self._rates1 = rates1
         self._sex2 = sex2
         self._rates2 = rates2  
+        self.__compile()
+        
+    def __compile(self):
+        """Compile the intervals into a dense table of rates for every year of age.
+        
+        Row i of the table holds the rates of the Sex with code i for each 
+        single year of age from ages[0] up to, but excluding, ages[-1]. Any 
+        sex other than sex1 takes rates2, as in get_rate.
+        """
+        if any([int(x) != x for x in self._ages]):
+            raise ValueError('ages are not whole numbers')
+        if any([self._ages[i] >= self._ages[i+1] for i in range(len(self._ages)-1)]):
+            raise ValueError('ages are not increasing')
+        n = len(self._ages) - 1
+        if len(self._rates1) < n or len(self._rates2) < n:
+            raise ValueError('fewer rates than age intervals')
+        self._lower = int(self._ages[0])
+        self._upper = int(self._ages[-1])
+        widths = np.diff(np.asarray(self._ages, dtype = int))
+        dense1 = np.repeat(np.asarray(self._rates1[:n], dtype = float), widths)
+        dense2 = np.repeat(np.asarray(self._rates2[:n], dtype = float), widths)
+        self._table = np.tile(dense2, (len(Sex.registry), 1))
+        self._table[self._sex1.code] = dense1
+        #Python lists are faster than arrays for scalar lookups
+        self._dense1 = dense1.tolist()
+        self._dense2 = dense2.tolist()
         
     def get_rate(self,sex,age):
         """Return the annual rate for a given sex and age.
@@ -530,12 +1247,33 @@ class AgeTable(object):
             The rate for that age and sex.
             
         """
-        i = [i for i in range(len(self._ages)-1) if age>=self._ages[i] and 
-        age<self._ages[i+1]][0]
+        if age < self._lower or age >= self._upper:
+            raise IndexError('age outside the range of the AgeTable')
         if sex == self._sex1:
-            return self._rates1[i]
+            return self._dense1[age - self._lower]
         else:
-            return self._rates2[i]
+            return self._dense2[age - self._lower]
+    
+    def get_rates(self,sex_codes,ages):
+        """Return the annual rates for many sexes and ages at once.
+
+        Parameters
+        ----------
+        sex_codes : array_like of int
+            The code of the sex of each individual (see identity.Sex.code).
+        ages : array_like of int
+            The age of each individual. All must be within defined range of 
+            table.
+ 
+        Returns
+        -------
+        numpy.ndarray
+            The rate for each age and sex.
+        """
+        ages = np.asarray(ages)
+        if ages.size != 0 and (ages.min() < self._lower or ages.max() >= self._upper):
+            raise IndexError('age outside the range of the AgeTable')
+        return self._table[sex_codes, ages - self._lower]
         
     def NullAgeTable():
         """Define a null AgeTable.
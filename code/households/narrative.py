@@ -11,23 +11,42 @@ events in each Person's life. It also defines the name base and address base
 used for the simulation, which should be modified if desired before generating 
 the founder's population.
 
+By default each Diary stores its own Event objects. A World created with 
+`eventlog=True` instead records every event as one row of integer codes and 
+ids in a columnar EventLog, and each Diary becomes a view that rebuilds its
+Events from the log when they are read. This keeps memory from growing with
+an object per event for large or long simulations. For runs too long to keep
+even the columnar log in memory, a ChunkedEventLog buffers a fixed number of 
+events and flushes each full buffer to a `.npy` chunk file in a directory, 
+from which the chunks can be memory-mapped with `open_chunks` after the run.
+
+Which Persons keep a Diary at all is decided by the RecordingPolicy of the 
+World. Events are recorded through `record`, which always counts the event 
+in the tally of the Person's Community but only writes it to a Diary if the
+Person has one.
+
 Notes
 -----
 This will eventually be extended to include Community and and World objects.
 """
 
-from households import kinship, residency, main
+from households import np, rd, logging, os, kinship, residency, main, archive
 from households.identity import *
 
-print('loading narrative')
+logging.getLogger(__name__).debug('loading narrative')
 
 class Diary(object):
     """A place to record events as they occur for Persons.
     
+    When the World has an EventLog, Persons and Houses do not keep a Diary;
+    their `diary` attribute instead returns a new Diary each time, which 
+    reads and writes their events in the log.
+    
     Parameters
     ----------
     associated
-        The Person this is a diary for.
+        The Person or House this is a diary for, or the archive.ArchivedPerson 
+        standing in for a Person once they are compacted.
     
     Attributes
     ----------
@@ -35,8 +54,11 @@ class Diary(object):
         A dict of Events by year.
     
     """
+    
+    __slots__ = ('associated', 'events')
+    
     def __init__(self,associated):
-        if isinstance(associated, main.Person) == False and isinstance(associated, main.House) == False:
+        if isinstance(associated, (main.Person, main.House, archive.ArchivedPerson)) == False:
             raise TypeError('associated neither House nor Person')
         else:
             self.associated = associated
@@ -47,6 +69,11 @@ class Diary(object):
         """Get the current year from the World."""
         return self.associated.has_community.has_world.year
     
+    @property
+    def eventlog(self):
+        """Get the EventLog of the World, or None if events are stored here."""
+        return self.associated.has_community.has_world.eventlog
+    
     def add_event(self,eventtype,detail = None):
         """Add an event to the Diary.
         
@@ -57,13 +84,23 @@ class Diary(object):
         detail : optional
             Any additional detail relevant for that Event class.
         """
+        #The events of a House have no Person
+        if isinstance(self.associated,main.House):
+            house, person = (self.associated, None)
+        else:
+            house, person = (self.associated.has_house, self.associated)
+        log = self.eventlog
+        if log is not None:
+            #Record the event in the World's EventLog instead
+            log.append(eventtype,self.current_year,person,house,detail)
+            return
         if issubclass(eventtype,Event) == False:
             raise TypeError('eventtype not of subclass Event')
         year = self.current_year
         if detail == None:
-            event = eventtype(year,self.associated.has_house,self.associated)
+            event = eventtype(year,house,person)
         else:
-            event = eventtype(year,self.associated.has_house,self.associated, detail)
+            event = eventtype(year,house,person, detail)
         if year in self.events.keys():
             #This year already exists, so add to it
             self.events[year].append(event)
@@ -71,6 +108,40 @@ class Diary(object):
             #This year doesn't exist, so create it
             self.events[year] = [event]
             
+    def named(self):
+        """Return the Persons named in the Events of the Diary.
+        
+        Returns
+        -------
+        list of main.Person
+            The Persons involved in the Events, including the Person whose
+            Diary it is, in no particular order.
+        """
+        named = set()
+        for events in self.events.values():
+            for event in events:
+                for name in event.attributes():
+                    value = getattr(event,name,None)
+                    if isinstance(value,(main.Person,archive.ArchivedPerson)):
+                        named.add(value)
+        return list(named)
+    
+    def replace(self,old,new):
+        """Replace a Person or House wherever it appears in the Events.
+        
+        Parameters
+        ----------
+        old : main.Person or main.House
+            The Person or House to replace.
+        new
+            What to replace it with, e.g. an archive.ArchivedPerson.
+        """
+        for events in self.events.values():
+            for event in events:
+                for name in event.attributes():
+                    if getattr(event,name,None) is old:
+                        setattr(event,name,new)
+    
     def get_events(self,year=None):
         """REturns the dict of all events or events from one year
         
@@ -84,6 +155,21 @@ class Diary(object):
         dict of list of Events
             dict of Events, stored as lists of events with years as keys
         """
+        log = self.eventlog
+        if log is not None:
+            #Build the events from the World's EventLog
+            world = self.associated.has_community.has_world
+            if isinstance(self.associated,main.House):
+                rows = log.rows(house = self.associated, year = year)
+            else:
+                rows = log.rows(person = self.associated, year = year)
+            events = {}
+            for i in rows:
+                event = log.get_event(world,i)
+                events.setdefault(event.year,[]).append(event)
+            if year is None:
+                return events
+            return events.get(year,[])
         if year is None:
             #REturn all events
             return self.events
@@ -95,17 +181,479 @@ class Diary(object):
                 return []
 
 
+class RecordingPolicy(object):
+    """Decide which Persons and Houses keep a Diary.
+    
+    Persons without a Diary do not have their events written anywhere, 
+    though their events are still counted in their Community's tally.
+    
+    Parameters
+    ----------
+    mode : {'all', 'none', 'sample', 'watchlist', 'community'}, optional
+        Record everyone, no one, a random fraction of Persons, the Persons 
+        with the given ids, or everyone in the given communities.
+    fraction : float, optional
+        The fraction of Persons recorded in 'sample' mode.
+    watchlist : iterable of int, optional
+        The ids of the Persons recorded in 'watchlist' mode.
+    communities : iterable of str, optional
+        The names of the communities recorded in 'community' mode.
+    seed : optional
+        Seed for the sample, which is drawn separately from the simulation
+        so that sampling does not change its course.
+    """
+    
+    modes = ['all','none','sample','watchlist','community']
+    
+    def __init__(self,mode = 'all',fraction = 1.,watchlist = (),communities = (),seed = None):
+        if mode not in self.modes:
+            raise ValueError('mode not one of ' + ', '.join(self.modes))
+        self.mode = mode
+        self.fraction = fraction
+        self.watchlist = set(watchlist)
+        self.communities = set(communities)
+        self._random = rd.Random(seed)
+    
+    def records(self,person):
+        """Return whether a new Person should keep a Diary.
+        
+        Parameters
+        ----------
+        person : main.Person
+            The Person being created.
+        
+        Returns
+        -------
+        bool
+        """
+        if self.mode == 'all':
+            return True
+        elif self.mode == 'none':
+            return False
+        elif self.mode == 'sample':
+            return self._random.random() < self.fraction
+        elif self.mode == 'watchlist':
+            return person.id in self.watchlist
+        else:
+            return person.has_community.name in self.communities
+    
+    def records_house(self,house):
+        """Return whether a new House should keep a Diary.
+        
+        Houses are recorded in 'all' mode, and in 'community' mode if in
+        one of the communities.
+        
+        Parameters
+        ----------
+        house : main.House
+            The House being created.
+        
+        Returns
+        -------
+        bool
+        """
+        if self.mode == 'all':
+            return True
+        elif self.mode == 'community':
+            return house.has_community.name in self.communities
+        return False
+
+
+def record(person,eventtype,detail = None):
+    """Record an event in the life of a Person.
+    
+    The event is counted in the tally of the Person's Community, then added
+    to their Diary if they keep one, or to the World's EventLog if they are
+    recorded there.
+    
+    Parameters
+    ----------
+    person : main.Person
+        The Person the event happened to.
+    eventtype : Event class
+        An event that has occurred with its own particular class.
+    detail : optional
+        Any additional detail relevant for that Event class.
+    """
+    person.has_community.tally[eventtype] += 1
+    diary = person._diary
+    if diary is True:
+        #Written straight to the log, without creating a Diary to view it
+        world = person.has_community.has_world
+        world.eventlog.append(eventtype,world.year,person,person.has_house,detail)
+    elif diary is not None:
+        diary.add_event(eventtype,detail)
+
+
+class EventLog(object):
+    """A columnar record of events for all Persons in a World.
+    
+    Each event is stored as one row of integers: the code of its Event class,
+    the year, the id of the Person, the id of the House, and the id of any
+    detail (a Person or House, depending on the Event class). Each column has
+    the smallest type that holds its values (see `dtype`), so that a row takes
+    16 bytes. Columns are grown geometrically as events are added.
+    
+    Parameters
+    ----------
+    capacity : int, optional
+        The number of rows to allocate initially.
+    
+    Attributes
+    ----------
+    size : int
+        The number of events recorded.
+    eventtype, year, person, house, detail : numpy.ndarray
+        The columns of the log; -1 means None for the ids.
+    detailkind : numpy.ndarray
+        Whether the detail is a Person (1), a House (2), or absent (0).
+    dtype : numpy.dtype
+        The type of a row: int8 for the codes, int16 for the year, and int32
+        for the ids.
+    """
+    
+    dtype = np.dtype([('eventtype',np.int8),('year',np.int16),('person',np.int32),
+                      ('house',np.int32),('detail',np.int32),('detailkind',np.int8)])
+    columns = list(dtype.names)
+    
+    #The number of events no longer held in the columns
+    flushed = 0
+    
+    def __init__(self,capacity = 4096):
+        self.size = 0
+        for name in self.columns:
+            setattr(self,name,np.full(capacity,-1,dtype = self.dtype[name]))
+    
+    def append(self,eventtype,year,person,house,detail = None):
+        """Record an event.
+        
+        Parameters
+        ----------
+        eventtype : Event class
+            The type of event that occurred.
+        year : int
+            The year the event occurred.
+        person : main.Person or None
+            The Person whose event it is, or None for an event of a House.
+        house : main.House or None
+            The House where the event occurred.
+        detail : main.Person, main.House, or None
+            Any additional detail relevant for that Event class.
+        """
+        code = event_codes.get(eventtype)
+        if code is None:
+            raise TypeError('eventtype not of subclass Event')
+        i = self.size - self.flushed
+        if i == len(self.year):
+            self._grow()
+        self.eventtype[i] = code
+        self.year[i] = year
+        self.person[i] = -1 if person is None else person.id
+        self.house[i] = -1 if house is None else house.id
+        if detail is None:
+            self.detailkind[i] = 0
+        else:
+            self.detail[i] = detail.id
+            self.detailkind[i] = 2 if isinstance(detail,main.House) else 1
+        self.size += 1
+    
+    def _grow(self):
+        """Double the number of allocated rows."""
+        for name in self.columns:
+            old = getattr(self,name)
+            new = np.full(2*len(old),-1,dtype = old.dtype)
+            new[:len(old)] = old
+            setattr(self,name,new)
+    
+    def rows(self,person = None,house = None,year = None):
+        """Return the rows of the events matching the given criteria.
+        
+        Parameters
+        ----------
+        person : main.Person, optional
+            Only events of this Person.
+        house : main.House, optional
+            Only events that occurred in this House.
+        year : int, optional
+            Only events of this year.
+        
+        Returns
+        -------
+        numpy.ndarray
+            The matching rows, in the order recorded.
+        """
+        select = np.ones(self.size,dtype = bool)
+        if person is not None:
+            select &= self.person[:self.size] == person.id
+        if house is not None:
+            select &= self.house[:self.size] == house.id
+        if year is not None:
+            select &= self.year[:self.size] == year
+        return np.flatnonzero(select)
+    
+    def get_event(self,world,i):
+        """Rebuild the Event recorded in a row.
+        
+        Parameters
+        ----------
+        world : main.World
+            The World the events occurred in, used to find Persons and Houses by id.
+        i : int
+            The row of the event.
+        
+        Returns
+        -------
+        Event
+            The event, as it would have been stored in a Diary.
+        """
+        return _build_event(world,*[getattr(self,name)[i] for name in self.columns])
+    
+    def __len__(self):
+        return self.size
+
+
+class ChunkedEventLog(EventLog):
+    """An EventLog that spills its events to disk in fixed-size chunks.
+    
+    Events are buffered in memory until `chunksize` have been recorded, then
+    written as one chunk file to `directory`, so the memory used does not grow
+    with the length of the run. Each chunk is saved as `chunk_<n>.npy`, a 
+    record array of `EventLog.dtype` with one record per event. The file 
+    `index.npy` holds one record per chunk (of `index_dtype`) with its first 
+    event, number of events, first year, and last year; it is rewritten 
+    after each flush.
+    
+    Events remaining in the buffer at the end of a run must be written with
+    `flush`.
+    
+    Parameters
+    ----------
+    directory : str
+        The directory to write the chunks to, created if needed. It must not
+        already hold a chunk index.
+    chunksize : int, optional
+        The number of events in each chunk.
+    
+    Attributes
+    ----------
+    size : int
+        The number of events recorded, including those flushed to disk.
+    flushed : int
+        The number of events flushed to disk.
+    index : numpy.ndarray
+        The index of the chunks written so far.
+    
+    See Also
+    --------
+    open_chunks : Memory-map the chunks written to a directory.
+    """
+    
+    index_dtype = np.dtype([('start',np.int64),('size',np.int32),
+                            ('first',np.int16),('last',np.int16)])
+    
+    def __init__(self,directory,chunksize = 65536):
+        if chunksize < 1:
+            raise ValueError('chunksize must be positive')
+        os.makedirs(directory,exist_ok = True)
+        if os.path.exists(os.path.join(directory,'index.npy')):
+            raise ValueError('directory already holds an event log')
+        super().__init__(capacity = chunksize)
+        self.directory = directory
+        self.chunksize = chunksize
+        self.flushed = 0
+        self.index = np.zeros(0,dtype = self.index_dtype)
+        self._chunks = []
+    
+    def append(self,eventtype,year,person,house,detail = None):
+        """Record an event, flushing the buffer to disk if it is full.
+        
+        Parameters
+        ----------
+        eventtype : Event class
+            The type of event that occurred.
+        year : int
+            The year the event occurred.
+        person : main.Person or None
+            The Person whose event it is, or None for an event of a House.
+        house : main.House or None
+            The House where the event occurred.
+        detail : main.Person, main.House, or None
+            Any additional detail relevant for that Event class.
+        """
+        super().append(eventtype,year,person,house,detail)
+        if self.size - self.flushed == self.chunksize:
+            self.flush()
+    
+    def _grow(self):
+        #The buffer is flushed before it is full, so is never grown
+        raise RuntimeError('ChunkedEventLog buffer full')
+    
+    def flush(self):
+        """Write the buffered events to a new chunk file."""
+        n = self.size - self.flushed
+        if n == 0:
+            return
+        chunk = np.empty(n,dtype = self.dtype)
+        for name in self.columns:
+            chunk[name] = getattr(self,name)[:n]
+        path = os.path.join(self.directory,'chunk_%06i.npy' % len(self.index))
+        np.save(path,chunk)
+        row = (self.flushed,n,chunk['year'].min(),chunk['year'].max())
+        self.index = np.append(self.index,np.array([row],dtype = self.index_dtype))
+        np.save(os.path.join(self.directory,'index.npy'),self.index)
+        self._chunks.append(None)
+        self.flushed = self.size
+        for name in self.columns:
+            getattr(self,name)[:] = -1
+    
+    def chunk(self,n):
+        """Return a chunk written to disk, memory-mapped read-only.
+        
+        Parameters
+        ----------
+        n : int
+            The number of the chunk.
+        
+        Returns
+        -------
+        numpy.ndarray
+            The chunk, a record array of EventLog.dtype.
+        """
+        if self._chunks[n] is None:
+            path = os.path.join(self.directory,'chunk_%06i.npy' % n)
+            self._chunks[n] = np.load(path,mmap_mode = 'r')
+        return self._chunks[n]
+    
+    def rows(self,person = None,house = None,year = None):
+        """Return the rows of the events matching the given criteria.
+        
+        Chunks whose years cannot match `year` are not read.
+        
+        Parameters
+        ----------
+        person : main.Person, optional
+            Only events of this Person.
+        house : main.House, optional
+            Only events that occurred in this House.
+        year : int, optional
+            Only events of this year.
+        
+        Returns
+        -------
+        numpy.ndarray
+            The matching rows, in the order recorded.
+        """
+        output = []
+        for n, (start, size, first, last) in enumerate(self.index):
+            if year is not None and not first <= year <= last:
+                continue
+            output.append(start + _select(self.chunk(n),person,house,year))
+        buffer = {name : getattr(self,name)[:self.size-self.flushed] for name in self.columns}
+        output.append(self.flushed + _select(buffer,person,house,year))
+        return np.concatenate(output)
+    
+    def get_event(self,world,i):
+        """Rebuild the Event recorded in a row.
+        
+        Parameters
+        ----------
+        world : main.World
+            The World the events occurred in, used to find Persons and Houses by id.
+        i : int
+            The row of the event.
+        
+        Returns
+        -------
+        Event
+            The event, as it would have been stored in a Diary.
+        """
+        if i >= self.flushed:
+            return super().get_event(world,i - self.flushed)
+        n = np.searchsorted(self.index['start'],i,side = 'right') - 1
+        return _build_event(world,*self.chunk(n)[i - self.index['start'][n]].item())
+
+
+def open_chunks(directory):
+    """Memory-map the chunks of events written by a ChunkedEventLog.
+    
+    Parameters
+    ----------
+    directory : str
+        The directory of the ChunkedEventLog.
+    
+    Returns
+    -------
+    index : numpy.ndarray
+        One record per chunk with its first event ('start'), number of events
+        ('size'), first year ('first'), and last year ('last').
+    chunks : list of numpy.ndarray
+        The read-only chunks, each a record array of EventLog.dtype.
+    """
+    index = np.load(os.path.join(directory,'index.npy'))
+    chunks = [np.load(os.path.join(directory,'chunk_%06i.npy' % n),mmap_mode = 'r') 
+              for n in range(len(index))]
+    return index, chunks
+
+
+def _select(chunk,person,house,year):
+    """Return the events in a chunk matching the given criteria."""
+    select = np.ones(len(chunk['year']),dtype = bool)
+    if person is not None:
+        select &= chunk['person'] == person.id
+    if house is not None:
+        select &= chunk['house'] == house.id
+    if year is not None:
+        select &= chunk['year'] == year
+    return np.flatnonzero(select)
+
+
+def _build_event(world,eventtype,year,person,house,detail,detailkind):
+    """Rebuild an Event from a row of an EventLog."""
+    eventtype = event_types[eventtype]
+    year = int(year)
+    house = world.get_house(int(house))
+    person = world.get_person(int(person))
+    if detailkind == 0:
+        return eventtype(year,house,person)
+    elif detailkind == 1:
+        return eventtype(year,house,person,world.get_person(int(detail)))
+    else:
+        return eventtype(year,house,person,world.get_house(int(detail)))
+
+
+#The Event classes by code, and the codes of the Event classes
+event_types = []
+event_codes = {}
+
 class Event(object):
     """The sort of life circumstance recorded in a Diary.
     
     All events must take their inputs from __init__ and create a human-readable
     summary that includes the date as a formatted string. This is just a parent
     class.
+    
+    Every subclass is given an integer `code` when defined, which identifies 
+    it in an EventLog. Events are slotted to save memory, so subclasses 
+    should declare any attributes beyond `year`, `house`, and `person` in 
+    their own `__slots__`.
     """
     
+    __slots__ = ('year', 'house', 'person')
+    
     def __init__(self):
         pass
     
+    def __init_subclass__(cls,**kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.code = len(event_types)
+        event_types.append(cls)
+        event_codes[cls] = cls.code
+    
+    @classmethod
+    def attributes(cls):
+        """Return the names of the slotted attributes of this Event class."""
+        return [name for c in cls.__mro__ for name in getattr(c,'__slots__',())]
+    
     # def summary(self):
     #     if len(self.__dict__.keys()) == 4: #transitive
     #         s = 'Year {}: {} ' + self.verb() + ' {}'
@@ -134,6 +682,9 @@ class BornEvent(Event):
     person : main.Person
         The Person born.
     """
+    
+    __slots__ = ()
+    
     def __init__(self,year,house,person):
         self.year = year
         self.house = house
@@ -169,6 +720,8 @@ class BirthEvent(Event):
         The Person born.
     """
     
+    __slots__ = ('child',)
+    
     def __init__(self,year,house,person,child):
         self.year = year
         self.house = house
@@ -201,6 +754,9 @@ class MarriageEvent(Event):
     person, spouse : main.Person
         One person marrying the other, depends on focal individual.  
     """
+    
+    __slots__ = ('spouse',)
+    
     def __init__(self,year,house,person,spouse):
         self.year = year
         self.house = house
@@ -237,6 +793,9 @@ class MobilityEvent(Event):
     oldhouse : main.House
         The House left behind.
     """
+    
+    __slots__ = ('oldhouse',)
+    
     def __init__(self, year, house, person, oldhouse):
         self.year = year
         self.house = house
@@ -269,6 +828,9 @@ class DeathEvent(Event):
     person : main.Person
         The Person who died.
     """
+    
+    __slots__ = ()
+    
     def __init__(self,year,house,person):
         self.year = year
         self.house = house
@@ -300,6 +862,9 @@ class LeaveHouseEvent(Event):
     person : main.Person
         The Person who left.
     """
+    
+    __slots__ = ()
+    
     def __init__(self,year,house,person):
         self.year = year
         self.house = house
@@ -332,6 +897,9 @@ class EnterhouseEvent(Event):
     person : main.Person
         The Person who moved in.
     """
+    
+    __slots__ = ()
+    
     def __init__(self,year,house,person):
         self.year = year
         self.house = house
@@ -342,7 +910,7 @@ class EnterhouseEvent(Event):
         return 'Year {}: {} moved into {}, {}'.format(self.year,self.person.name,self.house.address,self.house.has_community.name)
 
 class ChangeOwnerEvent(Event):
-    pass
+    __slots__ = ()
 
 
 ###For biography and census of individual Person objects and House objects
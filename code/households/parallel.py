@@ -0,0 +1,298 @@
+"""Process-parallel simulation of many communities.
+
+Within a year, death, mobility, marriage, and birth in one Community only
+touch the Persons and Houses of that Community, and each Community draws
+from its own random streams (see World.spawn_streams). A ParallelWorld
+therefore partitions its communities between several worker processes, each
+holding an ordinary World (a shard) with its share of the communities, and
+steps every shard through each phase at the same time.
+
+Interactions between communities, such as migration by Community.emigrate,
+are sent as messages which each shard collects at the end of a phase. The
+ParallelWorld routes them to the shards holding their destinations, where
+they are delivered before the next phase, in the same order as World.deliver
+would. Because a Community's streams depend only on the seed and its index,
+a ParallelWorld gives each Community the same history as a World with the
+same seed, communities, and rules, whatever the number of processes.
+
+Each shard has its own Diaries and year. The ids of Persons are unique 
+across shards, as each shard takes every n-th id (for n shards), so that the
+ids of the ancestors a migrant brings into another shard's genealogy never
+collide with its own Persons (see Migration). The ids still differ from 
+those of a World, and the ids of Houses are only unique within a shard, so 
+Persons and Houses should be compared by their community and attributes 
+rather than by id. Results are gathered from the shards with 
+ParallelWorld.map.
+
+See Also
+--------
+main
+    The module defining World, Community, and Migration.
+"""
+
+from households import os, rd, logging, itertools, main
+
+import multiprocessing
+import traceback
+
+logging.getLogger(__name__).debug('importing parallel')
+
+
+class _Shard(object):
+    """A World holding some communities of a ParallelWorld.
+
+    Parameters
+    ----------
+    engine : {'object', 'array'}
+        The engine of the World.
+    seed : int
+        The seed shared by all shards.
+    recording : narrative.RecordingPolicy or None
+        Which Persons and Houses keep a Diary.
+    specs : list of tuple
+        The index, name, and the remaining arguments of Community of each
+        community of this shard.
+    number, shards : int
+        The number of this shard and the number of shards, from which the
+        ids of its Persons are taken.
+    """
+
+    def __init__(self, engine, seed, recording, specs, number = 0, shards = 1):
+        self.world = main.World(engine = engine, recording = recording, seed = seed)
+        self.world._person_ids = itertools.count(number, shards)
+        for index, name, args in specs:
+            main.Community(self.world, name, *args, index = index)
+
+    def step(self, phase):
+        """Run a phase and return the messages sent during it."""
+        self.world.step(phase)
+        return self.world.collect()
+
+    def deliver(self, messages):
+        """Deliver messages to communities of this shard."""
+        return self.world.deliver(messages)
+
+    def end_year(self):
+        """End the year and return the new year."""
+        self.world.end_year()
+        return self.world.year
+
+    def map(self, function):
+        """Return the index, name, and result of a function for each community."""
+        return [(c.index, c.name, function(c)) for c in self.world.communities]
+
+
+def _serve(connection, engine, seed, recording, specs, number, shards):
+    """Run a _Shard in a worker process, following commands from a Pipe.
+
+    Each command is a tuple of a method name of _Shard and its arguments. The
+    reply is a tuple of whether it succeeded and its result or, if not, the
+    formatted traceback. The command 'close' ends the process.
+    """
+    shard = _Shard(engine, seed, recording, specs, number, shards)
+    while True:
+        command, args = connection.recv()
+        if command == 'close':
+            break
+        try:
+            connection.send((True, getattr(shard, command)(*args)))
+        except Exception:
+            connection.send((False, traceback.format_exc()))
+    connection.close()
+
+
+class ParallelWorld(object):
+    """A World whose communities are stepped in parallel worker processes.
+
+    Communities are added with `add_community`, which takes the same
+    arguments as Community (without the World), and built in their shards by
+    `start`, which is called by the first `progress` if not before. A
+    ParallelWorld should be closed when done, or used as a context manager:
+        with ParallelWorld(processes = 4, seed = 1) as world:
+            for name in names:
+                world.add_community(name, 100, 100, 17, ...)
+            for year in range(200):
+                world.progress()
+            sizes = world.map(count_people)
+    where `count_people` is a function defined at the top level of a module,
+    so that it can be sent to the worker processes.
+
+    Communities are assigned to shards greedily by their starting population,
+    the largest first, to balance the work between processes.
+
+    Each shard numbers its own Persons, so their ids differ from those of a
+    World with the same seed and communities: only their names, birthyears,
+    and kin (e.g. the number of close kin of each, as in tests/migration.py)
+    match those of the World.
+
+    Parameters
+    ----------
+    processes : int, optional
+        The number of worker processes; by default the number of CPUs. If 0,
+        all communities are run in one shard in this process, which gives the
+        same results and is useful for debugging.
+    engine : {'object', 'array'}, optional
+        The engine of the World of each shard.
+    seed : int, optional
+        The seed shared by all shards. If None, it is drawn from the `random`
+        module, so that `random.seed` still makes runs repeatable.
+    recording : narrative.RecordingPolicy, optional
+        Which Persons and Houses keep a Diary; by default all of them.
+
+    Attributes
+    ----------
+    year : int
+        The current year.
+    specs : list of tuple
+        The index, name, and remaining arguments of Community of each
+        community, in order of addition.
+    assignment : dict of int
+        The shard of each community, by name, once started.
+    """
+
+    def __init__(self, processes = None, engine = 'object', seed = None, recording = None):
+        self.processes = os.cpu_count() if processes is None else processes
+        if type(self.processes) != int or self.processes < 0:
+            raise ValueError('processes must be a non-negative integer')
+        self.engine = engine
+        self.seed = rd.getrandbits(64) if seed is None else seed
+        self.recording = recording
+        self.year = 0
+        self.specs = []
+        self.assignment = {}
+        self._shards = None
+        self._workers = []
+
+    def add_community(self, name, pop, area, startage, mortab, birthtab, marriagerule, inheritancerule, mobilityrule):
+        """Add a community, to be built when the ParallelWorld starts.
+
+        The parameters are those of Community, and must be picklable to be
+        sent to a worker process.
+
+        Raises
+        ------
+        RuntimeError
+            If the ParallelWorld has already started.
+        ValueError
+            If there is already a community with this name.
+        """
+        if self._shards is not None:
+            raise RuntimeError('communities must be added before the ParallelWorld starts')
+        if name in [x[1] for x in self.specs]:
+            raise ValueError('there is already a community named ' + str(name))
+        self.specs.append((len(self.specs), name, (pop, area, startage, mortab, birthtab, marriagerule, inheritancerule, mobilityrule)))
+
+    def start(self):
+        """Partition the communities between shards and build them."""
+        if self._shards is not None:
+            return
+        n = max(1, min(self.processes, len(self.specs)))
+        shards = [[] for i in range(n)]
+        loads = [0] * n
+        for spec in sorted(self.specs, key = lambda x: -x[2][0]):
+            i = loads.index(min(loads))
+            shards[i].append(spec)
+            loads[i] += spec[2][0]
+        for i, specs in enumerate(shards):
+            specs.sort(key = lambda x: x[0])
+            for spec in specs:
+                self.assignment[spec[1]] = i
+        if self.processes == 0:
+            self._shards = [_Shard(self.engine, self.seed, self.recording, specs, i, n) for i, specs in enumerate(shards)]
+            return
+        self._shards = []
+        for i, specs in enumerate(shards):
+            parent, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target = _serve,
+                                             args = (child, self.engine, self.seed, self.recording, specs, i, n),
+                                             daemon = True)
+            worker.start()
+            child.close()
+            self._shards.append(parent)
+            self._workers.append(worker)
+        logging.getLogger(__name__).debug('started %i worker processes' % len(self._workers))
+
+    def _call(self, command, args = None):
+        """Run a command on all shards at once and return their results.
+
+        Parameters
+        ----------
+        command : str
+            The method of _Shard to run.
+        args : list of tuple, optional
+            The arguments for each shard; by default none.
+
+        Raises
+        ------
+        RuntimeError
+            If the command failed in a worker process, with its traceback.
+        """
+        if args is None:
+            args = [()] * len(self._shards)
+        if self.processes == 0:
+            return [getattr(shard, command)(*a) for shard, a in zip(self._shards, args)]
+        for connection, a in zip(self._shards, args):
+            connection.send((command, a))
+        results = []
+        for connection in self._shards:
+            success, result = connection.recv()
+            if not success:
+                raise RuntimeError('a worker process failed:\n' + result)
+            results.append(result)
+        return results
+
+    def progress(self):
+        """Progress all communities through one year, as World.progress does.
+
+        Every shard runs each phase at the same time; the messages sent in
+        the phase are then merged in order of the index of the sender and
+        delivered to the shards of their destinations.
+        """
+        self.start()
+        for phase in main.phases[1:]:
+            sent = self._call('step', [(phase,)] * len(self._shards))
+            #Each shard's messages are already in order, so a stable sort
+            ## by sender gives the order of a single World
+            messages = sorted([x for y in sent for x in y], key = lambda x: x[0])
+            if len(messages) != 0:
+                inboxes = [[] for shard in self._shards]
+                for message in messages:
+                    inboxes[self.assignment[message[1]]].append(message)
+                self._call('deliver', [(x,) for x in inboxes])
+        self.year = self._call('end_year')[0]
+
+    def map(self, function):
+        """Apply a function to every community, in the worker processes.
+
+        Parameters
+        ----------
+        function : function
+            A function of a Community, which (with its result) must be
+            picklable to reach a worker process, e.g. a module-level function.
+
+        Returns
+        -------
+        dict
+            The result of the function for each community, by name, in order
+            of addition.
+        """
+        self.start()
+        results = sorted([x for y in self._call('map', [(function,)] * len(self._shards)) for x in y], key = lambda x: x[0])
+        return {name : result for index, name, result in results}
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._shards is not None and self.processes != 0:
+            for connection in self._shards:
+                connection.send(('close', ()))
+                connection.close()
+            for worker in self._workers:
+                worker.join()
+        self._shards = None
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,395 @@
+"""Structure-of-arrays storage of Persons for the array population engine.
+
+The default engine of a World walks a Python list of Person objects in every
+yearly phase, drawing one random number and consulting one AgeTable per
+person. The array engine instead keeps the core state of every Person in
+NumPy columns (one row per Person), so that the draws for death, marriage
+eligibility, remarriage, and birth can be made for a whole population at once.
+
+Persons still exist as objects in the array engine: ArrayPerson (in main) copies
+its core attributes into the columns whenever they are set, and keeps its age 
+only in the columns, so rules, kinship, residency, and narrative functions see
+the same interface as with the default engine. Only the individuals who 
+actually experience an event in a given phase (e.g. the few who die) are 
+visited in Python.
+
+See Also
+--------
+main
+    The module defining World, Community, Person, and ArrayPerson.
+"""
+
+from households import np, logging, behavior
+from households.identity import *
+
+logging.getLogger(__name__).debug('importing population')
+
+#Identities stored in the columns by their code, which is their index here
+sexes = Sex.registry
+lifestatuses = LifeStatus.registry
+marriagestatuses = MarriageStatus.registry
+
+#Column names and types; -1 means None for the reference columns
+_columns = {'id' : np.int64,
+            'sex' : np.int8,
+            'age' : np.int32,
+            'birthyear' : np.int32,
+            'lifestatus' : np.int8,
+            'marriagestatus' : np.int8,
+            'spouse' : np.int64,
+            'house' : np.int64,
+            'community' : np.int32,
+            'marriagerule' : np.int32,
+            'inheritancerule' : np.int32,
+            'mobilityrule' : np.int32}
+
+#The Person attributes mirrored into columns, and the column storing each
+mirrored = {'id' : 'id',
+            'sex' : 'sex',
+            'birthyear' : 'birthyear',
+            'lifestatus' : 'lifestatus',
+            'marriagestatus' : 'marriagestatus',
+            'has_spouse' : 'spouse',
+            'has_parents' : 'parents',
+            'has_house' : 'house',
+            'has_community' : 'community',
+            'marriagerule' : 'marriagerule',
+            'inheritancerule' : 'inheritancerule',
+            'mobilityrule' : 'mobilityrule'}
+
+
+
+class Column(object):
+    """Expose a Population column directly as an attribute of an ArrayPerson.
+    
+    Unlike the mirrored attributes, which are kept as ordinary attributes and
+    copied into their columns whenever they are set, an attribute exposed by
+    a Column lives only in the Population. This is used for age, which the
+    array engine updates for the whole population at once.
+
+    Parameters
+    ----------
+    name : str
+        The name of the column in the Population.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, person, owner):
+        if person is None:
+            return self
+        return int(getattr(person._population, self.name)[person._row])
+
+    def __set__(self, person, value):
+        getattr(person._population, self.name)[person._row] = value
+
+
+class Population(object):
+    """A structure-of-arrays store of all Persons in a World.
+
+    Each Person occupies one row, in order of creation. Columns are grown
+    geometrically as Persons are added.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        The number of rows to allocate initially.
+
+    Attributes
+    ----------
+    size : int
+        The number of rows in use (living and dead Persons).
+    persons : list of Person
+        The Person object stored in each row, or None once the Person is
+        dead and compacted by main.World.compact.
+    objects : dict of list
+        The interned objects of each reference column, indexed by code.
+    id, sex, age, birthyear, lifestatus, marriagestatus : numpy.ndarray
+        Columns of the core attributes of each Person.
+    spouse, house, community : numpy.ndarray
+        Columns of references; -1 is None.
+    marriagerule, inheritancerule, mobilityrule : numpy.ndarray
+        Columns of codes for each Person's rules.
+    parents : numpy.ndarray
+        Two columns with the rows of the parents of each Person.
+    """
+
+    def __init__(self, capacity = 1024):
+        self.size = 0
+        self.persons = []
+        self.objects = {'house' : [], 'community' : [], 'marriagerule' : [],
+                        'inheritancerule' : [], 'mobilityrule' : []}
+        self._codes = {k : {} for k in self.objects.keys()}
+        for name, dtype in _columns.items():
+            setattr(self, name, np.full(capacity, -1, dtype = dtype))
+        self.parents = np.full((capacity, 2), -1, dtype = np.int64)
+
+    @property
+    def capacity(self):
+        """The number of rows currently allocated."""
+        return len(self.id)
+
+    def add_person(self, person):
+        """Allocate a row for a new Person.
+
+        Parameters
+        ----------
+        person : main.ArrayPerson
+            The Person to store.
+
+        Returns
+        -------
+        int
+            The row of the Person.
+        """
+        if self.size == self.capacity:
+            self._grow()
+        row = self.size
+        self.persons.append(person)
+        self.size += 1
+        return row
+
+    def _grow(self):
+        """Double the number of allocated rows."""
+        for name in list(_columns.keys()) + ['parents']:
+            old = getattr(self, name)
+            new = np.full((2 * len(old),) + old.shape[1:], -1, dtype = old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def store(self, row, name, value):
+        """Copy the value of a mirrored Person attribute into its column.
+
+        Parameters
+        ----------
+        row : int
+            The row of the Person.
+        name : str
+            The name of the Person attribute, a key of `mirrored`.
+        value
+            The new value of the attribute.
+        """
+        column = mirrored[name]
+        if column in registries:
+            value = value.code
+        elif column == 'spouse':
+            value = -1 if value is None else value._row
+        elif column == 'parents':
+            value = ([x._row for x in value] + [-1, -1])[:2]
+        elif column in self.objects:
+            value = self.intern(column, value)
+        getattr(self, column)[row] = value
+
+    def intern(self, name, value):
+        """Return the code of an object in a reference column, adding it if new.
+
+        Parameters
+        ----------
+        name : str
+            The name of the column.
+        value : object or None
+            The object to encode.
+
+        Returns
+        -------
+        int
+            The code of the object, or -1 for None.
+        """
+        if value is None:
+            return -1
+        codes = self._codes[name]
+        code = codes.get(id(value))
+        if code is None:
+            code = len(self.objects[name])
+            codes[id(value)] = code
+            self.objects[name].append(value)
+        return code
+
+    def codes(self, name, values):
+        """Return the codes of objects in a reference column, without adding them.
+
+        The objects are matched by identity with those already stored, using 
+        a sorted search rather than a lookup per object.
+
+        Parameters
+        ----------
+        name : str
+            The name of the column.
+        values : list of object
+            The objects to look up.
+
+        Returns
+        -------
+        numpy.ndarray
+            The code of each object, or -1 for an object not stored.
+        """
+        stored = np.fromiter(map(id, self.objects[name]), dtype = np.int64, count = len(self.objects[name]))
+        wanted = np.fromiter(map(id, values), dtype = np.int64, count = len(values))
+        order = np.argsort(stored)
+        found = np.searchsorted(stored[order], wanted)
+        found[found == len(stored)] = 0
+        output = np.full(len(values), -1, dtype = np.int64)
+        if len(stored) != 0:
+            match = stored[order[found]] == wanted
+            output[match] = order[found[match]]
+        return output
+
+    def mask(self, name, identity, rows = None):
+        """Return whether each Person has a given identity.
+
+        Parameters
+        ----------
+        name : str
+            The identity column, 'sex', 'lifestatus', or 'marriagestatus'.
+        identity : identity.Identity
+            The identity to compare with.
+        rows : numpy.ndarray, optional
+            The rows of the Persons in question; by default all rows in use.
+
+        Returns
+        -------
+        numpy.ndarray
+            A boolean array, True where the Person has the identity.
+        """
+        column = getattr(self, name)
+        if rows is None:
+            return column[:self.size] == identity.code
+        return column[rows] == identity.code
+
+    def living(self):
+        """Return the rows of all living Persons.
+
+        Returns
+        -------
+        numpy.ndarray
+            The rows of living Persons, in order of creation.
+        """
+        return np.flatnonzero(self.mask('lifestatus', alive))
+
+    def rates_by(self, name, attribute, rows):
+        """Look up rates where the AgeTable depends on a reference column.
+
+        For example, the mortality table belongs to the community, while the
+        eligibility table belongs to the marriage rule of each Person.
+
+        Parameters
+        ----------
+        name : str
+            The reference column holding the owner of the table.
+        attribute : str
+            The attribute of the owner that is the AgeTable.
+        rows : numpy.ndarray
+            The rows of the Persons in question.
+
+        Returns
+        -------
+        numpy.ndarray
+            The annual rate for each Person.
+        """
+        output = np.zeros(len(rows))
+        codes = getattr(self, name)[rows]
+        for code in np.unique(codes):
+            select = codes == code
+            table = getattr(self.objects[name][code], attribute)
+            output[select] = table.get_rates(self.sex[rows[select]], self.age[rows[select]])
+        return output
+
+    def split(self, world, rows, phase):
+        """Split rows by community, each in a random order from its own stream.
+
+        Parameters
+        ----------
+        world : main.World
+            The World whose Persons are stored here.
+        rows : numpy.ndarray
+            The rows of the Persons in question.
+        phase : str
+            The phase whose generators and streams are used; each community's
+            `random` stream is set to that of the phase.
+
+        Returns
+        -------
+        list of tuple
+            For each community of the World with Persons among `rows`, the
+            community, its numpy.random.Generator for the phase, and its rows
+            in a random order.
+        """
+        output = []
+        codes = self.community[rows]
+        for c in world.communities:
+            code = self._codes['community'].get(id(c))
+            if code is None:
+                continue
+            rng = c.generators[phase]
+            c.random = c.streams[phase]
+            output.append((c, rng, rng.permutation(rows[codes == code])))
+        return output
+
+    def step(self, world, phase):
+        """Progress all Persons of a World through one phase of the year.
+
+        The phases follow the same schedule as World.progress, but the draws
+        of each phase are made for all Persons of a community at once, from
+        the community's generator for that phase:
+            1) death draws; survivors age one year and the rest die in a
+               random order (running inheritance),
+            2) mobility, person by person in a random order,
+            3) eligibility and remarriage draws, then matching of everyone 
+               whose MarriageRule is in batch mode, then spouse searches by 
+               the others who were unmarried at the start of the phase in a
+               random order, so those who become eligible are matched in 
+               batch mode the same year but only search the next,
+            4) birth draws for married women with living husbands.
+
+        Parameters
+        ----------
+        world : main.World
+            The World whose Persons are stored here.
+        phase : {'death', 'mobility', 'marriage', 'birth'}
+            The phase to run.
+
+        Raises
+        ------
+        ValueError
+            If the phase is not one of the above.
+        """
+        persons = self.persons
+        groups = self.split(world, self.living(), phase)
+        if phase == 'death':
+            for c, rng, rows in groups:
+                dies = rng.random(len(rows)) < self.rates_by('community', 'mortab', rows)
+                self.age[rows[~dies]] += 1
+                for i in rows[dies]:
+                    persons[i].enact_death()
+        elif phase == 'mobility':
+            for c, rng, rows in groups:
+                for i in rows:
+                    persons[i].leave_home()
+        elif phase == 'marriage':
+            for c, rng, rows in groups:
+                status = self.marriagestatus[rows]
+                for old, table in [(ineligible, 'eligibility_agetable'), (widowed, 'remarriage_agetable')]:
+                    select = rows[status == old.code]
+                    change = rng.random(len(select)) < self.rates_by('marriagerule', table, select)
+                    for i in select[change]:
+                        persons[i].marriagestatus = unmarried
+                behavior.marriage.MarriageRule.match_batch(c)
+                for i in rows[status == unmarried.code]:
+                    #Persons who left for another community are skipped
+                    if persons[i].lifestatus == alive:
+                        persons[i].marriage()
+        elif phase == 'birth':
+            for c, rng, rows in groups:
+                spouses = self.spouse[rows]
+                select = rows[self.mask('sex', female, rows) &
+                              self.mask('marriagestatus', married, rows) &
+                              (spouses >= 0) &
+                              self.mask('lifestatus', alive, np.maximum(spouses, 0))]
+                births = rng.random(len(select)) < self.rates_by('community', 'birthtab', select)
+                for i in select[births]:
+                    persons[i].enact_birth()
+        else:
+            raise ValueError('unknown phase ' + str(phase))
+        for c in world.communities:
+            c.random = c.streams['setup']
@@ -10,6 +10,11 @@ forms. A future expansion for this package would be to break these definitions
 into a subpackage of their own (e.g., residency.cambridge, residency.dukamakura,
 etc.)
 
+Typologies can also be registered with `register_typology`. Each classifies 
+the same HouseSummary, which `summarize` counts in one pass over the 
+residents, so `classify_many` classifies a house in every registered typology
+for about the cost of the typology reading the most fields.
+
 See Also
 --------
 kinship
@@ -18,15 +23,22 @@ kinship
 """
 __all__ = ['count_married','get_married','is_solitary','is_no_family',
 'is_nuclear','is_extended','is_multiple','classify_household','plot_classify',
-'family_extract']
+'family_extract','ClassificationCache','HouseSummary','summarize',
+'cambridge','lifecycle','register_typology','classify_many','classify_arrays',
+'census']
 
-from households import np, rd, scipy, nx, plt, kinship
+from households import np, rd, logging, collections, kinship
 from households.identity import *
-print('importing residency')
+logging.getLogger(__name__).debug('importing residency')
 
 
 ######Identify household/family types
 # Using the Cambridge Group typology
+
+#The classifications returned by classify; the index of each is its code in 
+## stored results (see results)
+typology = ['empty','solitary','no-family','nuclear','extended','multiple']
+
 def get_household(house):
     """Get the current residential members of a house.
     
@@ -209,6 +221,9 @@ def is_multiple(house):
 def classify(house):
     """Classify a given house into the Cambridge Group typology.
     
+    This agrees with `cambridge(summarize(house))`, but is quicker when the
+    Cambridge Group typology is the only one needed.
+    
     Parameters
     ----------
     house : House
@@ -234,19 +249,500 @@ def classify(house):
     else:
         return None
 
+
+######Classify households from a summary of their relations
+# Each typology reads the same summary of a house, so the relations of the
+# residents are only examined once however many typologies are used
+
+class HouseSummary(collections.namedtuple('HouseSummary',['size','married',
+        'couple_parents','generations','parents','children','unrelated'])):
+    """The relations between the residents of a house, as counted by `summarize`.
+    
+    A named tuple, so that summaries can be shared and compared.
+    
+    Attributes
+    ----------
+    size : int
+        The number of residents.
+    married : int
+        The number of residents whose spouse also lives in the house (twice 
+        the number of coresident couples).
+    couple_parents : bool
+        Whether a parent of a resident with a coresident spouse lives in the 
+        house.
+    generations : int
+        The greatest number of generations of residents linked by coresident
+        parents and children (1 if no resident's parent lives in the house).
+    parents : int
+        The number of residents with a coresident child.
+    children : int
+        The number of residents with a coresident parent.
+    unrelated : int
+        The number of residents without a coresident spouse, parent, child,
+        or sibling.
+    """
+    __slots__ = ()
+
+#The summaries of empty houses and houses with a single resident
+_trivial = [HouseSummary(0,0,False,0,0,0,0),HouseSummary(1,0,False,1,0,0,1)]
+
+#The fields counted from the spouses of the residents and their parents 
+## alone, without the children, siblings, and generations; and every field
+_couples = frozenset(['size','married','couple_parents'])
+_every = frozenset(HouseSummary._fields)
+
+def _generation(person,coresident,depth):
+    """Return the generation of a resident, from its coresident ancestors."""
+    if person not in coresident:
+        return 1
+    if person not in depth:
+        depth[person] = 1 + max(_generation(q,coresident,depth) for q in coresident[person])
+    return depth[person]
+
+def _summarize_pair(a,b):
+    """Summarize the relations of the two residents of a house."""
+    a_wed = a.has_spouse is b
+    b_wed = b.has_spouse is a
+    #Whether each has a parent in the house, i.e. the other is their child
+    a_child = b in a.has_parents
+    b_child = a in b.has_parents
+    a_alone = not (a_wed or a_child or b_child)
+    b_alone = not (b_wed or a_child or b_child)
+    unrelated = 0
+    if (a_alone or b_alone) and set(a.has_parents).isdisjoint(b.has_parents):
+        #Siblings are related
+        unrelated = a_alone + b_alone
+    return HouseSummary(2,a_wed + b_wed,(a_wed and a_child) or (b_wed and b_child),
+                        2 if a_child or b_child else 1,a_child + b_child,
+                        a_child + b_child,unrelated)
+
+def summarize(house,fields = None):
+    """Summarize the relations between the residents of a house.
+    
+    If only the size, married, and couple_parents fields are asked for, as 
+    by the 'cambridge' typology, only the couples of the house and their 
+    parents are examined, for about the cost of `classify`. Houses of two 
+    residents are summarized by comparing the two directly.
+    
+    Parameters
+    ----------
+    house : House
+        The house object to examine.
+    fields : collection of str, optional
+        The fields of HouseSummary needed; all of them by default. Other 
+        fields may be None, except in houses of two or fewer residents, 
+        whose summaries are always complete.
+    
+    Returns
+    -------
+    HouseSummary
+        The couples, generations, and unrelated residents of the house.
+    """
+    people = house.people
+    if len(people) < 3:
+        if len(people) < 2:
+            return _trivial[len(people)]
+        return _summarize_pair(*people)
+    present = set(people)
+    married = 0
+    couple_parents = False
+    if fields is not None and _couples.issuperset(fields):
+        for p in people:
+            if p.has_spouse in present:
+                married += 1
+                if not couple_parents and not present.isdisjoint(p.has_parents):
+                    couple_parents = True
+        return HouseSummary(len(people),married,couple_parents,None,None,None,None)
+    parents = 0
+    #The coresident parents of each resident with any, and the residents 
+    ## with no coresident spouse, parents, or children
+    coresident = {}
+    alone = []
+    for p in people:
+        has_spouse = p.has_spouse in present
+        has_parents = not present.isdisjoint(p.has_parents)
+        if has_spouse:
+            married += 1
+            if has_parents:
+                couple_parents = True
+        if has_parents:
+            coresident[p] = [q for q in p.has_parents if q in present]
+        if not present.isdisjoint(p.has_children):
+            parents += 1
+        elif not (has_spouse or has_parents):
+            alone.append(p)
+    unrelated = 0
+    if alone:
+        #Siblings whose parents do not live in the house are related
+        siblings = collections.Counter(q for p in people for q in p.has_parents)
+        for p in alone:
+            if not any(siblings[q] > 1 for q in p.has_parents):
+                unrelated += 1
+    generations = 1
+    if coresident:
+        generations = 2
+        #Only count further back if a parent has a coresident parent
+        if any(q in coresident for x in coresident.values() for q in x):
+            depth = {}
+            generations = max(_generation(p,coresident,depth) for p in coresident)
+    return HouseSummary(len(people),married,couple_parents,generations,parents,
+                        len(coresident),unrelated)
+
+def cambridge(summary):
+    """Classify a summarized house into the Cambridge Group typology.
+    
+    Parameters
+    ----------
+    summary : HouseSummary
+        The summary of the house.
+    
+    Returns
+    -------
+    {'empty','solitary','no-family','nuclear','extended','multiple', None}
+        The classification, None if a resident's spouse is in the house but 
+        does not return the relation.
+    """
+    if summary.size == 0:
+        return 'empty'
+    if summary.size == 1:
+        return 'solitary'
+    if summary.married == 0:
+        return 'no-family'
+    if summary.married == 2:
+        if summary.couple_parents:
+            return 'extended'
+        return 'nuclear'
+    if summary.married >= 4:
+        return 'multiple'
+    return None
+
+def lifecycle(summary):
+    """Classify a summarized house into stages of the household life cycle.
+    
+    The stages follow the household compositions of Du and Kamakura (2006), 
+    reduced to the kin relations known to the simulation: they are not 
+    further divided by the age of the head or of the children.
+    
+    Parameters
+    ----------
+    summary : HouseSummary
+        The summary of the house.
+    
+    Returns
+    -------
+    {'empty','single','couple','couple with children','single parent','multigenerational','other'}
+        The stage, 'other' for houses with several couples, siblings without
+        parents, or unrelated residents.
+    """
+    if summary.size == 0:
+        return 'empty'
+    if summary.size == 1:
+        return 'single'
+    if summary.generations >= 3:
+        return 'multigenerational'
+    if summary.unrelated == 0:
+        if summary.married == 2:
+            if summary.size == 2:
+                return 'couple'
+            if summary.children == summary.size - 2 and not summary.couple_parents:
+                return 'couple with children'
+        elif summary.married == 0 and summary.parents == 1 and summary.children == summary.size - 1:
+            return 'single parent'
+    return 'other'
+
+#The registered typologies, by name: the possible classifications (in the 
+## order of their codes), the function classifying a HouseSummary, and the 
+## fields of the summary it reads
+typologies = collections.OrderedDict()
+
+#For the typologies of each call of classify_many: the fields they read, 
+## their functions, and their classifications of empty and solitary houses
+_plans = {}
+
+def register_typology(name,labels,function,fields = None):
+    """Register a typology to be used by `classify_many`.
+    
+    Parameters
+    ----------
+    name : str
+        The name of the typology.
+    labels : list of str
+        The classifications the typology can return.
+    function : callable
+        A function taking a HouseSummary and returning one of the labels 
+        (or None if it cannot be classified).
+    fields : list of str, optional
+        The fields of HouseSummary the function reads; all of them by 
+        default. Only these are counted when the typology is used alone.
+    """
+    if not callable(function):
+        raise TypeError('function must be callable')
+    fields = _every if fields is None else frozenset(fields)
+    if not _every.issuperset(fields):
+        raise ValueError('not fields of HouseSummary: ' + ', '.join(sorted(fields - _every)))
+    typologies[name] = (list(labels),function,fields)
+    _plans.clear()
+
+register_typology('cambridge',typology,cambridge,['size','married','couple_parents'])
+register_typology('lifecycle',['empty','single','couple','couple with children',
+                               'single parent','multigenerational','other'],lifecycle)
+
+def classify_many(house,names = None):
+    """Classify a house into several typologies at once.
+    
+    The house is summarized once, counting only the fields read by the 
+    typologies, and each typology classifies the summary, so each typology 
+    beyond the first costs little.
+    
+    Parameters
+    ----------
+    house : House
+        The house object to examine.
+    names : list of str, optional
+        The names of registered typologies; all of them by default.
+    
+    Returns
+    -------
+    tuple
+        The classification of the house in each typology, in order.
+    """
+    key = None if names is None else tuple(names)
+    plan = _plans.get(key)
+    if plan is None:
+        used = list(typologies.values()) if names is None else [typologies[x] for x in names]
+        functions = [x[1] for x in used]
+        plan = _plans[key] = (frozenset().union(*[x[2] for x in used]),functions,
+                              [tuple([f(x) for f in functions]) for x in _trivial])
+    fields, functions, trivial = plan
+    if len(house.people) < 2:
+        return trivial[len(house.people)]
+    summary = summarize(house,fields)
+    return tuple([f(summary) for f in functions])
+
+class ClassificationCache(object):
+    """Classify houses, reusing the classification of unchanged houses.
+    
+    Each House has a version, increased whenever someone moves in or out or 
+    a resident marries or is widowed, which are the only changes that alter
+    its classification. The cache keeps the classification of each house 
+    with the version it was made at, and only classifies a house again once
+    its version has changed.
+    
+    A cache can also watch a community, whose houses then add themselves to
+    the cache's set of changed houses as they change. The census of the 
+    community is kept up to date by classifying only those houses, so its 
+    cost is proportional to the number of houses that changed rather than to
+    the number of houses.
+    
+    Parameters
+    ----------
+    classifier : callable, optional
+        The function classifying a house; `classify` by default. Its results
+        must be hashable, e.g. the tuples of `classify_many`.
+    community : Community, optional
+        A community to watch.
+    
+    Attributes
+    ----------
+    hits, misses : int
+        The number of classifications reused and made.
+    counts : collections.Counter
+        The number of houses of each classification in the watched community
+        at the last `update`.
+    """
+    
+    def __init__(self,classifier = classify,community = None):
+        self.classifier = classifier
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self.community = community
+        self.counts = collections.Counter()
+        self._counted = {}
+        self._changed = None
+        if community is not None:
+            self._changed = set(community.houses)
+            community.watchers.append(self._changed)
+    
+    def __call__(self,house):
+        """Return the classification of a house.
+        
+        Parameters
+        ----------
+        house : House
+            The house to classify.
+        """
+        cached = self._cache.get(house)
+        if cached is not None and cached[0] == house.version:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        output = self.classifier(house)
+        self._cache[house] = (house.version,output)
+        return output
+    
+    def update(self):
+        """Reclassify the houses of the watched community that have changed.
+        
+        Returns
+        -------
+        collections.Counter
+            The number of houses of each classification in the community.
+        """
+        if self._changed is None:
+            raise ValueError('the cache is not watching a community')
+        for h in self._changed:
+            new = self(h)
+            if h not in self._counted:
+                self.counts[new] += 1
+            elif self._counted[h] != new:
+                self.counts[self._counted[h]] -= 1
+                self.counts[new] += 1
+            self._counted[h] = new
+        self._changed.clear()
+        return self.counts
+    
+    def classify_all(self,houses):
+        """Return the classification of each of a list of houses.
+        
+        Parameters
+        ----------
+        houses : list of House
+            The houses to classify.
+        
+        Returns
+        -------
+        list
+            The classification of each house, in order.
+        """
+        if self._changed is not None:
+            self.update()
+            counted = self._counted
+            return [counted[h] if h in counted else self(h) for h in houses]
+        return [self(h) for h in houses]
+    
+    def close(self):
+        """Stop watching the community."""
+        if self._changed is not None:
+            watchers = self.community.watchers
+            del watchers[[i for i, x in enumerate(watchers) if x is self._changed][0]]
+            self._changed = None
+
+######Classify every house at once from arrays of relations
+
+def classify_arrays(house,spouse,parents,houses):
+    """Classify houses into the Cambridge Group typology from arrays of relations.
+    
+    Persons are numbered from 0, and the relations of each are given as the 
+    index of their house and the numbers of their spouse and parents. The
+    married residents and the parents of married residents of each house are
+    counted by numpy.bincount, so no Python loop runs over houses or persons.
+    
+    Parameters
+    ----------
+    house : numpy.ndarray
+        The index of the house of each person, -1 for persons not in a house.
+    spouse : numpy.ndarray
+        The number of the spouse of each person, -1 if none.
+    parents : numpy.ndarray
+        The numbers of the (up to two) parents of each person, a (persons, 2)
+        array, -1 where none.
+    houses : int
+        The number of houses.
+    
+    Returns
+    -------
+    codes : numpy.ndarray
+        The classification of each house as an int8, its index in `typology`,
+        or -1 where classify would return None.
+    counts : numpy.ndarray
+        The number of houses of each classification in `typology`.
+    """
+    house = np.asarray(house)
+    spouse = np.asarray(spouse)
+    parents = np.asarray(parents).reshape(len(house),-1)
+    housed = house >= 0
+    size = np.bincount(house[housed],minlength = houses)
+    #Residents whose spouse lives in the same house
+    wed = housed & (spouse >= 0)
+    wed[wed] = house[spouse[wed]] == house[wed]
+    married = np.bincount(house[wed],minlength = houses)
+    #Houses where a parent of a married resident also lives
+    older = np.zeros(len(house),dtype = bool)
+    for column in parents.T:
+        select = wed & (column >= 0)
+        select[select] = house[column[select]] == house[select]
+        older |= select
+    extended = np.bincount(house[older],minlength = houses) > 0
+    codes = np.full(houses,-1,dtype = np.int8)
+    codes[size == 0] = typology.index('empty')
+    codes[size == 1] = typology.index('solitary')
+    codes[(size > 1) & (married == 0)] = typology.index('no-family')
+    codes[(size > 1) & (married == 2) & ~extended] = typology.index('nuclear')
+    codes[(size > 1) & (married == 2) & extended] = typology.index('extended')
+    codes[(size > 1) & (married >= 4)] = typology.index('multiple')
+    counts = np.bincount(codes[codes >= 0],minlength = len(typology))
+    return codes, counts
+
+def census(houses):
+    """Classify a list of houses into the Cambridge Group typology at once.
+    
+    The relations of the residents of the communities of the houses are 
+    gathered into arrays, read directly from the Population columns in a 
+    World with the 'array' engine, and classified by `classify_arrays`.
+    
+    Parameters
+    ----------
+    houses : list of House
+        The houses to classify, e.g. a community.houses attribute.
+    
+    Returns
+    -------
+    codes : numpy.ndarray
+        The classification of each house as an int8, its index in `typology`,
+        or -1 where classify would return None.
+    counts : numpy.ndarray
+        The number of houses of each classification in `typology`.
+    """
+    houses = list(houses)
+    if houses == []:
+        return np.zeros(0,dtype = np.int8), np.zeros(len(typology),dtype = np.int64)
+    store = houses[0].has_community.has_world.population
+    if store is not None:
+        #The rows of the Population are the persons; only the living 
+        ## residents of the houses are given a house
+        index = np.full(len(store.objects['house']) + 1,-1,dtype = np.int64)
+        codes = store.codes('house',houses)
+        index[codes[codes >= 0]] = np.flatnonzero(codes >= 0)
+        rows = store.living()
+        house = np.full(store.size,-1,dtype = np.int64)
+        house[rows] = index[store.house[rows]]
+        return classify_arrays(house,store.spouse[:store.size],store.parents[:store.size],len(houses))
+    communities = list({id(h.has_community) : h.has_community for h in houses}.values())
+    number = {h : i for i, h in enumerate(houses)}
+    people = [p for c in communities for p in c.people]
+    persons = {p : i for i, p in enumerate(people)}
+    house = np.array([number.get(p.has_house,-1) for p in people],dtype = np.int64)
+    spouse = np.array([persons.get(p.has_spouse,-1) for p in people],dtype = np.int64)
+    parents = np.array([[persons.get(p.has_parents[0],-1) if len(p.has_parents) > 0 else -1 for p in people],
+                        [persons.get(p.has_parents[1],-1) if len(p.has_parents) > 1 else -1 for p in people]],
+                       dtype = np.int64).T
+    return classify_arrays(house,spouse,parents,len(houses))
+
 def plot_classify(houses):
     """Classify houses at the present moment into their Cambridge Group typology.
     
     Uses matplotlib.pyplot to create a bargraph of the current classification
-    of households. Ignores empty houses (!).
+    of households, counted by `census`. Ignores empty houses (!).
     
     Parameters
     ----------
     houses : list of House
         A list of houses to classify, most easily a community.houses attribute. 
     """
+    from households import plt #matplotlib is only imported when needed
     fig = plt.Figure()
-    data = np.unique([classify(h) for h in houses if h.people != []],return_counts=True)
-    order = [2,4,3,0,1]
-    plt.bar(range(5),data[1][order]*1./sum(data[1]),width=.95)
-    plt.xticks([i for i in range(5)],data[0][order])
+    codes, counts = census(houses)
+    order = [typology.index(x) for x in ['no-family','solitary','nuclear','extended','multiple']]
+    plt.bar(range(5),counts[order]*1./sum(counts[1:]),width=.95)
+    plt.xticks([i for i in range(5)],[typology[i] for i in order])
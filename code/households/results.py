@@ -0,0 +1,286 @@
+"""Binary, memory-mappable storage of the results of parameter sweeps.
+
+The CSV files written by sweep.CSVWriter hold one column per house and one
+text cell per house and year, so reading thousands of runs means parsing
+millions of cells. A ResultsWriter instead stores the tables returned by
+sweep.simulate as NumPy arrays:
+    - the classification of each house each year as int8 codes, the index of
+      the classification in residency.typology (-1 if unclassified),
+    - the number of people in each house each year as int16,
+    - the population and vital events of each year as int32 columns.
+
+Runs are buffered and written together in chunks, one `.npy` file per table
+per chunk, with the arrays of all runs of the chunk laid end to end. The
+manifest, `manifest.json`, records the parameter labels and seed of each run
+and where its arrays are; it is only rewritten after a chunk is complete, so
+that an interrupted sweep loses at most the runs buffered since the last
+chunk, which are run again when it restarts.
+
+Results reads a results directory: chunks are memory-mapped when first used,
+and the arrays of each run are returned as read-only views into them, so
+analyses of thousands of runs only read the parts of the files they use.
+
+See Also
+--------
+sweep
+    The module running parameter sweeps.
+"""
+
+from households import np, os, logging, residency
+from households.sweep import key
+
+import json
+
+logging.getLogger(__name__).debug('importing results')
+
+#The tables of sweep.simulate and the type each is stored as
+tables = {'house_classify' : np.int8,
+          'house_pop' : np.int16,
+          'history' : np.int32}
+
+
+class ResultsWriter(object):
+    """Write the results of a sweep as chunks of NumPy arrays.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the results, created if needed. If it already holds
+        results, new runs are added to them.
+    chunksize : int, optional
+        The number of runs in each chunk.
+
+    Attributes
+    ----------
+    completed : set of tuple
+        The keys of the runs written, including those still buffered.
+    manifest : dict
+        The names of the parameters and of the columns of the history, and the
+        location of each run written to disk.
+    """
+
+    def __init__(self, directory, chunksize = 64):
+        if chunksize < 1:
+            raise ValueError('chunksize must be positive')
+        os.makedirs(directory, exist_ok = True)
+        self.directory = directory
+        self.chunksize = chunksize
+        self._path = os.path.join(directory, 'manifest.json')
+        if os.path.exists(self._path):
+            with open(self._path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'parameters' : None, 'history' : None, 'chunks' : 0, 'runs' : []}
+        self.completed = set(key(x['labels'], x['seed']) for x in self.manifest['runs'])
+        self._buffer = []
+
+    def write(self, labels, seed, result):
+        """Buffer the results of a run, writing a chunk when the buffer is full.
+
+        Parameters
+        ----------
+        labels : dict of str
+            The label of each parameter, by name.
+        seed : int
+            The seed of the run.
+        result : dict of dict of list
+            The tables of the run, as returned by sweep.simulate.
+
+        Returns
+        -------
+        int
+            The id of the run.
+        """
+        if self.manifest['parameters'] is None:
+            self.manifest['parameters'] = sorted(labels.keys())
+        elif sorted(labels.keys()) != self.manifest['parameters']:
+            raise ValueError('parameters do not match those of the manifest')
+        history = [x for x in result['history'].keys() if x != 'year']
+        if self.manifest['history'] is None:
+            self.manifest['history'] = history
+        elif history != self.manifest['history']:
+            raise ValueError('history columns do not match those of the manifest')
+        codes = {x : i for i, x in enumerate(residency.typology)}
+        houses = [x for x in result['house_pop'].keys() if x != 'year']
+        arrays = {'house_classify' : np.array([[codes.get(x, -1) for x in result['house_classify'][h]] for h in houses], dtype = np.int8).T,
+                  'house_pop' : np.array([result['house_pop'][h] for h in houses], dtype = np.int16).T,
+                  'history' : np.array([result['history'][x] for x in history], dtype = np.int32).T}
+        run = {'id' : len(self.manifest['runs']) + len(self._buffer),
+               'labels' : {k : str(v) for k, v in labels.items()},
+               'seed' : int(seed),
+               'years' : len(result['history']['year']),
+               'firstyear' : int(result['history']['year'][0]) if len(result['history']['year']) != 0 else 0,
+               'houses' : len(houses)}
+        self._buffer.append((run, arrays))
+        self.completed.add(key(labels, seed))
+        if len(self._buffer) == self.chunksize:
+            self.flush()
+        return run['id']
+
+    def flush(self):
+        """Write the buffered runs as a new chunk and update the manifest."""
+        if len(self._buffer) == 0:
+            return
+        n = self.manifest['chunks']
+        for name, dtype in tables.items():
+            offset = 0
+            for run, arrays in self._buffer:
+                run[name] = offset
+                offset += arrays[name].size
+            flat = np.concatenate([arrays[name].ravel() for run, arrays in self._buffer]).astype(dtype)
+            np.save(os.path.join(self.directory, 'chunk_%06i_%s.npy' % (n, name)), flat)
+        for run, arrays in self._buffer:
+            run['chunk'] = n
+            self.manifest['runs'].append(run)
+        self.manifest['chunks'] = n + 1
+        self._buffer = []
+        #Replace the manifest only once it is completely written
+        with open(self._path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(self._path + '.tmp', self._path)
+
+
+class Results(object):
+    """The results of a sweep written by a ResultsWriter, memory-mapped.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the results.
+
+    Attributes
+    ----------
+    runs : list of dict
+        The id, labels of the parameters, seed, and number of years and
+        houses of each run, in order of id.
+    parameters : list of str
+        The names of the parameters.
+    columns : list of str
+        The names of the columns of the history.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.runs = manifest['runs']
+        self.parameters = manifest['parameters']
+        self.columns = manifest['history']
+        self._chunks = {}
+
+    def __len__(self):
+        return len(self.runs)
+
+    def select(self, **labels):
+        """Return the ids of the runs with given parameter labels.
+
+        Parameters
+        ----------
+        **labels
+            The labels (or values, compared as strings) of some parameters.
+
+        Returns
+        -------
+        list of int
+        """
+        return [x['id'] for x in self.runs if all(x['labels'][k] == str(v) for k, v in labels.items())]
+
+    def chunk(self, n, table):
+        """Return a table of a chunk, memory-mapped read-only.
+
+        Parameters
+        ----------
+        n : int
+            The number of the chunk.
+        table : {'house_classify', 'house_pop', 'history'}
+            The table.
+
+        Returns
+        -------
+        numpy.ndarray
+            The arrays of all runs of the chunk, end to end.
+        """
+        if (n, table) not in self._chunks:
+            path = os.path.join(self.directory, 'chunk_%06i_%s.npy' % (n, table))
+            self._chunks[(n, table)] = np.load(path, mmap_mode = 'r')
+        return self._chunks[(n, table)]
+
+    def _view(self, i, table, width):
+        """Return the (years, width) view of a table of a run."""
+        run = self.runs[i]
+        start = run[table]
+        return self.chunk(run['chunk'], table)[start:start + run['years'] * width].reshape(run['years'], width)
+
+    def classify(self, i):
+        """Return the classification codes of each house each year of a run.
+
+        Parameters
+        ----------
+        i : int
+            The id of the run.
+
+        Returns
+        -------
+        numpy.ndarray
+            An int8 array with one row per year and one column per house, of
+            the index of each classification in residency.typology.
+        """
+        return self._view(i, 'house_classify', self.runs[i]['houses'])
+
+    def occupancy(self, i):
+        """Return the number of people in each house each year of a run.
+
+        Parameters
+        ----------
+        i : int
+            The id of the run.
+
+        Returns
+        -------
+        numpy.ndarray
+            An int16 array with one row per year and one column per house.
+        """
+        return self._view(i, 'house_pop', self.runs[i]['houses'])
+
+    def history(self, i, column = None):
+        """Return the population and vital events each year of a run.
+
+        Parameters
+        ----------
+        i : int
+            The id of the run.
+        column : str, optional
+            A column of the history, one of `columns`; by default all.
+
+        Returns
+        -------
+        numpy.ndarray
+            An int32 array with one row per year and one column per column of
+            the history, or the single column requested.
+        """
+        output = self._view(i, 'history', len(self.columns))
+        if column is None:
+            return output
+        return output[:, self.columns.index(column)]
+
+    def rates(self, i):
+        """Return the vital rates each year of a run.
+
+        Parameters
+        ----------
+        i : int
+            The id of the run.
+
+        Returns
+        -------
+        dict of numpy.ndarray
+            The births, deaths, and marriage events of each year per person
+            alive at the end of the year (nan when there is no one).
+        """
+        population = self.history(i, 'population').astype(float)
+        population[population == 0] = np.nan
+        return {x : self.history(i, x) / population for x in ['births', 'deaths', 'marriages'] if x in self.columns}
+
+    def years(self, i):
+        """Return the years of a run."""
+        return np.arange(self.runs[i]['firstyear'], self.runs[i]['firstyear'] + self.runs[i]['years'])
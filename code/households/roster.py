@@ -0,0 +1,255 @@
+"""Indexed collections of Persons and Houses.
+
+Communities keep track of the Persons living in them and of the dead, whose
+relationships are still required for genealogy. As plain lists, removing a
+Person from these collections on death costs time proportional to the size
+of the community. The Roster defined here instead indexes its members by
+their unique id, so that adding, removing, and checking membership are done
+in constant time, while iteration still follows the order in which members
+were added. A RosterView exposes a Roster without allowing changes, which is
+how the World shares its Rosters of all Persons and Houses.
+
+Where members are drawn at random rather than iterated in order, a Pool 
+gives up the order of its members so that a random member can also be drawn
+in constant time.
+
+See Also
+--------
+main
+    The module defining Community, which stores Persons in Rosters.
+"""
+
+from households import rd, logging
+
+logging.getLogger(__name__).debug('importing roster')
+
+
+class Roster(object):
+    """An ordered collection of Persons or Houses indexed by their ids.
+
+    Members must have a unique `id` attribute. Iteration follows the order
+    in which members were added.
+
+    Parameters
+    ----------
+    members : iterable, optional
+        The initial members of the Roster.
+    """
+
+    def __init__(self, members = ()):
+        self._members = {}
+        self._view = RosterView(self)
+        for x in members:
+            self.add(x)
+
+    def view(self):
+        """Return a read-only view of the Roster that follows its changes.
+
+        Returns
+        -------
+        RosterView
+            The view of this Roster.
+        """
+        return self._view
+
+    def add(self, member):
+        """Add a member to the Roster.
+
+        Parameters
+        ----------
+        member : Person or House
+            The member to add.
+        """
+        self._members[member.id] = member
+
+    #For compatibility with code written for lists
+    append = add
+
+    def remove(self, member):
+        """Remove a member from the Roster.
+
+        Parameters
+        ----------
+        member : Person or House
+            The member to remove.
+
+        Raises
+        ------
+        ValueError
+            If `member` is not in the Roster.
+        """
+        if self._members.get(member.id) is not member:
+            raise ValueError('member not in Roster')
+        del self._members[member.id]
+
+    def get(self, id, default = None):
+        """Return the member with a given id, or `default` if there is none.
+
+        Parameters
+        ----------
+        id : int
+            The id of the member.
+        default : optional
+            What to return if no member has that id.
+        """
+        return self._members.get(id, default)
+
+    def copy(self):
+        """Return a list of the members, in the order they were added."""
+        return list(self._members.values())
+
+    def shuffled(self, random = rd):
+        """Return a list of the members in a random order.
+
+        Parameters
+        ----------
+        random : optional
+            An object with a `shuffle` method used to randomize the order, by
+            default the `random` module.
+
+        Returns
+        -------
+        list
+            The members in a random order.
+        """
+        output = list(self._members.values())
+        random.shuffle(output)
+        return output
+
+    def __contains__(self, member):
+        return member is not None and self._members.get(getattr(member, 'id', None)) is member
+
+    def __iter__(self):
+        return iter(self._members.values())
+
+    def __len__(self):
+        return len(self._members)
+
+    def __repr__(self):
+        return 'Roster(%i members)' % len(self._members)
+
+
+class RosterView(object):
+    """A read-only view of a Roster.
+
+    The view does not copy the Roster, so it always reflects the current
+    members and costs nothing to create.
+
+    Parameters
+    ----------
+    roster : Roster
+        The Roster to view.
+    """
+
+    def __init__(self, roster):
+        self._roster = roster
+
+    def get(self, id, default = None):
+        """Return the member with a given id, or `default` if there is none."""
+        return self._roster.get(id, default)
+
+    def copy(self):
+        """Return a list of the members, in the order they were added."""
+        return self._roster.copy()
+
+    def shuffled(self, random = rd):
+        """Return a list of the members in a random order."""
+        return self._roster.shuffled(random)
+
+    def __contains__(self, member):
+        return member in self._roster
+
+    def __iter__(self):
+        return iter(self._roster)
+
+    def __len__(self):
+        return len(self._roster)
+
+    def __repr__(self):
+        return 'RosterView(%i members)' % len(self._roster)
+
+
+class Pool(object):
+    """An unordered collection from which random members are drawn.
+
+    Members are kept in a list, with the position of each in a dict, so that
+    adding, removing (by swapping with the last member), checking membership,
+    and drawing a random member are all done in constant time.
+
+    Parameters
+    ----------
+    members : iterable, optional
+        The initial members of the Pool.
+    """
+
+    def __init__(self, members = ()):
+        self._members = []
+        self._positions = {}
+        for x in members:
+            self.add(x)
+
+    def add(self, member):
+        """Add a member to the Pool if it is not already there.
+
+        Parameters
+        ----------
+        member
+            The member to add.
+        """
+        if id(member) not in self._positions:
+            self._positions[id(member)] = len(self._members)
+            self._members.append(member)
+
+    def discard(self, member):
+        """Remove a member from the Pool if it is there.
+
+        Parameters
+        ----------
+        member
+            The member to remove.
+        """
+        i = self._positions.pop(id(member), None)
+        if i is not None:
+            last = self._members.pop()
+            if i < len(self._members):
+                self._members[i] = last
+                self._positions[id(last)] = i
+
+    def remove(self, member):
+        """Remove a member from the Pool.
+
+        Raises
+        ------
+        ValueError
+            If `member` is not in the Pool.
+        """
+        if member not in self:
+            raise ValueError('member not in Pool')
+        self.discard(member)
+
+    def choice(self, random = rd):
+        """Return a random member of the Pool, or None if it is empty.
+
+        Parameters
+        ----------
+        random : optional
+            An object with a `randrange` method, by default the `random` module.
+        """
+        if len(self._members) == 0:
+            return None
+        return self._members[random.randrange(len(self._members))]
+
+    def __getitem__(self, i):
+        return self._members[i]
+
+    def __contains__(self, member):
+        return id(member) in self._positions
+
+    def __iter__(self):
+        return iter(self._members.copy())
+
+    def __len__(self):
+        return len(self._members)
+
+    def __repr__(self):
+        return 'Pool(%i members)' % len(self._members)
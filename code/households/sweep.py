@@ -0,0 +1,375 @@
+"""Parameter sweeps of replicated simulations on a process pool.
+
+A sweep runs a simulation for every combination of a grid of parameters
+(e.g. population, area, and the marriage, inheritance, and mobility rules)
+and every seed of a list of seeds. Each (parameters, seed) pair is a run,
+identified by its key: the label of each parameter value and the seed.
+
+Runs are handed to a pool of worker processes, with only a bounded number in
+flight at once, and their results are written as they come back by a single
+writer in the main process. The writer also knows which keys it has already
+written, so that an interrupted sweep can be restarted without repeating
+runs.
+
+The function run for each key takes a dict of parameters and a seed and
+returns a dict of tables, each a dict of columns (lists of equal length),
+such as those returned by `simulate`. Both the function and the parameter
+values must be picklable to reach the workers; rules built from a
+behavior.rulespec.RuleSpec are sent by reference.
+
+Examples
+--------
+    options = {'pop' : [250, 500],
+               'area' : [750],
+               'startage' : [12],
+               'mortab' : {'west' : mortality},
+               'birthtab' : {'bagnall_frier' : fertility},
+               'marriagerule' : [patrilocal.build(), neolocal.build()],
+               'inheritancerule' : [moderate.build()],
+               'mobilityrule' : [overcrowded.build()],
+               'years' : [300]}
+    Sweep(options, range(0, 25000, 500), CSVWriter('../results/')).run()
+
+See Also
+--------
+behavior.rulespec
+    The module defining picklable rules.
+"""
+
+from households import os, logging, itertools, collections, main, narrative, residency
+
+import csv
+import multiprocessing
+import queue
+
+logging.getLogger(__name__).debug('importing sweep')
+
+
+def label(value):
+    """Return the label of a parameter value used in the keys of runs.
+
+    Parameters
+    ----------
+    value
+        A parameter value: a rule built from a RuleSpec is labelled by the
+        name of the RuleSpec, a function or a RuleSpec by its name, and other
+        values by their string.
+
+    Returns
+    -------
+    str
+    """
+    if getattr(value, 'spec', None) is not None:
+        return value.spec.name
+    if isinstance(value, str):
+        return value
+    if hasattr(value, '__name__'):
+        return value.__name__
+    if hasattr(value, 'name'):
+        return str(value.name)
+    return str(value)
+
+
+def grid(options):
+    """Return every combination of parameter values.
+
+    Parameters
+    ----------
+    options : dict of list or dict of dict
+        The values of each parameter, by name, either as a list or as a dict
+        of values by label for values without a meaningful label (such as
+        AgeTables).
+
+    Returns
+    -------
+    list of tuple
+        The labels and the values of the parameters of each combination, as
+        dicts by name, with the last parameter changing fastest.
+    """
+    names = list(options.keys())
+    choices = []
+    for name in names:
+        values = options[name]
+        if isinstance(values, dict):
+            choices.append([(str(k), v) for k, v in values.items()])
+        else:
+            choices.append([(label(x), x) for x in values])
+    output = []
+    for combination in itertools.product(*choices):
+        output.append(({n : x[0] for n, x in zip(names, combination)},
+                       {n : x[1] for n, x in zip(names, combination)}))
+    return output
+
+
+def key(labels, seed):
+    """Return the key of a run from the labels of its parameters and its seed.
+
+    Parameters
+    ----------
+    labels : dict of str
+        The label of each parameter, by name.
+    seed : int
+        The seed of the run.
+
+    Returns
+    -------
+    tuple
+        The (name, label) of each parameter in order of name, then the seed.
+    """
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items())) + (int(seed),)
+
+
+def simulate(parameters, seed):
+    """Run a single Community and record its houses and vital events each year.
+
+    Parameters
+    ----------
+    parameters : dict
+        The arguments of Community (pop, area, startage, mortab, birthtab,
+        marriagerule, inheritancerule, mobilityrule), the number of `years` to
+        run, and optionally the `engine` of the World and the number of years
+        between each World.compact (`compact`), which keeps the memory of a 
+        run of many centuries from growing with its dead without changing 
+        its results. By default the World is not compacted.
+    seed : int
+        The seed of the World.
+
+    Returns
+    -------
+    dict of dict of list
+        Three tables, each with a 'year' column:
+            'house_classify': the residency.classify of each house each year,
+            'house_pop': the number of people in each house each year,
+            'history': the population, births, deaths, marriage events, and
+                       number of occupied houses each year.
+        The columns of houses are their index in the Community.
+    """
+    world = main.World(engine = parameters.get('engine', 'object'),
+                       recording = narrative.RecordingPolicy('none'),
+                       seed = seed)
+    community = main.Community(world, 'Sweetwater', parameters['pop'], parameters['area'],
+                               parameters['startage'], parameters['mortab'], parameters['birthtab'],
+                               parameters['marriagerule'], parameters['inheritancerule'],
+                               parameters['mobilityrule'])
+    houses = list(community.houses)
+    #The array engine's columns allow the census to be taken from arrays; 
+    ## otherwise only the houses that changed are classified again
+    if world.population is None:
+        census = residency.ClassificationCache(community = community).classify_all
+    else:
+        census = lambda x: [residency.typology[i] if i >= 0 else None for i in residency.census(x)[0]]
+    years = list(range(1, parameters['years'] + 1))
+    compact = parameters.get('compact')
+    classify = {i : [] for i in range(len(houses))}
+    pop = {i : [] for i in range(len(houses))}
+    history = collections.defaultdict(list)
+    for y in years:
+        world.progress()
+        if compact and y % compact == 0:
+            world.compact()
+        for i, x in enumerate(census(houses)):
+            classify[i].append(x)
+        for i, h in enumerate(houses):
+            pop[i].append(len(h.people))
+        tally = community.tallies[-1]
+        history['population'].append(len(community.people))
+        history['births'].append(tally[narrative.BirthEvent])
+        history['deaths'].append(tally[narrative.DeathEvent])
+        history['marriages'].append(tally[narrative.MarriageEvent])
+        history['occupied'].append(sum(x != 0 for x in [len(h.people) for h in houses]))
+    return {'house_classify' : dict(year = years, **{str(i) : x for i, x in classify.items()}),
+            'house_pop' : dict(year = years, **{str(i) : x for i, x in pop.items()}),
+            'history' : dict(year = years, **history)}
+
+
+class CSVWriter(object):
+    """Write the results of a sweep as CSV files in a folder.
+
+    Each run is given the next integer id and added as a row of 'runs.csv',
+    with the label of each parameter and the seed. Each of its tables is
+    written to '<id>_<table>.csv'. Files are only appended to, so the writer
+    never re-reads its results while a sweep runs.
+
+    Parameters
+    ----------
+    folder : str
+        The folder of the results, created if needed.
+
+    Attributes
+    ----------
+    completed : set of tuple
+        The keys of the runs already written.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok = True)
+        self.completed = set()
+        self._path = os.path.join(folder, 'runs.csv')
+        self._columns = None
+        self._next = 0
+        if os.path.exists(self._path):
+            with open(self._path, newline = '') as f:
+                for row in csv.DictReader(f):
+                    self._columns = [x for x in row.keys() if x not in ['id', 'seed']]
+                    self.completed.add(key({x : row[x] for x in self._columns}, row['seed']))
+                    self._next = max(self._next, int(row['id']) + 1)
+
+    def write(self, labels, seed, result):
+        """Write the results of a run.
+
+        Parameters
+        ----------
+        labels : dict of str
+            The label of each parameter, by name.
+        seed : int
+            The seed of the run.
+        result : dict of dict of list
+            The tables of the run.
+
+        Returns
+        -------
+        int
+            The id of the run.
+        """
+        if self._columns is None:
+            self._columns = sorted(labels.keys())
+        elif sorted(labels.keys()) != sorted(self._columns):
+            raise ValueError('parameters do not match those of runs.csv')
+        i = self._next
+        for name, table in result.items():
+            with open(os.path.join(self.folder, '%i_%s.csv' % (i, name)), 'w', newline = '') as f:
+                out = csv.writer(f)
+                out.writerow(list(table.keys()))
+                out.writerows(zip(*table.values()))
+        new = not os.path.exists(self._path)
+        with open(self._path, 'a', newline = '') as f:
+            out = csv.writer(f)
+            if new:
+                out.writerow(['id'] + self._columns + ['seed'])
+            out.writerow([i] + [labels[x] for x in self._columns] + [seed])
+        self.completed.add(key(labels, seed))
+        self._next += 1
+        return i
+
+    def flush(self):
+        """Finish writing; every run is written completely by `write`."""
+        pass
+
+
+#The function and grid of a sweep, set in each worker process by _initialize
+_worker = {}
+
+def _initialize(function, combinations):
+    """Keep the function and parameters of a sweep in a worker process."""
+    _worker['function'] = function
+    _worker['combinations'] = combinations
+
+def _replicate(index, seed):
+    """Run the parameters with a given index in the grid with a seed."""
+    return index, seed, _worker['function'](_worker['combinations'][index][1], seed)
+
+
+class Sweep(object):
+    """Run replicates of a simulation over a grid of parameters.
+
+    Parameters
+    ----------
+    options : dict of list or dict of dict
+        The values of each parameter, by name (see `grid`).
+    seeds : list of int
+        The seeds of the replicates of each combination of parameters.
+    writer : CSVWriter, results.ResultsWriter, or equivalent
+        The writer of the results, with a set of `completed` keys and 
+        `write` and `flush` methods.
+    function : callable, optional
+        The function run for each combination and seed, `simulate` by
+        default. It must be picklable, e.g. defined at the top level of a
+        module.
+    processes : int, optional
+        The number of worker processes; by default the number of CPUs. If 0,
+        runs are made one after another in this process.
+    inflight : int, optional
+        The greatest number of runs submitted but not yet written; by default
+        twice the number of processes.
+
+    Attributes
+    ----------
+    combinations : list of tuple
+        The labels and values of each combination of parameters.
+    """
+
+    def __init__(self, options, seeds, writer, function = simulate, processes = None, inflight = None):
+        self.combinations = grid(options)
+        self.seeds = list(seeds)
+        self.writer = writer
+        self.function = function
+        self.processes = os.cpu_count() if processes is None else processes
+        if type(self.processes) != int or self.processes < 0:
+            raise ValueError('processes must be a non-negative integer')
+        self.inflight = 2 * max(1, self.processes) if inflight is None else inflight
+        if self.inflight < 1:
+            raise ValueError('inflight must be at least 1')
+
+    def pending(self):
+        """Return the runs not yet written.
+
+        Returns
+        -------
+        list of tuple
+            The index in `combinations` and the seed of each run whose key is
+            not among the writer's completed keys.
+        """
+        return [(i, seed) for i, (labels, values) in enumerate(self.combinations)
+                for seed in self.seeds if key(labels, seed) not in self.writer.completed]
+
+    def run(self):
+        """Run all pending runs and write their results.
+
+        Returns
+        -------
+        int
+            The number of runs made.
+
+        Raises
+        ------
+        RuntimeError
+            If a run failed, after writing the runs that finished before it.
+        """
+        todo = collections.deque(self.pending())
+        total = len(todo)
+        logging.getLogger(__name__).info('%i runs to make, %i already done' % (total, len(self.combinations) * len(self.seeds) - total))
+        if self.processes == 0:
+            _initialize(self.function, self.combinations)
+            try:
+                while len(todo) != 0:
+                    self._write(*_replicate(*todo.popleft()))
+            finally:
+                self.writer.flush()
+            return total
+        done = queue.Queue()
+        running = 0
+        failure = None
+        with multiprocessing.Pool(self.processes, _initialize, (self.function, self.combinations)) as pool:
+            while len(todo) != 0 or running != 0:
+                #Keep the pool busy, but only a bounded number of results waiting
+                while len(todo) != 0 and running < self.inflight and failure is None:
+                    pool.apply_async(_replicate, todo.popleft(), callback = done.put,
+                                     error_callback = lambda x: done.put(x))
+                    running += 1
+                result = done.get()
+                running -= 1
+                if isinstance(result, BaseException):
+                    failure = result
+                    todo.clear()
+                else:
+                    self._write(*result)
+        self.writer.flush()
+        if failure is not None:
+            raise RuntimeError('a run of the sweep failed') from failure
+        return total
+
+    def _write(self, index, seed, result):
+        """Write the result of a run with the single writer."""
+        i = self.writer.write(self.combinations[index][0], seed, result)
+        logging.getLogger(__name__).debug('wrote run %s' % str(i))
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Set up the community shared by the benchmarks in this folder.
+
+The benchmarks are run from the code folder, so this module is found next
+to them:
+    from _setup import setup
+
+Every benchmark uses the same life tables and rules, which only differ in
+how spouses are found where a benchmark needs it.
+"""
+import sys
+sys.path.insert(0,'.')
+import households
+from households import behavior, narrative
+
+male, female = (households.male,households.female)
+
+death = households.AgeTable([0,20,25,150],male,[.01,.075,.1],female,[.01,.02,.075])
+birth = households.AgeTable([0,15,44,150],female,[0,.3,0],male,[0,0,0])
+marriage = households.AgeTable([0,18,150],female,[0,.33],male,[0,.33])
+remarriage = households.AgeTable([0,150],female,[.2],male,[.2])
+
+def rules(get_eligible = behavior.marriage.get_eligible_not_sibling_same_community):
+    """Return the marriage, inheritance, and mobility rules of the benchmarks.
+
+    Parameters
+    ----------
+    get_eligible : function, optional
+        How the marriage rule finds those eligible to marry a Person.
+
+    Returns
+    -------
+    tuple of MarriageRule, InheritanceRuleComplex, and MobilityRule
+    """
+    marriagerule = behavior.marriage.MarriageRule(marriage,
+                                                  get_eligible,
+                                                  behavior.marriage.pick_spouse_random,
+                                                  behavior.marriage.locality_patrilocality,
+                                                  remarriage)
+    inheritancerule = behavior.inheritance.InheritanceRuleComplex(behavior.inheritance.has_property_houses,
+                                                                  behavior.inheritance.find_heirs_sons_oldest_to_youngest,
+                                                                  behavior.inheritance.limit_heirs_not_owners,
+                                                                  behavior.inheritance.distribute_property_to_first_heir_and_move_household,
+                                                                  behavior.inheritance.failed_inheritance_no_owner)
+    mobilityrule = behavior.mobility.MobilityRule(behavior.mobility.check_household_overcrowded,
+                                                  behavior.mobility.who_leaves_house_family,
+                                                  behavior.mobility.destination_random_house_same_village)
+    return marriagerule, inheritancerule, mobilityrule
+
+def setup(n_houses, engine = 'object', eventlog = False, recording = 'none', seed = 1,
+          get_eligible = behavior.marriage.get_eligible_not_sibling_same_community):
+    """Return a new World with one Community of founders ready to run.
+
+    Parameters
+    ----------
+    n_houses : int
+        The number of houses, and of founders, of the Community.
+    engine : {'object', 'array'}, optional
+        The engine of the World.
+    eventlog : bool, optional
+        Whether the World keeps an EventLog.
+    recording : str, optional
+        The mode of the RecordingPolicy of the World.
+    seed : int, optional
+        The seed of the World.
+    get_eligible : function, optional
+        How the marriage rule finds those eligible to marry a Person.
+
+    Returns
+    -------
+    world : households.World
+    community : households.Community
+    """
+    world = households.World(engine = engine, eventlog = eventlog,
+                             recording = narrative.RecordingPolicy(recording), seed = seed)
+    community = households.Community(world,'Sweetwater',n_houses,n_houses,17,death,birth,*rules(get_eligible))
+    return world, community
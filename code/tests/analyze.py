@@ -1,98 +1,105 @@
 # Analysis and interpretation of results
+"""Analyze the results of tests/simulate.py.
+
+Run from the code folder:
+    python tests/analyze.py [results folder]
+
+The results in ../results/ are memory-mapped with households.results, so the
+arrays of each run are read from disk only as they are used.
+"""
+import sys
+import os
 import numpy as np
-import random as rd
 import scipy as sp
-import networkx as nx
-import pandas as pd
+import scipy.stats
 import matplotlib.pyplot as plt
-import copy as cp
+sys.path.insert(0,'.')
+from households import residency, results
 
-filename = 'simulation_results.csv'
-folder = '../results/'
-runs = pd.read_csv(folder + filename)
+folder = sys.argv[1] if len(sys.argv) > 1 else '../results/'
+runs = results.Results(folder)
 
 def ecdf(data):
     """
     Get an empirical cumulative density function.
     """
-    data.sort()
-    density = [1./len(data)]*len(data)
-    cumdensity = np.cumsum(density)
+    data = np.sort(data)
+    cumdensity = np.arange(1,len(data)+1)/len(data)
     output =  np.array([data,cumdensity])
     return output.T
 
+def occupation_spells(classified):
+    """Return the lengths of the spells of occupation of each house.
+
+    Parameters
+    ----------
+    classified : numpy.ndarray
+        The classification codes of each house (columns) each year (rows).
+
+    Returns
+    -------
+    finished, unfinished : numpy.ndarray
+        The lengths of the spells that ended with the house empty, and of
+        those still under way in the last year.
+    """
+    occupied = classified != residency.typology.index('empty')
+    #Pad with empty years, so every spell has a start and an end
+    padded = np.zeros((occupied.shape[0]+2,occupied.shape[1]),dtype = np.int8)
+    padded[1:-1] = occupied
+    change = np.diff(padded,axis = 0)
+    #Starts and ends of spells, in order of house then year
+    starts = np.argwhere(change.T == 1)
+    ends = np.argwhere(change.T == -1)
+    lengths = ends[:,1] - starts[:,1]
+    unfinished = ends[:,1] == occupied.shape[0]
+    return lengths[~unfinished], lengths[unfinished]
+
 # Longevity of household occupation
 # Pick which sets you will be contrasting
-contrast = [runs['locality'] == 'neolocality', runs['locality']== 'patrilocality']
+contrast = [runs.select(marriagerule = 'neolocality'), runs.select(marriagerule = 'patrilocality')]
 #Create a data structure to store the results
 distribution = []
-for i in xrange(len(contrast)):
-    distribution.append({ 'finished' : [], 'unfinished' : []})
 # For each group:
-for c in xrange(len(contrast)):
-    group = contrast[c]
-    # Select teh relevant files
-    # For each file:
-    for i in group.index:
-        if group[i] == True:
-            # open the file that has the classification in it
-            data = pd.read_csv(folder+str(runs.ix[i]['id'])+'_house_classify.csv',index_col=0)
-            # For every house:
-            for h in data.columns[1:]:
-                # Begin a counter
-                counter = 0
-                # For each year:
-                for y in data.index:
-                    #  if empty and counter 0, pass, otherwise record and reset
-                    if data[h][y] == 'empty':
-                        if counter == 0:
-                            pass
-                        else:
-                            distribution[c]['finished'].append(counter)
-                            counter = 0
-                    else:
-                        #House is occupied
-                        #Add 1
-                        counter += 1
-                        if y == max(data.index):
-                            # if last, add 1 and then add to the list of unfinished runs
-                            distribution[c]['unfinished'].append(counter)
+for group in contrast:
+    finished = []
+    unfinished = []
+    # For each run, find the spells of each house
+    for i in group:
+        f, u = occupation_spells(runs.classify(i))
+        finished.append(f)
+        unfinished.append(u)
+    distribution.append({'finished' : np.concatenate(finished), 'unfinished' : np.concatenate(unfinished)})
 
 #Plot the histogram and kernel for each one of htese in turn
 c = 0
-plt.hist(distribution[c]['finished'],normed=True,bins=range(0,300,5))
-d = cp.copy(distribution[c]['finished'])
+plt.hist(distribution[c]['finished'],density=True,bins=range(0,300,5))
+d = distribution[c]['finished']
 kern = sp.stats.gaussian_kde(d)
-pdf = kern.pdf(np.unique(d))
 plt.plot(np.unique(d),kern(np.unique(d)),'b-')
 plt.xlabel('Years')
 plt.ylabel('Probability')
-plt.title('Patrilocality')
+plt.title('Neolocality')
 
 # Plot the kernels together
 colors = ['r-','b-']
-for c in xrange(len(contrast)):
-    #Copy the array
-    d = cp.copy(distribution[c]['finished'])
+for c in range(len(contrast)):
+    d = distribution[c]['finished']
     cdf = ecdf(d)
     kern = sp.stats.gaussian_kde(d)
-    pdf = kern.pdf(np.unique(d))
     plt.plot(np.unique(d),kern(np.unique(d)),colors[c])
-plt.legend('Neolocality','Patrilocality')
+plt.legend(['Neolocality','Patrilocality'])
 
 #Write this data
 filenames = ['neolocality_lifespan_data','patrilocality_lifespan_data']
-for c in xrange(len(contrast)):
-    #make each dictionary into a 
+os.makedirs('../analysis/',exist_ok = True)
+for c in range(len(contrast)):
     for k in ['finished','unfinished']:
-        d = pd.DataFrame(distribution[c][k])
-        d.to_csv('../analysis/'+filenames[c]+'_' + str(k) + '.csv',index=False)
-    
-    
-    #
+        d = distribution[c][k]
+        np.savetxt('../analysis/'+filenames[c]+'_' + str(k) + '.csv',d,fmt = '%i')
+
+    #Fit a gamma distribution, by the method of moments and by maximum likelihood
     m = np.mean(d)
     v = np.var(d)
-    mode = [x for x in np.unique(d) if kern.pdf(x) == max(pdf)][0]
     alpha = (m**2)/v
     beta = m/v
     g = sp.stats.gamma(alpha,scale=1/beta)
@@ -100,50 +107,34 @@ for c in xrange(len(contrast)):
     p = sp.stats.gamma.fit(d)
     g = sp.stats.gamma(p[0],loc=p[1],scale=p[2])
     plt.plot(np.unique(d),g.pdf(np.unique(d)))
-    
-    
+
 
 # Distribution of family types
+typeslist = residency.typology
 arrays = []
-typeslist = ['empty','solitary','no-family','nuclear','extended','multiple']
-for c in xrange(len(contrast)):
-    group = contrast[c]
-    # Select teh relevant files
-    # For each file:
+for group in contrast:
+    # Count the houses of each type each year of each run
     collect = []
-    for i in group.index:
-        if group[i] == True:
-            # open the file that has the classification in it
-            data = pd.read_csv(folder+str(runs.ix[i]['id'])+'_house_classify.csv',index_col=0)
-            # For every house:
-            store = []
-            for y in data.index:
-                counts = [0.]*6
-                for h in data.columns[1:]:
-                    w = [x for x in xrange(6) if typeslist[x] == data[h][y]][0]
-                    counts[w] +=1
-                # store this year's counts
-                store.append(counts)
-            #store this run's counts
-            collect.append(store)
-    #store this group's counts
+    for i in group:
+        classified = runs.classify(i)
+        #Offset each year's codes so one bincount counts every year at once
+        offsets = np.arange(classified.shape[0])[:,None]*len(typeslist)
+        #Unclassified houses (code -1) are left out
+        codes = (classified + offsets)[classified >= 0]
+        counts = np.bincount(codes,minlength = classified.shape[0]*len(typeslist))
+        collect.append(counts.reshape(classified.shape[0],len(typeslist)))
     arrays.append(collect)
 
 #Plot an averaged river plot
-for c in xrange(len(contrast)):
-    averaged = np.zeros((300,6)) #This may need editing depending on the years
-    # For each data set
-    for x in arrays[c]:
-        for y in xrange(np.shape(x)[0]):
-            averaged[y] += x[y]
-    percents = np.zeros((300,5))
-    for y in xrange(np.shape(percents)[0]):
-        percents[y] = averaged[y][1:]/sum(averaged[y][1:])
-    plt.stackplot(range(300),np.transpose(percents),baseline='zero')
-    plt.axis([0,300,0,1]) 
-    plt.legend(['solitary','no-family','nuclear','extended','multiple'],loc=0)
+titles = ['Neolocality','Patrilocality']
+for c in range(len(contrast)):
+    averaged = np.sum(arrays[c],axis = 0)
+    #Leave out empty houses
+    percents = averaged[:,1:]/averaged[:,1:].sum(axis = 1,keepdims = True)
+    plt.figure()
+    plt.stackplot(range(len(percents)),np.transpose(percents),baseline='zero')
+    plt.axis([0,len(percents),0,1])
+    plt.legend(typeslist[1:],loc=0)
     plt.xlabel('Year')
     plt.ylabel('Percent')
-    plt.title('Neolocality, family type by year')
-            
-        
+    plt.title(titles[c] + ', family type by year')
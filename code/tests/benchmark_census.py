@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Report the time taken to classify every house every year.
+
+Run from the code folder:
+    python tests/benchmark_census.py [number of houses] [years] [engine]
+
+A community is run for the given number of years with the given engine
+('object' or 'array'), and the houses of each classification are counted 
+each year. The script fails if a way of
+classifying gives any house, after the year's births, deaths, marriages, and
+moves, a classification other than residency.classify gives it afresh. The
+time taken to classify into every registered typology at once with
+residency.classify_many is also reported.
+"""
+import sys
+import time
+import collections
+from _setup import setup
+from households import residency
+
+n_houses = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+years = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+engine = sys.argv[3] if len(sys.argv) > 3 else 'object'
+
+# Step 1: set up a community
+world, community = setup(n_houses, engine)
+houses = list(community.houses)
+
+# Step 2: classify every house each year in each way
+## Each way returns the classification of each house, in order
+cache = residency.ClassificationCache()
+watching = residency.ClassificationCache(community = community)
+watching_many = residency.ClassificationCache(residency.classify_many, community)
+
+def census():
+    """Return the classification of each house from the codes of residency.census."""
+    return [residency.typology[x] if x >= 0 else None for x in residency.census(houses)[0]]
+
+def watched(cache):
+    """Return the classification of each house kept by a watching cache."""
+    cache.update()
+    return cache.classify_all(houses)
+
+ways = {'classify' : lambda: [residency.classify(h) for h in houses],
+        'ClassificationCache' : lambda: cache.classify_all(houses),
+        'summarize, cambridge' : lambda: [residency.cambridge(residency.summarize(h)) for h in houses],
+        'classify_many, cambridge' : lambda: [residency.classify_many(h,['cambridge'])[0] for h in houses],
+        'watching community' : lambda: watched(watching),
+        'census' : census}
+timings = {name : 0. for name in ways.keys()}
+timings['every typology'] = 0.
+timings['every typology, watching'] = 0.
+for y in range(years):
+    world.progress()
+    results = {}
+    for name, way in ways.items():
+        start = time.perf_counter()
+        results[name] = way()
+        timings[name] += time.perf_counter() - start
+    for name, result in results.items():
+        if result != results['classify']:
+            sys.exit(name + ' disagrees with residency.classify in year %i' % world.year)
+    #The counts kept by the watching cache and given by census are those of 
+    ## the houses
+    counts = collections.Counter(results['classify'])
+    if +watching.counts != counts:
+        sys.exit('the census of the watching cache is out of date in year %i' % world.year)
+    if +collections.Counter(dict(zip(residency.typology,residency.census(houses)[1].tolist()))) != +counts:
+        sys.exit('the counts of census disagree with residency.classify in year %i' % world.year)
+    start = time.perf_counter()
+    many = [residency.classify_many(h) for h in houses]
+    timings['every typology'] += time.perf_counter() - start
+    start = time.perf_counter()
+    watched_many = watched(watching_many)
+    timings['every typology, watching'] += time.perf_counter() - start
+    for result in [many, watched_many]:
+        if [x[0] for x in result] != results['classify']:
+            sys.exit('classify_many disagrees with residency.classify in year %i' % world.year)
+    if watched_many != many:
+        sys.exit('the watching cache of classify_many is out of date in year %i' % world.year)
+
+# Step 3: report
+print('%i houses, %i years, %i people at the end, %s engine' % (n_houses, years, len(community.people), engine))
+for name, seconds in timings.items():
+    print('%-26s %8.2f ms per census' % (name, 1000 * seconds / years))
+print('%i typologies: %s' % (len(residency.typologies), ', '.join(residency.typologies.keys())))
+print('cache reused %.1f%% of classifications' % (100 * cache.hits / (cache.hits + cache.misses)))
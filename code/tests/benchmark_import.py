@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Check that importing households is fast and leaves heavy dependencies out.
+
+Run from the code folder:
+    python tests/benchmark_import.py [budget in seconds] [repeats]
+
+Each repeat imports the package in a fresh Python process, as a worker of a
+parameter sweep would. The script fails if the median import time exceeds
+the budget, or if matplotlib, networkx, or scipy were imported.
+"""
+import sys
+import subprocess
+import statistics
+
+budget = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+# Step 1: time the import in fresh processes
+probe = '''
+import sys, time
+start = time.perf_counter()
+import households
+heavy = [x for x in ['matplotlib','networkx','scipy'] if x in sys.modules]
+print('%f;%s' % (time.perf_counter() - start, ','.join(heavy)))
+'''
+times = []
+for i in range(repeats):
+    output = subprocess.run([sys.executable,'-c',probe],capture_output = True,text = True,check = True,cwd = '.')
+    #The last line is the result, after anything printed by the package
+    seconds, heavy = output.stdout.strip().split('\n')[-1].split(';')
+    times.append(float(seconds))
+
+# Step 2: report and check the budget
+median = statistics.median(times)
+print('import households: median %.3f s over %i runs (budget %.3f s)' % (median,repeats,budget))
+if heavy != '':
+    sys.exit('heavy dependencies imported eagerly: ' + heavy)
+if median > budget:
+    sys.exit('import time over budget')
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Report the time taken to find the relatives of everyone alive.
+
+Run from the code folder:
+    python tests/benchmark_kinship.py [number of houses] [years]
+
+A community is run for the given number of years, then the grandparents and
+the first cousins of every living Person are found by following has_parents
+and has_children in Python, and with the World's kinship.Genealogy. The
+coefficients of relationship of the first hundred living Persons with all
+others are then found one pair at a time and a whole pool at a time. The
+script fails if the ways of finding relatives disagree, or if, for random 
+pairs of living Persons and random pairs of relatives, the coefficient of
+Genealogy.relatedness differs from kinship.relatedness or from Wright's 
+recursion on has_parents. A second community is then run with marriage 
+prohibited between close kin, and the script fails if any search for a 
+spouse prohibits other than exactly the candidates with a coefficient of at
+least 1/8, or if close kin married.
+"""
+import sys
+import time
+import numpy as np
+from _setup import setup
+from households import kinship, behavior
+
+n_houses = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+years = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+# Step 1: set up and run a community
+world, community = setup(n_houses)
+for y in range(years):
+    world.progress()
+people = list(community.people)
+
+# Step 2: find relatives in Python
+def up(persons,generations):
+    """Return the ancestors exactly some generations back of a list of Persons."""
+    for i in range(generations):
+        persons = set(q for p in persons for q in p.has_parents)
+    return persons
+
+def down(persons,generations):
+    """Return the descendants exactly some generations down of a list of Persons."""
+    for i in range(generations):
+        persons = set(q for p in persons for q in p.has_children)
+    return persons
+
+start = time.perf_counter()
+grandparents = [set(x.id for x in up([p],1) | up([p],2)) for p in people]
+cousins = [set(x.id for x in down(up([p],2),2) - down(up([p],1),1)) for p in people]
+python = time.perf_counter() - start
+
+# Step 3: find relatives with the genealogy
+def split(which,found):
+    """Return the set of relatives of each Person from the pairs of a query."""
+    bounds = which.searchsorted(range(1,len(people)))
+    return [set(x.tolist()) for x in np.split(found,bounds)]
+
+start = time.perf_counter()
+ids = [p.id for p in people]
+ancestors = world.genealogy.ancestors(ids,2)
+kin = world.genealogy.cousins(ids,1)
+indexed = time.perf_counter() - start
+indexed_grandparents = split(*ancestors)
+indexed_cousins = split(*kin)
+
+if indexed_grandparents != grandparents or indexed_cousins != cousins:
+    sys.exit('the genealogy disagrees with has_parents and has_children')
+
+# Step 4: find the relatedness of pairs of people
+ids = np.array(ids)
+start = time.perf_counter()
+pairs = [[kinship.relatedness(p,q) for q in people] for p in people[:100]]
+pairwise = time.perf_counter() - start
+world.genealogy = kinship.Genealogy(memo = world.genealogy.memo)
+for p in list(world.deadpeople) + people:
+    world.genealogy.add(p)
+start = time.perf_counter()
+pools = [world.genealogy.relatedness(p.id,ids) for p in people[:100]]
+pooled = time.perf_counter() - start
+if not np.allclose(pairs,pools):
+    sys.exit('relatedness of pairs disagrees with that of pools')
+
+# Step 5: check the relatedness of random pairs against has_parents
+def coefficient(a,b,depth,memo):
+    """Return the kinship coefficient of two Persons from their has_parents, keeping it in memo."""
+    key = (min(a.id,b.id),max(a.id,b.id),depth)
+    if key not in memo:
+        if a is b:
+            parents = a.has_parents
+            inbred = coefficient(parents[0],parents[1],depth - 2,memo) if depth >= 2 and len(parents) == 2 else 0.
+            memo[key] = .5 * (1 + inbred)
+        elif depth <= 0:
+            memo[key] = 0.
+        else:
+            #The later born cannot be an ancestor of the other
+            x, y = (a,b) if a.birthyear > b.birthyear else (b,a)
+            memo[key] = .5 * sum(coefficient(q,y,depth - 1,memo) for q in x.has_parents)
+    return memo[key]
+
+random = np.random.default_rng(0)
+memo = {}
+checked = 0
+for i in random.choice(len(people),min(200,len(people)),replace = False):
+    p = people[i]
+    pool = world.genealogy.relatedness(p.id,ids)
+    #Most random pairs are unrelated, so relatives are drawn as well
+    related = np.flatnonzero(pool)
+    others = np.concatenate((random.choice(len(people),5),random.choice(related,5)))
+    for j in others.tolist():
+        r = kinship.relatedness(p,people[j])
+        if not np.isclose(pool[j],r) or not np.isclose(r,2 * coefficient(p,people[j],4,memo)):
+            sys.exit('relatedness of %i and %i disagrees with has_parents' % (p.id,people[j].id))
+        checked += 1
+
+# Step 6: check that marriage is prohibited to exactly the close kin
+## Each search for a spouse is checked as the community is run, since at 
+## the end of a year few of the unmarried have candidates left
+memo = {}
+prohibited = [0]
+def get_eligible_checked(person):
+    """Return the eligible of a Person, checking that only close kin are prohibited."""
+    eligible = behavior.marriage.get_eligible_not_related_same_community(person)
+    candidates = person.has_community.market.candidates(person)
+    close = [2 * coefficient(person,c,4,memo) >= .125 for c in candidates]
+    if eligible != [c for c, x in zip(candidates,close) if not x]:
+        sys.exit('get_eligible_not_related_same_community does not prohibit exactly the close kin of %i' % person.id)
+    for c, x in zip(candidates,close):
+        if behavior.marriage.is_eligible_not_related_same_community(person,c) == x:
+            sys.exit('is_eligible_not_related_same_community disagrees for %i and %i' % (person.id,c.id))
+    prohibited[0] += sum(close)
+    return eligible
+
+behavior.marriage.eligibility_tests[get_eligible_checked] = behavior.marriage.is_eligible_not_related_same_community
+prohibiting, village = setup(n_houses, get_eligible = get_eligible_checked)
+for y in range(years):
+    prohibiting.progress()
+couples = [p for p in list(village.people) + list(prohibiting.deadpeople) if p.has_spouse is not None]
+if any(2 * coefficient(p,p.has_spouse,4,memo) >= .125 for p in couples):
+    sys.exit('close kin married under the prohibition')
+if prohibited[0] == 0:
+    sys.exit('no candidates were close kin, so the prohibition was not checked')
+
+# Step 7: report
+print('%i houses, %i years, %i people alive, %i ever' % (n_houses, years, len(people), world.genealogy.size))
+print('%-24s %8.2f ms' % ('python', 1000 * python))
+print('%-24s %8.2f ms' % ('genealogy', 1000 * indexed))
+print('%-24s %8.2f ms' % ('relatedness of pairs', 1000 * pairwise))
+print('%-24s %8.2f ms' % ('relatedness of pools', 1000 * pooled))
+print('%i random pairs agree with has_parents' % checked)
+print('%i pairs of unmarried close kin prohibited, %i married people' % (prohibited[0], len(couples)))
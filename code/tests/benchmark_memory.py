@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Report the memory used per Person and per Event, to catch regressions.
+
+Run from the code folder:
+    python tests/benchmark_memory.py [number of Persons] [number of Events]
+
+Memory is measured with tracemalloc as the growth in allocated memory while
+creating many objects, so it includes each object's containers (e.g. the
+lists of parents and children of a Person) but not shared objects.
+"""
+import sys
+import gc
+import tracemalloc
+from _setup import setup, rules
+import households
+from households import narrative
+
+female = households.female
+
+n_persons = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+n_events = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+def measure(make,n):
+    """Return the bytes allocated per object by calling `make` n times."""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    kept = [make() for i in range(n)]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del kept
+    return used / n
+
+# Step 1: set up the rules of the Persons
+marriagerule, inheritancerule, mobilityrule = rules()
+
+# Step 2: measure Persons with and without Diaries, and Houses
+results = {}
+recorded = {'none' : 'no Diary', 'all' : 'with Diary', 'eventlog' : 'in EventLog'}
+for engine in ['object','array']:
+    for mode in ['none','all','eventlog']:
+        world, community = setup(0, engine, mode == 'eventlog', 'none' if mode == 'none' else 'all')
+        make = lambda: world.person_type(female,20,community,None,marriagerule,inheritancerule,mobilityrule)
+        label = 'Person (%s engine, %s)' % (engine, recorded[mode])
+        results[label] = measure(make,n_persons)
+world, community = setup(0)
+results['House (no Diary)'] = measure(lambda: households.House(5,community),n_persons)
+
+# Step 3: measure Events, as stored in a Diary and in an EventLog
+house = households.House(5,community)
+person = households.Person(female,20,community,house,marriagerule,inheritancerule,mobilityrule)
+results['Event (object)'] = measure(lambda: narrative.BornEvent(0,house,person),n_events)
+log = narrative.EventLog(capacity = 1)
+def append():
+    log.append(narrative.BornEvent,0,person,house)
+results['Event (EventLog row)'] = measure(append,n_events)
+
+# Step 4: report
+for label, used in results.items():
+    print('%-36s %8.1f bytes' % (label, used))
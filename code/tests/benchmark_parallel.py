@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Report the time taken to run many communities in one process and in several.
+
+Run from the code folder:
+    python tests/benchmark_parallel.py [communities] [houses] [years] [processes ...]
+
+The same communities are run for the given number of years in a World, and
+in a ParallelWorld with each of the given numbers of worker processes (by
+default 1, 2, and 4), each three times. The fastest time of each is reported,
+including building the communities and, for a ParallelWorld, starting its 
+processes. The script fails if the Persons of a community, by name, 
+birthyear, and number of children, differ between the World and a 
+ParallelWorld. The speedup of a ParallelWorld is the time of the
+World divided by its own, and can only exceed 1 with more than one CPU.
+"""
+import os
+import sys
+import time
+from _setup import rules, death, birth
+import households
+from households import parallel
+
+n_communities = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+n_houses = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+years = int(sys.argv[3]) if len(sys.argv) > 3 else 60
+processes = [int(x) for x in sys.argv[4:]] if len(sys.argv) > 4 else [1,2,4]
+
+names = ['Community %i' % i for i in range(n_communities)]
+marriagerule, inheritancerule, mobilityrule = rules()
+
+def people(community):
+    """Return the name, birthyear, and number of children of each living Person."""
+    return sorted((p.name, p.birthyear, len(p.has_children)) for p in community.people)
+
+# Step 1: run the communities in a World
+def run_world():
+    """Run the communities in a World, returning it."""
+    world = households.World(seed = 5)
+    for name in names:
+        households.Community(world,name,n_houses,n_houses,17,death,birth,marriagerule,inheritancerule,mobilityrule)
+    for y in range(years):
+        world.progress()
+    return world
+
+def fastest(function, *args):
+    """Return the least time taken by three calls of a function, and its result."""
+    timings = []
+    for i in range(3):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+serial, world = fastest(run_world)
+expected = {c.name : people(c) for c in world.communities}
+
+# Step 2: run them in a ParallelWorld with each number of processes
+def run_parallel(k):
+    """Run the communities in a ParallelWorld, returning the Persons of each."""
+    with parallel.ParallelWorld(processes = k, seed = 5) as shards:
+        for name in names:
+            shards.add_community(name,n_houses,n_houses,17,death,birth,marriagerule,inheritancerule,mobilityrule)
+        for y in range(years):
+            shards.progress()
+        return shards.map(people)
+
+timings = {}
+for k in processes:
+    timings[k], result = fastest(run_parallel, k)
+    if result != expected:
+        sys.exit('the communities differ between a World and a ParallelWorld with %i processes' % k)
+
+# Step 3: report
+print('%i communities of %i houses, %i years, %i people at the end, %i CPUs' % (n_communities, n_houses, years, len(world.people), os.cpu_count()))
+print('%-28s %8.2f s' % ('World', serial))
+for k, seconds in timings.items():
+    print('%-28s %8.2f s %6.2fx' % ('ParallelWorld, %i processes' % k, seconds, serial / seconds))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Check that compacting the dead changes nothing but the memory they retain.
+
+Run from the code folder:
+    python tests/compaction.py [number of houses] [years] [interval]
+
+The same seed is run twice with each engine and each way of recording events
+(none, in Diaries, and in an EventLog): once as is, and once calling
+World.compact every `interval` years. The script fails if the living, their
+relationships, their houses, or the owners of the houses differ in any year,
+or if at the end the dead, the kinship.relatedness of the living to each
+other and to the dead, or the biographies differ. It also fails if a
+sweep.simulate run differs when given a `compact` interval.
+
+The memory retained per dead Person is measured with tracemalloc as the
+growth in allocated memory between the middle and the end of each run,
+divided by the number who died meanwhile, so it includes their Events and
+their share of the columns of the array engine and of the Archive. As the
+columns grow by doubling, the measure of a short run varies with how many 
+times they grew, so larger runs give steadier figures. The number of 
+ArchivedPersons still in use at the end (those the living refer to, or all
+of them where Events name them) is also reported.
+"""
+import sys
+import gc
+import random
+import tracemalloc
+from _setup import setup, rules, death, birth
+from households import np, kinship, narrative, sweep
+
+n_houses = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+years = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+interval = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+def ids(persons):
+    """Return the ids of some Persons, or -1 for None."""
+    return tuple(-1 if p is None else p.id for p in persons)
+
+def details(p):
+    """Return the details of a Person which compaction must not change."""
+    return (p.id, p.name, p.sex.code, p.age, p.birthyear, p.marriagestatus.code,
+            ids([p.has_spouse]), ids(p.has_parents), ids(p.has_children),
+            tuple(h.id for h in p.owned_houses))
+
+def state(world):
+    """Return a hash of the living and the houses of a World."""
+    living = tuple(details(p) + ids([p.has_house]) for p in world.people)
+    houses = tuple((h.id, ids([h.owner]), ids(h.people)) for h in world.houses)
+    return hash((living, houses, len(world.deadpeople)))
+
+# Step 1: run a World, compacting it every `interval` years or not at all
+def run(engine, mode, compact):
+    """Run a World, returning it, its hash each year, and the bytes retained per death."""
+    gc.collect()
+    tracemalloc.start()
+    world, community = setup(n_houses, engine, mode == 'eventlog', 'none' if mode == 'none' else 'all', seed = 2)
+    history = np.zeros(years, dtype = np.int64)
+    marks = []
+    for y in range(years):
+        world.progress()
+        if compact and world.year % interval == 0:
+            world.compact()
+        history[y] = state(world)
+        if world.year in (years // 2, years):
+            if compact:
+                world.compact()
+            gc.collect()
+            marks.append((tracemalloc.get_traced_memory()[0], len(world.deadpeople)))
+    tracemalloc.stop()
+    (used0, dead0), (used1, dead1) = marks
+    return world, history, (used1 - used0) / (dead1 - dead0)
+
+# Step 2: compare the runs of each engine and way of recording
+recorded = {'none' : 'not recorded', 'all' : 'in Diaries', 'eventlog' : 'in EventLog'}
+results = {}
+for engine in ['object','array']:
+    for mode in recorded.keys():
+        label = '%s engine, events %s' % (engine, recorded[mode])
+        world, history, kept = run(engine, mode, False)
+        compacted, compacted_history, compacted_kept = run(engine, mode, True)
+        gc.collect()
+        proxies = len(compacted.archive._proxies)
+        changed = np.flatnonzero(history != compacted_history)
+        if len(changed) != 0:
+            sys.exit('%s: the living differ from year %i when compacted' % (label, changed[0] + 1))
+        #The dead are read from the Archive, as the same proxy while in use
+        if len(compacted.archive) != len(compacted.deadpeople):
+            sys.exit('%s: %i of %i dead compacted' % (label, len(compacted.archive), len(compacted.deadpeople)))
+        for p in compacted.deadpeople:
+            if compacted.get_person(p.id) is not p or p not in p.has_community.thedead:
+                sys.exit('%s: dead Person %i not found' % (label, p.id))
+            if details(p) != details(world.get_person(p.id)):
+                sys.exit('%s: dead Person %i differs when compacted' % (label, p.id))
+        #Relatedness of the living to random others, living and dead
+        rng = random.Random(0)
+        living = list(compacted.people)
+        everyone = living + list(compacted.deadpeople)
+        for p in living:
+            for other in rng.sample(living, 5) + rng.sample(everyone, 5) + p.has_parents:
+                expected = kinship.relatedness(world.get_person(p.id), world.get_person(other.id))
+                if kinship.relatedness(p, other) != expected:
+                    sys.exit('%s: relatedness of %i and %i differs when compacted' % (label, p.id, other.id))
+        if mode != 'none':
+            for p in living + rng.sample(everyone, 200):
+                if narrative.biography(p) != narrative.biography(world.get_person(p.id)):
+                    sys.exit('%s: biography of %i differs when compacted' % (label, p.id))
+        results[label] = (kept, compacted_kept, proxies, len(compacted.archive))
+
+# Step 3: check that a sweep gives the same results when compacting
+marriagerule, inheritancerule, mobilityrule = rules()
+for engine in ['object','array']:
+    parameters = {'pop' : n_houses, 'area' : n_houses, 'startage' : 17, 'mortab' : death, 'birthtab' : birth,
+                  'marriagerule' : marriagerule, 'inheritancerule' : inheritancerule,
+                  'mobilityrule' : mobilityrule, 'years' : years, 'engine' : engine}
+    if sweep.simulate(parameters, 4) != sweep.simulate(dict(parameters, compact = interval), 4):
+        sys.exit('sweep.simulate with the %s engine differs when compacting' % engine)
+
+# Step 4: report
+print('%i houses, %i years, compacted every %i years' % (n_houses, years, interval))
+print('%-40s %18s %18s %8s %14s' % ('', 'bytes per death', 'when compacted', 'saving', 'proxies in use'))
+for label, (kept, compacted_kept, proxies, dead) in results.items():
+    print('%-40s %18.0f %18.0f %7.1fx %7i of %i' % (label, kept, compacted_kept, kept / compacted_kept, proxies, dead))
+print('histories, kinship, and sweeps are the same when compacted')
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Check that Persons who migrate keep their kinship.
+
+Run from the code folder:
+    python tests/migration.py [number of houses] [years]
+
+Two communities are run in one World with a mobility rule that sends some
+young unmarried adults to the other community. Each migrant is found among
+the Persons who arrived, by the order in which they left, and the script
+fails if the migrant's parents are not in the World's kinship.Genealogy, or
+if their coefficient of relationship with anyone but their descendants 
+differs from that of the Person who left. The same communities are then run in a ParallelWorld, one
+per process, and the script fails if the number of close kin of anyone
+differs from the World, as it would if ancestry were lost between shards.
+"""
+import sys
+from _setup import rules, death, birth
+import households
+from households import behavior, kinship, parallel
+
+n_houses = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+years = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+
+# Step 1: define a rule that sends some young adults to the other community
+class MobilityRuleEmigrate(behavior.mobility.MobilityRule):
+    """A MobilityRule under which some unmarried adults first emigrate."""
+
+    emigrants = []
+
+    def __call__(self, person):
+        community = person.has_community
+        if person.age >= 18 and person.marriagestatus == households.unmarried and community.random.random() < .05:
+            destination = 'Ferrydale' if community.name == 'Sweetwater' else 'Sweetwater'
+            self.emigrants.append(person)
+            community.emigrate([person], destination)
+            return
+        return super().__call__(person)
+
+marriagerule, inheritancerule, mobilityrule = rules()
+mobilityrule = MobilityRuleEmigrate(behavior.mobility.check_household_overcrowded,
+                                    behavior.mobility.who_leaves_house_family,
+                                    behavior.mobility.destination_random_house_same_village)
+names = ['Sweetwater','Ferrydale']
+
+# Step 2: run the communities in a World
+world = households.World(seed = 3)
+for name in names:
+    households.Community(world,name,n_houses,n_houses,17,death,birth,marriagerule,inheritancerule,mobilityrule)
+for y in range(years):
+    world.progress()
+emigrants = mobilityrule.emigrants
+
+# Step 3: compare each migrant with the Person who left
+#Migrants arrive without parents in their community, in the order they left
+emigrated = [p for c in world.communities for p in c.emigrants]
+everyone = sorted(list(world.people) + list(world.deadpeople) + emigrated, key = lambda p: p.id)
+arrived = [p for p in everyone if p.id >= 2 * n_houses and p.has_parents == []]
+if len(emigrants) == 0 or len(arrived) != len(emigrants):
+    sys.exit('%i emigrated but %i arrived' % (len(emigrants), len(arrived)))
+others = list(world.people)
+for left, migrant in zip(emigrants, arrived):
+    if (left.name, left.birthyear) != (migrant.name, migrant.birthyear):
+        sys.exit('migrants arrived out of order')
+    if sorted(world.genealogy.parents[migrant.id]) != sorted(world.genealogy.parents[left.id]):
+        sys.exit('migrant %i lost their parents' % migrant.id)
+    #Descendants are those of the Person who left if born before they left,
+    ##or of the migrant if born after
+    descendants = set(world.genealogy.descendants([migrant.id,left.id],4)[1].tolist())
+    for other in others:
+        if other.id in descendants or other is migrant:
+            continue
+        if kinship.relatedness(migrant,other) != kinship.relatedness(left,other):
+            sys.exit('migrant %i has the wrong relatedness to %i' % (migrant.id, other.id))
+
+# Step 4: run the same communities in parallel
+def close_kin(community):
+    """Return the number of living close kin of each Person of a community."""
+    people = list(community.people)
+    genealogy = community.has_world.genealogy
+    ids = [p.id for p in people]
+    return sorted((p.name, p.birthyear, int((genealogy.relatedness(p.id,ids) >= .125).sum())) for p in people)
+
+serial = {c.name : close_kin(c) for c in world.communities}
+with parallel.ParallelWorld(processes = 2, seed = 3) as shards:
+    for name in names:
+        shards.add_community(name,n_houses,n_houses,17,death,birth,marriagerule,inheritancerule,mobilityrule)
+    for y in range(years):
+        shards.progress()
+    sharded = shards.map(close_kin)
+if sharded != serial:
+    sys.exit('close kin differ between a World and a ParallelWorld')
+
+# Step 5: report
+print('%i houses, %i years, %i migrants, %i living' % (n_houses, years, len(arrived), len(others)))
+print('migrants keep their kinship, in a World and across shards')